@@ -1,11 +1,8 @@
-from flask import Flask
+import os
+import sys
 
-def create_app():
-    app = Flask(__name__)
-    app.secret_key = 'your_secret_key_here'  # Set a secret key for session management
+# The modules here import each other by plain name, as they do when the app is
+# run from this directory, so this directory has to be on the import path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-    # Import and register blueprints
-    from .routes import main
-    app.register_blueprint(main)
-
-    return app
+from application import create_app
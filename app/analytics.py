@@ -0,0 +1,210 @@
+import heapq
+from collections import ChainMap, defaultdict
+from datetime import datetime, timedelta
+from history import EPOCH, datetime_to_micros
+
+MICROS_PER_HOUR = 3600 * 1000000
+MICROS_PER_DAY = 24 * MICROS_PER_HOUR
+PERIOD_FORMATS = {'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}
+
+class RentalAnalytics:
+    """Revenue figures kept as running totals over the rental history
+
+    The totals are built in one pass over the history's columns on load and
+    then updated as each rental is returned, so reading them never scans the
+    history. Archived history contributes through summaries of its totals
+    saved with it. Utilization depends on the period asked for, so it is
+    computed on demand over the start and end time columns. Revenue by type
+    and brand is grouped from the per-item totals when read, by what each
+    item is at that time, so editing or removing an item gives the same
+    figures before and after a restart.
+    """
+
+    def __init__(self, items=None):
+        self._items = items if items is not None else {}  # item_id -> item, to group revenue by
+        self.clear()
+
+    def clear(self):
+        """Reset every total to zero"""
+        self._rentals = 0
+        self._revenue = 0.0
+        self._duration = 0  # Total rented time, in microseconds
+        self._by_item = defaultdict(float)
+        self._by_customer = defaultdict(float)
+        self._rentals_by_customer = defaultdict(int)
+        self._by_day = defaultdict(float)  # Days since the epoch -> revenue of rentals returned that day
+
+    def rebuild(self, history, items, archived=()):
+        """Recompute every total from a HistoryStore and summaries of archived history, for the current items"""
+        self.clear()
+        self._items = items
+        for summary in archived:
+            self._merge(summary)
+        self._count(history)
+
+    def _count(self, history):
+        """Add the entries of a HistoryStore in memory to the totals, by column"""
+        costs = history.costs
+        self._rentals += len(costs)
+        self._revenue += sum(costs)
+        self._duration += sum(history.ends) - sum(history.starts)
+        by_item = self._by_item
+        by_customer = self._by_customer
+        rentals_by_customer = self._rentals_by_customer
+        by_day = self._by_day
+        for item_id, customer_id, end, cost in zip(history.item_ids, history.customer_ids, history.ends, costs):
+            by_item[item_id] += cost
+            by_customer[customer_id] += cost
+            rentals_by_customer[customer_id] += 1
+            by_day[end // MICROS_PER_DAY] += cost
+
+    @classmethod
+    def summarize(cls, history):
+        """Get the totals of a HistoryStore as JSON-compatible data, for rebuild()"""
+        analytics = cls()
+        analytics._count(history)
+        return {
+            'rentals': analytics._rentals,
+            'revenue': analytics._revenue,
+            'duration': analytics._duration,
+            'by_item': analytics._by_item,
+            'by_customer': analytics._by_customer,
+            'rentals_by_customer': analytics._rentals_by_customer,
+            'by_day': analytics._by_day
+        }
+
+    @classmethod
+    def combine(cls, parts):
+        """Get new totals adding up several RentalAnalytics, e.g. one per depot"""
+        parts = list(parts)  # Read twice
+        analytics = cls(ChainMap(*(part._items for part in parts)))
+        for part in parts:
+            analytics._rentals += part._rentals
+            analytics._revenue += part._revenue
+            analytics._duration += part._duration
+            for totals, added in ((analytics._by_item, part._by_item),
+                                  (analytics._by_customer, part._by_customer),
+                                  (analytics._rentals_by_customer, part._rentals_by_customer),
+                                  (analytics._by_day, part._by_day)):
+                for key, value in list(added.items()):
+                    totals[key] += value
+        return analytics
+
+    def _merge(self, summary):
+        """Add totals produced by summarize()"""
+        self._rentals += summary['rentals']
+        self._revenue += summary['revenue']
+        self._duration += summary['duration']
+        for totals, added in ((self._by_item, summary['by_item']),
+                              (self._by_customer, summary['by_customer']),
+                              (self._rentals_by_customer, summary['rentals_by_customer'])):
+            for key, value in added.items():
+                totals[key] += value
+        for day, revenue in summary['by_day'].items():
+            self._by_day[int(day)] += revenue  # JSON object keys are strings
+
+    def add(self, history, position, item):
+        """Count one returned rental, stored at a position in the history"""
+        start, end = history.times(position)
+        cost = history.cost(position)
+        customer_id = history.customer_id(position)
+        self._rentals += 1
+        self._revenue += cost
+        self._duration += end - start
+        self._by_item[item.id] += cost
+        self._by_customer[customer_id] += cost
+        self._rentals_by_customer[customer_id] += 1
+        self._by_day[end // MICROS_PER_DAY] += cost
+
+    def _revenue_by_kind(self):
+        """Get the (type, brand) of each item with revenue, paired with its revenue"""
+        items = self._items
+        for item_id, revenue in list(self._by_item.items()):
+            item = items.get(item_id)
+            if item is None:
+                yield ('unknown', None), revenue  # Items removed since they were rented
+            else:
+                type_info = item.get_type_info()
+                yield (type_info['type'], type_info.get('brand')), revenue
+
+    def totals(self):
+        """Get the number of rentals, total revenue, and averages per rental"""
+        rentals = self._rentals
+        return {
+            'rentals': rentals,
+            'revenue': self._revenue,
+            'average_revenue': self._revenue / rentals if rentals else 0.0,
+            'average_duration_hours': self._duration / MICROS_PER_HOUR / rentals if rentals else 0.0
+        }
+
+    def revenue_by_item(self):
+        """Get total revenue per item ID"""
+        return dict(self._by_item)
+
+    def revenue_by_customer(self):
+        """Get total revenue per customer ID"""
+        return dict(self._by_customer)
+
+    def revenue_by_type(self):
+        """Get total revenue per item type"""
+        totals = defaultdict(float)
+        for (item_type, _), revenue in self._revenue_by_kind():
+            totals[item_type] += revenue
+        return dict(totals)
+
+    def revenue_by_brand(self):
+        """Get total revenue per car brand"""
+        totals = defaultdict(float)
+        for (_, brand), revenue in self._revenue_by_kind():
+            if brand:
+                totals[brand] += revenue
+        return dict(totals)
+
+    def revenue_by_period(self, period='day', start=None, end=None):
+        """Get revenue per day, month, or year of return, between two dates inclusive"""
+        if period not in PERIOD_FORMATS:
+            raise ValueError(f"Period must be one of: {', '.join(PERIOD_FORMATS)}")
+        first = None if start is None else (start - EPOCH.date()).days
+        last = None if end is None else (end - EPOCH.date()).days
+        totals = defaultdict(float)
+        for day, revenue in list(self._by_day.items()):
+            if (first is None or day >= first) and (last is None or day <= last):
+                key = (EPOCH + timedelta(days=day)).strftime(PERIOD_FORMATS[period])
+                totals[key] += revenue
+        return dict(sorted(totals.items()))
+
+    def top_customers(self, n=5):
+        """Get the n customers with the most revenue, as (customer_id, revenue, rentals)"""
+        top = heapq.nlargest(n, list(self._by_customer.items()), key=lambda pair: pair[1])
+        return [(customer_id, revenue, self._rentals_by_customer[customer_id]) for customer_id, revenue in top]
+
+    @staticmethod
+    def utilization(histories, fleet, active_starts=(), start=None, end=None):
+        """Get the share of item-hours between start and end that items were out
+
+        histories are the HistoryStores to count, fleet the set of item IDs
+        counted, and active_starts the start times of their rentals still in
+        progress. Defaults cover the first rental to now.
+        """
+        now = datetime.now()
+        end_micros = datetime_to_micros(min(end, now) if end else now)  # The future isn't utilized yet
+        if start is not None:
+            start_micros = datetime_to_micros(start)
+        else:
+            histories = list(histories)  # Read twice
+            start_micros = min(min((min(history.starts, default=end_micros) for history in histories),
+                                   default=end_micros),
+                               min(map(datetime_to_micros, active_starts), default=end_micros))
+        span = end_micros - start_micros
+        if not fleet or span <= 0:
+            return 0.0
+
+        rented = 0
+        for history in histories:
+            for item_id, rental_start, rental_end in zip(history.item_ids, history.starts, history.ends):
+                if rental_end > start_micros and rental_start < end_micros and item_id in fleet:
+                    rented += min(rental_end, end_micros) - max(rental_start, start_micros)
+        for rental_start in map(datetime_to_micros, active_starts):
+            if rental_start < end_micros:
+                rented += end_micros - max(rental_start, start_micros)
+        return rented / (span * len(fleet))
@@ -0,0 +1,359 @@
+import io
+from datetime import date, datetime, time, timedelta
+from flask import Blueprint, Response, request, jsonify
+from bulk import (EXPORT_FIELDS, HISTORY_FIELDS, check_format, check_kind, chunked, customer_from_record,
+                  export_records, import_records, item_from_record, read_records, require, write_records)
+from pagination import paginate
+from reservations import local_time
+from routes import rental_manager
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+class NotFound(Exception):
+    """Raised when a requested item or customer does not exist"""
+    pass
+
+@api.errorhandler(ValueError)
+@api.errorhandler(TypeError)
+def handle_bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+@api.errorhandler(NotFound)
+def handle_not_found(e):
+    return jsonify({'error': str(e)}), 404
+
+def item_to_json(item):
+    """Convert an item to its API representation"""
+    data = item.to_dict()
+    del data['rental_history']  # Served separately by /items/<id>/history
+    data['rented_by'] = rental_manager.get_item_renter(item.id)
+    depot = rental_manager.get_item_depot(item.id)
+    if depot is not None:
+        data['depot'] = depot
+    return data
+
+def customer_to_json(customer):
+    """Convert a customer to its API representation"""
+    data = customer.to_dict()
+    data['active_rentals'] = [rental['item'].id for rental in rental_manager.get_customer_rentals(customer.id)]
+    return data
+
+def rental_to_json(rental):
+    """Convert an active rental to its API representation"""
+    return {
+        'customer_id': rental['customer'].id,
+        'item_id': rental['item'].id,
+        'start_time': rental['start_time'].isoformat()
+    }
+
+def page_to_json(page, convert):
+    """Convert a page of results to its API representation"""
+    return {
+        'results': [convert(entry) for entry in page],
+        'page': page.page,
+        'per_page': page.per_page,
+        'pages': page.pages,
+        'total': page.total
+    }
+
+def datetime_field(data, name):
+    """Get a required ISO datetime from a request body or query string, as naive local time"""
+    return local_time(datetime.fromisoformat(require(data, name)))
+
+def get_item_or_404(item_id):
+    item = rental_manager.get_item(item_id)
+    if not item:
+        raise NotFound(f"Item with ID {item_id} does not exist")
+    return item
+
+def get_customer_or_404(customer_id):
+    customer = rental_manager.get_customer(customer_id)
+    if not customer:
+        raise NotFound(f"Customer with ID {customer_id} does not exist")
+    return customer
+
+def request_json():
+    """Get the JSON request body, which must be an object"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+# Items
+
+@api.route('/items', methods=['GET'])
+def list_items():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', type=int)
+    query = request.args.get('q', '')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    item_type = request.args.get('type') or None
+    available = request.args.get('available')
+
+    if query:
+        results = rental_manager.search_items(query)
+    elif min_price is not None or max_price is not None or item_type or available:
+        results = rental_manager.find_items(min_price=min_price, max_price=max_price, item_type=item_type,
+                                            available=None if available is None else available == 'true')
+    else:
+        return jsonify(page_to_json(rental_manager.list_items(page, per_page), item_to_json))
+    return jsonify(page_to_json(paginate(results, len(results), page, per_page), item_to_json))
+
+@api.route('/items', methods=['POST'])
+def create_item():
+    data = request_json()
+    item = item_from_record(data)
+    rental_manager.add_item(item, data.get('depot'))
+    rental_manager.save_data()
+    return jsonify(item_to_json(item)), 201
+
+@api.route('/items/<item_id>', methods=['GET'])
+def get_item(item_id):
+    return jsonify(item_to_json(get_item_or_404(item_id)))
+
+@api.route('/items/<item_id>', methods=['PUT', 'PATCH'])
+def update_item(item_id):
+    item = get_item_or_404(item_id)
+    data = request_json()
+    rental_price = data.get('rental_price')
+    rental_manager.edit_item(item_id, data.get('name'),
+                             float(rental_price) if rental_price is not None else None,
+                             data.get('brand'), data.get('bike_type'))
+    rental_manager.save_data()
+    return jsonify(item_to_json(item))
+
+@api.route('/items/<item_id>', methods=['DELETE'])
+def delete_item(item_id):
+    get_item_or_404(item_id)
+    rental_manager.remove_item(item_id)
+    rental_manager.save_data()
+    return '', 204
+
+@api.route('/items/<item_id>/history', methods=['GET'])
+def item_history(item_id):
+    get_item_or_404(item_id)
+    history = rental_manager.get_item_rental_history(item_id)
+    if 'format' in request.args:
+        return download(history, request.args['format'], HISTORY_FIELDS, f'{item_id}-history')
+    return jsonify(list(history))
+
+@api.route('/items/<item_id>/reservations', methods=['GET'])
+def item_reservations(item_id):
+    get_item_or_404(item_id)
+    include_past = request.args.get('past') == 'true'
+    return jsonify([reservation.to_dict()
+                    for reservation in rental_manager.get_item_reservations(item_id, include_past)])
+
+# Customers
+
+@api.route('/customers', methods=['GET'])
+def list_customers():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', type=int)
+    query = request.args.get('q', '')
+    if query:
+        results = rental_manager.search_customers(query)
+        return jsonify(page_to_json(paginate(results, len(results), page, per_page), customer_to_json))
+    return jsonify(page_to_json(rental_manager.list_customers(page, per_page), customer_to_json))
+
+@api.route('/customers', methods=['POST'])
+def create_customer():
+    customer = customer_from_record(request_json())
+    rental_manager.add_customer(customer)
+    rental_manager.save_data()
+    return jsonify(customer_to_json(customer)), 201
+
+@api.route('/customers/<customer_id>', methods=['GET'])
+def get_customer(customer_id):
+    return jsonify(customer_to_json(get_customer_or_404(customer_id)))
+
+@api.route('/customers/<customer_id>', methods=['PUT', 'PATCH'])
+def update_customer(customer_id):
+    customer = get_customer_or_404(customer_id)
+    data = request_json()
+    rental_manager.edit_customer(customer_id, data.get('first_name'), data.get('last_name'),
+                                 data.get('address'), data.get('contact_number'))
+    rental_manager.save_data()
+    return jsonify(customer_to_json(customer))
+
+@api.route('/customers/<customer_id>', methods=['DELETE'])
+def delete_customer(customer_id):
+    get_customer_or_404(customer_id)
+    rental_manager.remove_customer(customer_id)
+    rental_manager.save_data()
+    return '', 204
+
+@api.route('/customers/<customer_id>/rentals', methods=['GET'])
+def customer_rentals(customer_id):
+    get_customer_or_404(customer_id)
+    return jsonify([rental_to_json(rental) for rental in rental_manager.get_customer_rentals(customer_id)])
+
+@api.route('/customers/<customer_id>/history', methods=['GET'])
+def customer_history(customer_id):
+    get_customer_or_404(customer_id)
+    history = rental_manager.get_customer_rental_history(customer_id)
+    if 'format' in request.args:
+        return download(history, request.args['format'], HISTORY_FIELDS, f'{customer_id}-history')
+    return jsonify(list(history))
+
+@api.route('/customers/<customer_id>/reservations', methods=['GET'])
+def customer_reservations(customer_id):
+    get_customer_or_404(customer_id)
+    include_past = request.args.get('past') == 'true'
+    return jsonify([reservation.to_dict()
+                    for reservation in rental_manager.get_customer_reservations(customer_id, include_past)])
+
+# Rentals
+
+@api.route('/rentals', methods=['POST'])
+def rent_item():
+    data = request_json()
+    item_id = require(data, 'item_id')
+    rental_manager.rent_item(require(data, 'customer_id'), item_id)
+    return jsonify(rental_to_json(rental_manager.get_active_rental(item_id))), 201
+
+@api.route('/returns', methods=['POST'])
+def return_item():
+    data = request_json()
+    customer_id, item_id = require(data, 'customer_id'), require(data, 'item_id')
+    cost = rental_manager.return_item(customer_id, item_id)
+    return jsonify({'customer_id': customer_id, 'item_id': item_id, 'cost': cost})
+
+# Reservations
+
+@api.route('/reservations', methods=['POST'])
+def create_reservation():
+    data = request_json()
+    reservation = rental_manager.reserve_item(require(data, 'customer_id'), require(data, 'item_id'),
+                                              datetime_field(data, 'start_time'), datetime_field(data, 'end_time'))
+    return jsonify(reservation.to_dict()), 201
+
+@api.route('/reservations/<reservation_id>', methods=['GET'])
+def get_reservation(reservation_id):
+    reservation = rental_manager.get_reservation(reservation_id)
+    if not reservation:
+        raise NotFound(f"Reservation with ID {reservation_id} does not exist")
+    return jsonify(reservation.to_dict())
+
+@api.route('/reservations/<reservation_id>', methods=['DELETE'])
+def cancel_reservation(reservation_id):
+    if not rental_manager.get_reservation(reservation_id):
+        raise NotFound(f"Reservation with ID {reservation_id} does not exist")
+    rental_manager.cancel_reservation(reservation_id)
+    return '', 204
+
+@api.route('/availability', methods=['GET'])
+def availability():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', type=int)
+    results = rental_manager.find_available_items(
+        datetime_field(request.args, 'start_time'), datetime_field(request.args, 'end_time'),
+        item_type=request.args.get('type') or None,
+        min_price=request.args.get('min_price', type=float), max_price=request.args.get('max_price', type=float))
+    return jsonify(page_to_json(paginate(results, len(results), page, per_page), item_to_json))
+
+@api.route('/history', methods=['GET'])
+def recent_history():
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(rental_manager.recent_history(limit))
+
+# Analytics
+
+def date_arg(name):
+    """Get an optional ISO date (YYYY-MM-DD) from the query string"""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+@api.route('/analytics', methods=['GET'])
+def analytics():
+    period = request.args.get('period', 'month')
+    start = date_arg('start')
+    end = date_arg('end')
+    top = request.args.get('top', 5, type=int)
+    stats = rental_manager.analytics
+
+    # Utilization covers whole days, from the start of start to the end of end
+    window_start = datetime.combine(start, time.min) if start else None
+    window_end = datetime.combine(end + timedelta(days=1), time.min) if end else None
+    item_types = {item.get_type_info()['type'] for item in list(rental_manager.items.values())}
+    utilization = {'all': rental_manager.utilization(window_start, window_end)}
+    for item_type in sorted(item_types):
+        utilization[item_type] = rental_manager.utilization(window_start, window_end, item_type)
+
+    return jsonify({
+        'totals': stats.totals(),
+        'revenue_by_period': stats.revenue_by_period(period, start, end),
+        'revenue_by_type': stats.revenue_by_type(),
+        'revenue_by_brand': stats.revenue_by_brand(),
+        'top_customers': [{'customer_id': customer_id, 'revenue': revenue, 'rentals': rentals}
+                          for customer_id, revenue, rentals in stats.top_customers(top)],
+        'utilization': utilization
+    })
+
+@api.route('/analytics/items', methods=['GET'])
+def analytics_by_item():
+    return jsonify(rental_manager.analytics.revenue_by_item())
+
+@api.route('/analytics/customers', methods=['GET'])
+def analytics_by_customer():
+    return jsonify(rental_manager.analytics.revenue_by_customer())
+
+# Bulk operations
+
+BULK_OPERATIONS = {
+    'add_item': lambda op: rental_manager.add_item(item_from_record(require(op, 'item')), require(op, 'item').get('depot')),
+    'add_customer': lambda op: rental_manager.add_customer(customer_from_record(require(op, 'customer'))),
+    'rent': lambda op: rental_manager.rent_item(require(op, 'customer_id'), require(op, 'item_id')),
+    'return': lambda op: {'cost': rental_manager.return_item(require(op, 'customer_id'), require(op, 'item_id'))},
+}
+
+# Each operation succeeds or fails on its own; the batch is persisted once at the end
+@api.route('/bulk', methods=['POST'])
+def bulk():
+    operations = request_json().get('operations')
+    if not isinstance(operations, list):
+        raise ValueError("'operations' must be a list")
+
+    results = []
+    with rental_manager.batch():
+        for op in operations:
+            try:
+                handler = BULK_OPERATIONS.get(op.get('op')) if isinstance(op, dict) else None
+                if handler is None:
+                    raise ValueError(f"Unknown operation: {op.get('op') if isinstance(op, dict) else op}")
+                result = handler(op)
+                results.append(dict(result if isinstance(result, dict) else {}, ok=True))
+            except (ValueError, TypeError) as e:
+                results.append({'ok': False, 'error': str(e)})
+    return jsonify({'results': results})
+
+# Import and export
+
+BULK_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+def format_arg():
+    """Get the bulk data format from the query string or the request's content type"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+    return check_format(fmt)
+
+# The body is read a line at a time, and everything it adds is persisted once
+@api.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+    fmt = format_arg()
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    return jsonify(import_records(rental_manager, kind, read_records(lines, fmt)))
+
+def download(records, fmt, fields, name):
+    """Stream records as a CSV or JSONL attachment, converting them as they are sent"""
+    fmt = check_format(fmt)
+    response = Response(chunked(write_records(records, fmt, fields)), mimetype=BULK_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    return response
+
+@api.route('/export/<kind>', methods=['GET'])
+def export_data(kind):
+    fields = EXPORT_FIELDS[check_kind(kind, tuple(EXPORT_FIELDS))]
+    return download(export_records(rental_manager, kind), request.args.get('format', 'jsonl'), fields, kind)
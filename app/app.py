@@ -1,11 +1,7 @@
-from flask import Flask
-from routes import main
+from application import create_app
 
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'  # Set a secret key for session management
-
-# Register the blueprint
-app.register_blueprint(main)
+# The module-level app is what `python app/app.py`, `flask --app app`, and gunicorn's app:app use
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True)
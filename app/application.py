@@ -0,0 +1,108 @@
+import atexit
+import os
+import sys
+import click
+from flask import Flask
+from routes import main, rental_manager
+from api import api
+from bulk import EXPORT_FIELDS, FORMATS, IMPORT_KINDS, export_records, format_for, import_records, read_records, write_records
+from metrics import Profiler
+from rental_manager import RentalManager
+from sharding import ShardedRentalManager
+from storage import open_storage
+
+LOAD_MODES = ('background', 'lazy', 'eager')
+
+def create_app(storage=None, flush_interval=None, load=None, depots=None):
+    """Create the application with its own RentalManager, or one per depot
+
+    Settings not passed in come from the environment:
+    - RENTAL_STORAGE selects the backend, e.g. 'json' (default) or 'sqlite:data.db'
+    - RENTAL_HISTORY_MONTHS is how many whole months of rental history the JSON backend keeps in
+      memory before archiving older months under history/; 0 keeps everything in data.json
+    - RENTAL_WARM_START=1 keeps a pickled copy of the loaded data next to data.json, which
+      restores much faster than reading the JSON while data.json is unchanged
+    - RENTAL_DEPOTS is a comma-separated list of depots, e.g. 'north,south'. Each depot's items,
+      rentals, and history are kept by a RentalManager of its own, with its files under
+      depots/<name>/, and a ShardedRentalManager routes requests to them; unset, there is one store
+    - RENTAL_FLUSH_INTERVAL is how many seconds of changes share one background snapshot; 0 saves inline
+    - RENTAL_LOAD is when the data is loaded: 'background' (default) starts at once on another
+      thread, 'lazy' waits for the first request that needs it, and 'eager' loads before returning.
+      Until it is loaded, /ready answers 503 and other requests wait for it
+    - RENTAL_PROFILE_RATE is the fraction of requests run under cProfile (default 0, off), with
+      each profile saved as a .prof file under RENTAL_PROFILE_DIR (default 'profiles')
+    """
+    if depots is None:
+        depots = [depot.strip() for depot in os.environ.get('RENTAL_DEPOTS', '').split(',') if depot.strip()]
+    open_backend = lambda directory=None: open_storage(
+        os.environ.get('RENTAL_STORAGE', 'json'), history_months=int(os.environ.get('RENTAL_HISTORY_MONTHS', 12)),
+        warm_start=os.environ.get('RENTAL_WARM_START', '0') not in ('', '0'), directory=directory)
+    if flush_interval is None:
+        flush_interval = float(os.environ.get('RENTAL_FLUSH_INTERVAL', 1))
+    load = load or os.environ.get('RENTAL_LOAD', 'background')
+    if load not in LOAD_MODES:
+        raise ValueError(f"Load mode must be one of: {', '.join(LOAD_MODES)}")
+
+    app = Flask(__name__)
+    app.secret_key = 'your_secret_key_here'  # Set a secret key for session management
+
+    if depots:
+        if storage is not None:
+            raise ValueError("Pass either a storage backend or depots, not both")
+        manager = ShardedRentalManager({
+            depot: RentalManager(storage=open_backend(os.path.join('depots', depot)),
+                                 flush_interval=flush_interval, depot=depot)
+            for depot in depots})
+    else:
+        manager = RentalManager(storage=storage if storage is not None else open_backend(),
+                                flush_interval=flush_interval)
+    app.extensions['rental_manager'] = manager
+    app.extensions['profiler'] = Profiler(float(os.environ.get('RENTAL_PROFILE_RATE', 0)),
+                                          os.environ.get('RENTAL_PROFILE_DIR', 'profiles'))
+
+    # Register the blueprints and commands
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    app.cli.add_command(import_command)
+    app.cli.add_command(export_command)
+
+    # Write any pending snapshot on exit
+    atexit.register(manager.flush)
+    if load == 'eager':
+        manager.ensure_loaded()
+    elif load == 'background':
+        manager.load_in_background()
+    return app
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(IMPORT_KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help="Defaults to the file's extension, or jsonl")
+def import_command(kind, path, fmt):
+    """Add items or customers from a CSV or JSONL file, or standard input"""
+    fmt = fmt or format_for(path)
+    rental_manager.ensure_loaded()
+    if path == '-':
+        result = import_records(rental_manager, kind, read_records(sys.stdin, fmt))
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            result = import_records(rental_manager, kind, read_records(f, fmt))
+    rental_manager.flush()
+    for error in result['errors']:
+        click.echo(f"Line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['added']} {kind}, {result['failed']} failed")
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(tuple(EXPORT_FIELDS)))
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help="Defaults to the file's extension, or jsonl")
+def export_command(kind, path, fmt):
+    """Write all items, customers, or the rental history as CSV or JSONL"""
+    fmt = fmt or format_for(path)
+    rental_manager.ensure_loaded()
+    chunks = write_records(export_records(rental_manager, kind), fmt, EXPORT_FIELDS[kind])
+    if path == '-':
+        sys.stdout.writelines(chunks)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            f.writelines(chunks)
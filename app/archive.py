@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from analytics import RentalAnalytics
+from history import HISTORY_COLUMNS, HistoryStore, datetime_to_micros
+from metrics import persistence
+
+class HistoryArchive:
+    """Older rental history, kept on disk in one file per month
+
+    index.json lists the segments with the positions, time span, item and
+    customer IDs, and revenue totals of each, which is all that stays in
+    memory. A segment's entries are only read when something asks for them,
+    and only the segments of the most recently used months are kept loaded,
+    so repeated history lookups and utilization over the last year don't
+    read the files again. The offsets of each item's and customer's rentals
+    in a segment are kept once found, as segments never change.
+    """
+
+    INDEX_FILE = 'index.json'
+    CACHED_MONTHS = 12
+    HISTORY_CHUNK = 1000  # Entries per line of a segment file
+
+    def __init__(self, directory='history', keep_months=12):
+        if keep_months < 1:
+            raise ValueError("At least one month of history must stay in memory")
+        self._directory = directory
+        self._keep_months = keep_months
+        self._segments = []
+        self._firsts = []  # First position of each segment, for bisecting
+        self._cache = OrderedDict()  # YYYY-MM -> {file: loaded HistoryStore}, least recently used first
+        self._offsets = {}  # file -> ({item_id: offsets}, {customer_id: offsets}) in the segment
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def directory(self):
+        """Get the directory holding the segment files"""
+        return self._directory
+
+    @property
+    def segments(self):
+        """Get the segment descriptions, oldest first"""
+        return tuple(self._segments)
+
+    def __len__(self):
+        """Get the number of archived entries, which is the position memory starts at"""
+        if not self._segments:
+            return 0
+        last = self._segments[-1]
+        return last['first'] + last['count']
+
+    @property
+    def earliest(self):
+        """Get the earliest archived start time, in microseconds since the epoch, or None"""
+        return min((segment['start'] for segment in self._segments), default=None)
+
+    def load(self):
+        """Read the segment index, if there is one"""
+        try:
+            with open(os.path.join(self._directory, self.INDEX_FILE)) as f:
+                segments = json.load(f)['segments']
+        except FileNotFoundError:
+            segments = []
+        for segment in segments:
+            segment['items'] = frozenset(segment['items'])
+            segment['customers'] = frozenset(segment['customers'])
+        self._segments = segments
+        self._firsts = [segment['first'] for segment in segments]
+        with self._lock:
+            self._cache.clear()
+            self._offsets.clear()
+
+    def cutoff(self, now=None):
+        """Get the time before which returned rentals are archived, in microseconds since the epoch"""
+        now = now or datetime.now()
+        month = now.year * 12 + now.month - 1 - self._keep_months
+        return datetime_to_micros(datetime(month // 12, month % 12 + 1, 1))
+
+    def _store(self, segment):
+        """Get a segment's entries as a HistoryStore, reading the file if needed"""
+        month = segment['file'][:7]  # Segment files are named YYYY-MM.<first position>.jsonl
+        with self._lock:
+            stores = self._cache.get(month)
+            if stores is not None:
+                self._cache.move_to_end(month)
+                if segment['file'] in stores:
+                    return stores[segment['file']]
+        store = self._read(segment)
+        with self._lock:
+            self._cache.setdefault(month, {})[segment['file']] = store
+            self._cache.move_to_end(month)
+            while len(self._cache) > self.CACHED_MONTHS:
+                self._cache.popitem(last=False)
+        return store
+
+    def _read(self, segment):
+        """Read a segment file into a HistoryStore"""
+        store = HistoryStore(base=segment['first'])
+        with persistence('archive_read') as stats, open(os.path.join(self._directory, segment['file'])) as f:
+            stats['bytes'] = os.fstat(f.fileno()).st_size
+            for line in f:
+                columns = json.loads(line)['history']
+                for row in zip(*(columns[column] for column in HISTORY_COLUMNS)):
+                    store.append(dict(zip(HISTORY_COLUMNS, row)))
+        return store
+
+    def _segment_offsets(self, segment):
+        """Get the offsets of each item's and each customer's rentals in a segment"""
+        offsets = self._offsets.get(segment['file'])
+        if offsets is None:
+            store = self._store(segment)
+            offsets = ({}, {})
+            for by_id, ids in zip(offsets, (store.item_ids, store.customer_ids)):
+                for i, value in enumerate(ids):
+                    by_id.setdefault(value, array('q')).append(i)
+            with self._lock:
+                offsets = self._offsets.setdefault(segment['file'], offsets)
+        return offsets
+
+    def locate(self, position):
+        """Get the loaded segment holding an archived position and the entry's index in it"""
+        i = bisect_right(self._firsts, position) - 1
+        if i < 0 or position >= len(self):
+            raise IndexError("history position out of range")
+        segment = self._segments[i]
+        return self._store(segment), position - segment['first']
+
+    def positions(self, item_id=None, customer_id=None):
+        """Get the archived positions of an item's or customer's rentals, reading only segments that have any"""
+        positions = array('q')
+        for segment in self._segments:
+            if item_id is not None and item_id in segment['items']:
+                offsets = self._segment_offsets(segment)[0][item_id]
+            elif customer_id is not None and customer_id in segment['customers']:
+                offsets = self._segment_offsets(segment)[1][customer_id]
+            else:
+                continue
+            positions.extend(segment['first'] + i for i in offsets)
+        return positions
+
+    def stores(self, start=None, end=None):
+        """Iterate over the segments with rentals between two times, in microseconds, as HistoryStores"""
+        for segment in self._segments:
+            if (start is None or segment['end'] > start) and (end is None or segment['start'] < end):
+                yield self._store(segment)
+
+    def summaries(self):
+        """Iterate over the revenue totals of each segment"""
+        for segment in self._segments:
+            yield segment['totals']
+
+    def add(self, history, stop):
+        """Archive the entries of a HistoryStore from its base up to a position, one segment per month
+
+        The segment files are written before the index that lists them, so a
+        crash leaves the archive as it was.
+        """
+        first = len(self)
+        if history.base != first:
+            raise ValueError(f"History starts at {history.base}, but the archive ends at {first}")
+        os.makedirs(self._directory, exist_ok=True)
+        segments = list(self._segments)
+        while first < stop:
+            month = history.entry(first)['end_time'][:7]  # ISO timestamps start with YYYY-MM
+            store = HistoryStore(base=first)
+            position = first
+            while position < stop:
+                entry = history.entry(position)
+                if entry['end_time'][:7] != month:
+                    break
+                store.append(entry)
+                position += 1
+            segments.append(self._write_segment(f'{month}.{first}.jsonl', store))
+            first = position
+
+        self._write_file(self.INDEX_FILE, [{'segments': [
+            dict(segment, items=list(segment['items']), customers=list(segment['customers']))
+            for segment in segments
+        ]}])
+        self._segments = segments
+        self._firsts = [segment['first'] for segment in segments]
+
+    def _write_segment(self, filename, store):
+        """Write one segment file and describe it"""
+        lines = []
+        for start in range(0, len(store), self.HISTORY_CHUNK):
+            chunk = store[start:start + self.HISTORY_CHUNK]
+            lines.append({'history': {column: [entry[column] for entry in chunk] for column in HISTORY_COLUMNS}})
+        self._write_file(filename, lines)
+        return {
+            'file': filename,
+            'first': store.base,
+            'count': len(store),
+            'start': min(store.starts),
+            'end': max(store.ends),
+            'items': frozenset(store.item_ids),
+            'customers': frozenset(store.customer_ids),
+            'totals': RentalAnalytics.summarize(store)
+        }
+
+    def _write_file(self, filename, records):
+        """Write JSON records a line each to a temporary file and rename it into place"""
+        path = os.path.join(self._directory, filename)
+        with persistence('archive_write') as stats, open(path + '.tmp', 'w') as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')))
+                f.write('\n')
+            stats['bytes'] = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+import os
+from models import Bike, Car
+from customer import Customer
+
+FORMATS = ('csv', 'jsonl')
+ITEM_FIELDS = ('type', 'id', 'name', 'rental_price', 'brand', 'bike_type', 'depot')
+CUSTOMER_FIELDS = ('id', 'first_name', 'last_name', 'address', 'contact_number')
+HISTORY_FIELDS = ('customer_id', 'customer_name', 'item_id', 'item_name', 'start_time', 'end_time', 'cost')
+EXPORT_FIELDS = {'items': ITEM_FIELDS, 'customers': CUSTOMER_FIELDS, 'history': HISTORY_FIELDS}
+IMPORT_KINDS = ('items', 'customers')
+MAX_ERRORS = 100  # Errors reported per import; the rest are only counted
+CHUNK_SIZE = 64 * 1024  # Characters of exported text sent to the client at a time
+
+def require(data, field):
+    """Get a field that must be present in a record or request body"""
+    if not isinstance(data, dict):
+        raise ValueError("Each record must be a JSON object")
+    value = data.get(field)
+    if value is None:
+        raise ValueError(f"Missing field: {field}")
+    return value
+
+def require_text(data, field):
+    """Get a field that must be present in a record or request body as a string"""
+    value = require(data, field)
+    if not isinstance(value, str):
+        raise ValueError(f"Field {field} must be a string")
+    return value
+
+def item_from_record(data):
+    """Create a Bike or Car from an imported record or API request body"""
+    rental_price = float(require(data, 'rental_price'))
+    item_type = require(data, 'type')
+    if item_type == 'bike':
+        return Bike(require_text(data, 'id'), require_text(data, 'name'), rental_price, require_text(data, 'bike_type'))
+    elif item_type == 'car':
+        return Car(require_text(data, 'id'), require_text(data, 'name'), rental_price, require_text(data, 'brand'))
+    raise ValueError(f"Unknown item type: {item_type}")
+
+def customer_from_record(data):
+    """Create a Customer from an imported record or API request body"""
+    return Customer(*(require_text(data, field) for field in CUSTOMER_FIELDS))
+
+def item_to_record(item, depot=None):
+    """Get the flat record form of an item, as import reads it"""
+    type_info = item.get_type_info()
+    return {'type': type_info['type'], 'id': item.id, 'name': item.name, 'rental_price': item.rental_price,
+            'brand': type_info.get('brand'), 'bike_type': type_info.get('bike_type'), 'depot': depot}
+
+def customer_to_record(customer):
+    """Get the flat record form of a customer, as import reads it"""
+    return {field: value for field, value in customer.to_dict().items() if field in CUSTOMER_FIELDS}
+
+def check_format(fmt):
+    """Check that a bulk data format is supported"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(FORMATS)}")
+    return fmt
+
+def check_kind(kind, kinds):
+    """Check that a kind of record is supported"""
+    if kind not in kinds:
+        raise ValueError(f"Kind must be one of: {', '.join(kinds)}")
+    return kind
+
+def format_for(filename, default='jsonl'):
+    """Guess the format of a file from its extension"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return 'jsonl' if extension in ('jsonl', 'ndjson') else 'csv' if extension == 'csv' else default
+
+def read_records(lines, fmt):
+    """Yield (line number, record) pairs from CSV or JSONL text, one line at a time
+
+    A line that cannot be parsed is yielded as a ValueError in place of the
+    record, so one bad line does not stop the rest from being read.
+    """
+    if check_format(fmt) == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells are missing fields, as they would be in JSON
+            yield reader.line_num, {field: value for field, value in row.items() if field and value}
+        return
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            record = ValueError("Each line must be a JSON object")
+        yield line_number, record
+
+def import_records(manager, kind, records):
+    """Add the items or customers in (line number, record) pairs, persisting them once
+
+    Each record is validated on its own, then the valid ones are added
+    together so the search and price indexes are updated once for the lot;
+    the result counts the records added and lists the errors of those that
+    were not.
+    """
+    check_kind(kind, IMPORT_KINDS)
+    failures = []  # (line number, error), in line order once sorted
+    line_numbers = []
+    converted = []
+    depots = []
+    for line_number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            converted.append(item_from_record(record) if kind == 'items' else customer_from_record(record))
+        except (ValueError, TypeError) as e:
+            failures.append((line_number, e))
+            continue
+        line_numbers.append(line_number)
+        depots.append(record.get('depot'))
+    with manager.batch():
+        if kind == 'items':
+            refused = manager.add_items(converted, depots)
+        else:
+            refused = manager.add_customers(converted)
+    failures.extend((line_numbers[position], e) for position, e in refused)
+    failures.sort(key=lambda failure: failure[0])
+    errors = [{'line': line_number, 'error': str(e)} for line_number, e in failures[:MAX_ERRORS]]
+    return {'added': len(converted) - len(refused), 'failed': len(failures), 'errors': errors}
+
+def export_records(manager, kind):
+    """Iterate over the records of all items, customers, or the rental history"""
+    check_kind(kind, tuple(EXPORT_FIELDS))
+    if kind == 'items':
+        get_depot = manager.get_item_depot  # Looked up now: the records may be read after the request ends
+        return (item_to_record(item, get_depot(item.id)) for item in list(manager.items.values()))
+    elif kind == 'customers':
+        return map(customer_to_record, list(manager.customers.values()))
+    return manager.iter_history()
+
+def write_records(records, fmt, fields):
+    """Yield records as CSV or JSONL text, a line at a time"""
+    if check_format(fmt) == 'jsonl':
+        for record in records:
+            yield json.dumps(record) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def chunked(lines, size=CHUNK_SIZE):
+    """Join lines of text into chunks of about size characters, so a download isn't sent a line per write"""
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield ''.join(chunk)
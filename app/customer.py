@@ -1,6 +1,8 @@
 from datetime import datetime
 
 class Customer:
+    __slots__ = ('_id', '_first_name', '_last_name', '_address', '_contact_number', '_active_rentals')
+
     def __init__(self, id, first_name, last_name, address, contact_number, active_rentals=None):
         self._id = id
         self._first_name = first_name
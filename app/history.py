@@ -0,0 +1,299 @@
+import heapq
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from itertools import islice
+
+EPOCH = datetime(1970, 1, 1)
+# Fields of a rental history entry, in the order the compact formats store them
+HISTORY_COLUMNS = ('customer_id', 'customer_name', 'item_id', 'item_name', 'start_time', 'end_time', 'cost')
+
+def datetime_to_micros(moment):
+    """Convert a naive datetime to whole microseconds since the epoch"""
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+def to_micros(timestamp):
+    """Convert an ISO timestamp to whole microseconds since the epoch"""
+    return datetime_to_micros(datetime.fromisoformat(timestamp))
+
+def from_micros(micros):
+    """Convert microseconds since the epoch back to an ISO timestamp"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+def micros_to_datetime(micros):
+    """Convert microseconds since the epoch back to a naive datetime"""
+    return EPOCH + timedelta(microseconds=micros)
+
+class HistoryStore(Sequence):
+    """Rental history kept in parallel arrays rather than one dict per rental
+
+    Entries are only ever appended, so views can refer to them by position.
+    Indexing builds the dict form of an entry on demand. Timestamps are stored
+    as integer microseconds, which round-trips them exactly.
+
+    Positions count from the first rental ever recorded. Entries before base
+    have been moved to a HistoryArchive; looking them up loads them from there,
+    while indexing, iteration, and the columns only cover entries in memory.
+    """
+
+    __slots__ = ('_customer_ids', '_customer_names', '_item_ids', '_item_names',
+                 '_starts', '_ends', '_costs', '_strings', '_base', '_archive')
+
+    def __init__(self, entries=(), base=0, archive=None):
+        self._base = base
+        self._archive = archive
+        self._customer_ids = []
+        self._customer_names = []
+        self._item_ids = []
+        self._item_names = []
+        self._starts = array('q')
+        self._ends = array('q')
+        self._costs = array('d')
+        self._strings = {}  # One shared copy of each ID and name
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        """Add a rental history entry and return its position"""
+        share = self._strings.setdefault
+        self._customer_ids.append(share(entry['customer_id'], entry['customer_id']))
+        self._customer_names.append(share(entry['customer_name'], entry['customer_name']))
+        self._item_ids.append(share(entry['item_id'], entry['item_id']))
+        self._item_names.append(share(entry['item_name'], entry['item_name']))
+        self._starts.append(to_micros(entry['start_time']))
+        self._ends.append(to_micros(entry['end_time']))
+        self._costs.append(entry['cost'])  # Appended last: readers use it for the length
+        return self._base + len(self._costs) - 1
+
+    @property
+    def base(self):
+        """Get the position of the first entry held in memory"""
+        return self._base
+
+    @property
+    def end(self):
+        """Get the position the next entry will be stored at"""
+        return self._base + len(self._costs)
+
+    @property
+    def archive(self):
+        """Get the archive holding the entries before base, or None"""
+        return self._archive
+
+    def attach(self, archive):
+        """Use an archive for the entries before base, e.g. after unpickling"""
+        self._archive = archive
+
+    def __getstate__(self):
+        # The archive holds a lock and its own files, so it is left out and reattached
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_archive'}
+
+    def __setstate__(self, state):
+        self._archive = None
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def tail(self, position):
+        """Get a new store with the entries from a position onwards"""
+        store = HistoryStore(base=position, archive=self._archive)
+        start = position - self._base
+        store._customer_ids = self._customer_ids[start:]
+        store._customer_names = self._customer_names[start:]
+        store._item_ids = self._item_ids[start:]
+        store._item_names = self._item_names[start:]
+        store._starts = self._starts[start:]
+        store._ends = self._ends[start:]
+        store._costs = self._costs[start:]
+        # Only the strings still in use stay shared
+        for strings in (store._customer_ids, store._customer_names, store._item_ids, store._item_names):
+            for string in strings:
+                store._strings.setdefault(string, string)
+        return store
+
+    def __len__(self):
+        return len(self._costs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.entry(self._base + i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self.entry(self._base + index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.entry(self._base + i)
+
+    def _locate(self, position):
+        """Get the store holding a position and the entry's index in it"""
+        if position < self._base:
+            if self._archive is None or position < 0:
+                raise IndexError("history position out of range")
+            return self._archive.locate(position)
+        return self, position - self._base
+
+    def entry(self, position):
+        """Get the entry at a position as a rental_history dict"""
+        store, i = self._locate(position)
+        return {
+            'customer_id': store._customer_ids[i],
+            'customer_name': store._customer_names[i],
+            'item_id': store._item_ids[i],
+            'item_name': store._item_names[i],
+            'start_time': from_micros(store._starts[i]),
+            'end_time': from_micros(store._ends[i]),
+            'cost': store._costs[i]
+        }
+
+    def item_entry(self, position):
+        """Get the entry at a position in the form RentalObject keeps its own history"""
+        store, i = self._locate(position)
+        return {
+            'start_time': from_micros(store._starts[i]),
+            'end_time': from_micros(store._ends[i]),
+            'duration_hours': (store._ends[i] - store._starts[i]) / 1000000 / 3600,
+            'cost': store._costs[i]
+        }
+
+    # Columns of the entries in memory, for whole-history computations; they must not be modified
+
+    @property
+    def item_ids(self):
+        """Get the item ID column"""
+        return self._item_ids
+
+    @property
+    def customer_ids(self):
+        """Get the customer ID column"""
+        return self._customer_ids
+
+    @property
+    def starts(self):
+        """Get the start time column, in microseconds since the epoch"""
+        return self._starts
+
+    @property
+    def ends(self):
+        """Get the end time column, in microseconds since the epoch"""
+        return self._ends
+
+    @property
+    def costs(self):
+        """Get the cost column"""
+        return self._costs
+
+    def item_id(self, position):
+        """Get the item ID of the entry at a position"""
+        store, i = self._locate(position)
+        return store._item_ids[i]
+
+    def customer_id(self, position):
+        """Get the customer ID of the entry at a position"""
+        store, i = self._locate(position)
+        return store._customer_ids[i]
+
+    def times(self, position):
+        """Get the (start, end) of the entry at a position, in microseconds since the epoch"""
+        store, i = self._locate(position)
+        return store._starts[i], store._ends[i]
+
+    def cost(self, position):
+        """Get the cost of the entry at a position"""
+        store, i = self._locate(position)
+        return store._costs[i]
+
+class HistoryView(Sequence):
+    """Read-only view of selected HistoryStore entries, without copying them
+
+    The positions array is shared with its owner, so entries appended to it
+    show up in the view. Entries in extra come first; they hold records that
+    are not in the store, such as item history saved by older versions.
+    """
+
+    __slots__ = ('_store', '_positions', '_item_form', '_extra')
+
+    def __init__(self, store, positions, item_form=False, extra=()):
+        self._store = store
+        self._positions = positions
+        self._item_form = item_form
+        self._extra = tuple(extra)
+
+    def __len__(self):
+        return len(self._extra) + len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        if index < len(self._extra):
+            return dict(self._extra[index])
+        position = self._positions[index - len(self._extra)]
+        return self._store.item_entry(position) if self._item_form else self._store.entry(position)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def copy(self):
+        """Get the entries as a new list"""
+        return list(self)
+
+    def rebind(self, store, positions):
+        """Get a view of other positions, in another store, keeping the extra entries"""
+        return HistoryView(store, positions, self._item_form, self._extra)
+
+class MergedHistoryView(Sequence):
+    """Read-only view of several histories as one, in order of return
+
+    Each part must already be in order of return, as the histories of one
+    RentalManager are. Iterating merges them as it goes, from the start or
+    from the end. Indexing merges only as far as the entries asked for, from
+    whichever end is nearer, e.g. [-1] merges one entry from the end; when
+    that is every entry, the result is kept for later indexing.
+    """
+
+    __slots__ = ('_parts', '_entries')
+
+    def __init__(self, parts):
+        self._parts = tuple(parts)
+        self._entries = None
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
+
+    def __getitem__(self, index):
+        if self._entries is not None:
+            return self._entries[index]
+        length = len(self)
+        positions = range(length)[index]  # Raises IndexError for an int out of range
+        wanted = [positions] if isinstance(index, int) else positions
+        if not wanted:
+            return []
+        first, last = min(wanted[0], wanted[-1]), max(wanted[0], wanted[-1])
+        if last + 1 < length - first:
+            head = list(islice(self, last + 1))
+            entries = [head[position] for position in wanted]
+        elif first > 0:
+            tail = list(islice(reversed(self), length - first))  # tail[i] is entry length - 1 - i
+            entries = [tail[length - 1 - position] for position in wanted]
+        else:
+            self._entries = list(self)
+            return self._entries[index]
+        return entries[0] if isinstance(index, int) else entries
+
+    def __iter__(self):
+        return heapq.merge(*self._parts, key=lambda entry: to_micros(entry['end_time']))
+
+    def __reversed__(self):
+        return heapq.merge(*(reversed(part) for part in self._parts), key=lambda entry: to_micros(entry['end_time']),
+                           reverse=True)
+
+    def copy(self):
+        """Get the entries as a new list"""
+        return list(self)
@@ -0,0 +1,142 @@
+import json
+import os
+from contextlib import contextmanager
+from metrics import PERSISTENCE_BYTES, persistence
+
+class Journal:
+    """Append-only log of RentalManager mutations, one JSON record per line"""
+
+    def __init__(self, filename='data.journal', compact_every=1000, fsync=False):
+        if compact_every <= 0:
+            raise ValueError("compact_every must be a positive number")
+        self._filename = filename
+        self._compact_every = compact_every
+        self._fsync = fsync
+        self._last_seq = 0
+        self._pending = 0  # Records appended since the last compaction
+        self._file = None
+        self._buffer_depth = 0  # Nesting level of buffered() blocks
+
+    @property
+    def filename(self):
+        """Get journal file name"""
+        return self._filename
+
+    @property
+    def rotated_filename(self):
+        """Get name of the file holding records set aside by rotate()"""
+        return self._filename + '.1'
+
+    @property
+    def last_seq(self):
+        """Get sequence number of the last record written or replayed"""
+        return self._last_seq
+
+    @property
+    def pending(self):
+        """Get number of records not yet folded into a snapshot"""
+        return self._pending
+
+    def needs_compaction(self):
+        """Check if enough records have accumulated to warrant a new snapshot"""
+        return self._pending >= self._compact_every
+
+    def append(self, op, **data):
+        """Append a single mutation record and flush it to disk"""
+        if self._file is None:
+            self._file = open(self._filename, 'a', encoding='utf-8')
+        self._last_seq += 1
+        record = {'seq': self._last_seq, 'op': op}
+        record.update(data)
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        self._file.write(line)
+        PERSISTENCE_BYTES.inc(len(line), operation='journal_append')
+        if not self._buffer_depth:
+            self._flush()
+        self._pending += 1
+        return self._last_seq
+
+    @contextmanager
+    def buffered(self):
+        """Defer flushing appended records until the block exits"""
+        self._buffer_depth += 1
+        try:
+            yield self
+        finally:
+            self._buffer_depth -= 1
+            if not self._buffer_depth and self._file is not None:
+                self._flush()
+
+    def _flush(self):
+        """Push written records to the operating system, and to disk if fsync is on"""
+        with persistence('journal_flush'):
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+
+    def replay(self, after_seq=0):
+        """Yield records with a sequence number greater than after_seq"""
+        self._last_seq = max(self._last_seq, after_seq)
+        self._pending = 0
+        for filename in (self.rotated_filename, self._filename):
+            yield from self._replay_file(filename, after_seq)
+
+    def _replay_file(self, filename, after_seq):
+        try:
+            f = open(filename, 'rb')
+        except FileNotFoundError:
+            return
+        good_offset = 0
+        torn = False
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    torn = True
+                    break
+                good_offset += len(line)
+                self._last_seq = max(self._last_seq, record['seq'])
+                if record['seq'] <= after_seq:
+                    continue
+                self._pending += 1
+                yield record
+        if torn:
+            # A torn final line means we crashed mid-append; the mutation never
+            # completed, so drop it before new records are appended after it.
+            print(f"Discarding incomplete journal record in {filename}")
+            with open(filename, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def rotate(self):
+        """Set the current records aside so new ones start a fresh file
+
+        Call while a snapshot covering every record so far is captured, then
+        discard_rotated() once that snapshot is safely on disk.
+        """
+        self.close()
+        # If an earlier snapshot failed the old side file is still needed, so
+        # keep appending to the current file; replay skips covered records
+        if not os.path.exists(self.rotated_filename) and os.path.exists(self._filename):
+            os.replace(self._filename, self.rotated_filename)
+        self._pending = 0
+
+    def discard_rotated(self):
+        """Delete records set aside by rotate() once a snapshot covers them"""
+        try:
+            os.remove(self.rotated_filename)
+        except FileNotFoundError:
+            pass
+
+    def truncate(self):
+        """Discard all records once they are covered by a snapshot"""
+        self.close()
+        open(self._filename, 'w').close()
+        self.discard_rotated()
+        self._pending = 0
+
+    def close(self):
+        """Close the underlying file handle"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
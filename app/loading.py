@@ -0,0 +1,60 @@
+import threading
+
+
+class LoadOnce:
+    """Mixin loading a manager's data once, on demand or in the background
+
+    The class provides load_data(), which must call _loaded_ok() when it
+    succeeds, and calls _init_loading() from its constructor. Until the data
+    is loaded, ensure_loaded() waits for a load that is under way or starts
+    one, so a server can start answering while the data is read.
+    """
+
+    def _init_loading(self):
+        """Set up the load state; call from __init__"""
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_error = None
+
+    def _loaded_ok(self):
+        """Record that load_data() finished"""
+        self._load_error = None
+        self._loaded.set()
+
+    @property
+    def load_state(self):
+        """Get whether the data is 'ready', 'loading', 'failed', or 'not loaded'"""
+        if self._loaded.is_set():
+            return 'ready'
+        if self._load_lock.locked():
+            return 'loading'
+        return 'failed' if self._load_error is not None else 'not loaded'
+
+    @property
+    def load_error(self):
+        """Get the error that stopped the last load, or None"""
+        return self._load_error
+
+    def ensure_loaded(self):
+        """Load the data unless it already is, waiting for a load that is under way"""
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if self._loaded.is_set():
+                return  # Loaded by another thread while this one waited
+            try:
+                self.load_data()
+            except Exception as e:
+                self._load_error = e
+                raise
+
+    def load_in_background(self):
+        """Start loading the data on a daemon thread, and return the thread"""
+        def load():
+            try:
+                self.ensure_loaded()
+            except Exception as e:
+                print(f"Background load failed: {str(e)}")
+        thread = threading.Thread(target=load, name='rental-data-load', daemon=True)
+        thread.start()
+        return thread
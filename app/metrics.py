@@ -0,0 +1,277 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds, from a fast search to a slow full snapshot
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _format_labels(names, values, extra=()):
+    """Format label pairs the way the Prometheus text format writes them"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    """Format a sample value, keeping whole numbers short"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric(ABC):
+    """Abstract base class for a named metric with a fixed set of label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self._name = name
+        self._help = help
+        self._label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        """Get the metric name"""
+        return self._name
+
+    def _key(self, labels):
+        """Get the label values in label name order"""
+        if labels.keys() != set(self._label_names):
+            raise ValueError(f"Metric {self._name} takes labels {', '.join(self._label_names) or 'none'}")
+        return tuple(labels[name] for name in self._label_names)
+
+    @abstractmethod
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value) for each sample"""
+        pass
+
+    def render(self):
+        """Format the metric as lines of the Prometheus text format"""
+        lines = [f'# HELP {self._name} {self._help}', f'# TYPE {self._name} {self.kind}']
+        for suffix, values, extra, value in self.samples():
+            lines.append(f'{self._name}{suffix}{_format_labels(self._label_names, values, extra)} {_format_value(value)}')
+        return lines
+
+class Counter(Metric):
+    """A total that only goes up, like bytes written"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        """Add an amount to the total for a label set"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Get the total for a label set"""
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield '', key, (), value
+
+class Gauge(Metric):
+    """A value read when the metrics are collected, like the number of items
+
+    With labels, func returns a dict from label values to numbers; a single
+    label's values need not be wrapped in tuples.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, func, labels=()):
+        super().__init__(name, help, labels)
+        self._func = func
+
+    def samples(self):
+        if not self._label_names:
+            yield '', (), (), self._func()
+            return
+        for key, value in sorted(self._func().items()):
+            yield '', key if isinstance(key, tuple) else (key,), (), value
+
+class Histogram(Metric):
+    """Counts of observations falling under each bucket bound, with their sum"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self._buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts, then the +Inf count], sum
+
+    def observe(self, value, **labels):
+        """Record one observation for a label set"""
+        key = self._key(labels)
+        i = bisect_left(self._buckets, value)
+        with self._lock:
+            counts_and_sum = self._values.get(key)
+            if counts_and_sum is None:
+                counts_and_sum = self._values[key] = [[0] * (len(self._buckets) + 1), 0.0]
+            counts_and_sum[0][i] += 1
+            counts_and_sum[1] += value
+
+    def count(self, **labels):
+        """Get the number of observations for a label set"""
+        counts_and_sum = self._values.get(self._key(labels))
+        return sum(counts_and_sum[0]) if counts_and_sum else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', key, (('le', _format_value(bound)),), cumulative
+            yield '_sum', key, (), total
+            yield '_count', key, (), cumulative
+
+class Registry:
+    """The set of metrics exposed together on one endpoint"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        """Add a metric, or return the one already registered under its name"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered as a {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        """Get or create a counter"""
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram"""
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, func, labels=()):
+        """Create a gauge that calls func for its values, replacing any earlier one"""
+        gauge = Gauge(name, help, func, labels)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self):
+        """Format every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {str(e)}")
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram('rental_request_duration_seconds', 'Time to handle a web request',
+                                     ('endpoint', 'method', 'status'))
+TEMPLATE_SECONDS = registry.histogram('rental_template_render_duration_seconds', 'Time to render a page template',
+                                      ('template',))
+MANAGER_SECONDS = registry.histogram('rental_manager_call_duration_seconds', 'Time spent in a RentalManager method',
+                                     ('method',))
+PERSISTENCE_SECONDS = registry.histogram('rental_persistence_duration_seconds',
+                                         'Time to read or write persistent storage', ('operation',))
+PERSISTENCE_BYTES = registry.counter('rental_persistence_bytes_total', 'Bytes read from or written to storage files',
+                                     ('operation',))
+PROFILED_REQUESTS = registry.counter('rental_profiled_requests_total', 'Requests run under the profiler',
+                                     ('endpoint',))
+
+def timed(name=None):
+    """Decorate a RentalManager method to record how long each call takes"""
+    def decorator(func):
+        method = name or func.__name__
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                MANAGER_SECONDS.observe(time.perf_counter() - start, method=method)
+        return wrapper
+    return decorator
+
+@contextmanager
+def persistence(operation):
+    """Time a storage read or write; the block may set 'bytes' on the yielded dict"""
+    stats = {'bytes': 0}
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        PERSISTENCE_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        if stats['bytes']:
+            PERSISTENCE_BYTES.inc(stats['bytes'], operation=operation)
+
+class Profiler:
+    """Run cProfile on a random fraction of requests and save the stats to files
+
+    Only one request is profiled at a time, so a busy server pays for at most
+    one profiled request however high the rate. The saved files can be read
+    with `python -m pstats` or any viewer that takes cProfile output.
+    """
+
+    def __init__(self, rate=0.0, directory='profiles'):
+        if not 0 <= rate <= 1:
+            raise ValueError("Profile rate must be between 0 and 1")
+        self._rate = rate
+        self._directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Get the fraction of requests profiled"""
+        return self._rate
+
+    @property
+    def directory(self):
+        """Get the directory profiles are saved in"""
+        return self._directory
+
+    def start(self):
+        """Start profiling the current request if it is sampled, returning the profile or None"""
+        if self._rate <= 0 or random.random() >= self._rate:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None  # Another request is being profiled
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, name):
+        """Stop a profile started by start() and save it, returning the file path"""
+        profile.disable()
+        self._lock.release()
+        PROFILED_REQUESTS.inc(endpoint=name)
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            path = os.path.join(self._directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{name}.prof")
+            profile.dump_stats(path)
+            return path
+        except OSError as e:
+            print(f"Error saving profile: {str(e)}")
+            return None
@@ -1,9 +1,12 @@
 from datetime import datetime
 import json
+import math
 from abc import ABC, abstractmethod
 
 class RentalObject(ABC):
     """Abstract base class for rental objects"""
+
+    __slots__ = ('_id', '_name', '_rental_price', '_is_rented', '_rental_history', '_current_rental_start')
     
     def __init__(self, id, name, rental_price, is_rented=False, rental_history=None):
         self._validate_init_params(id, name, rental_price)
@@ -20,7 +23,7 @@ class RentalObject(ABC):
             raise ValueError("ID cannot be empty")
         if not name:
             raise ValueError("Name cannot be empty")
-        if not isinstance(rental_price, (int, float)) or rental_price <= 0:
+        if not isinstance(rental_price, (int, float)) or not math.isfinite(rental_price) or rental_price <= 0:
             raise ValueError("Rental price must be a positive number")
 
     @property
@@ -33,11 +36,25 @@ class RentalObject(ABC):
         """Get rental object name"""
         return self._name
 
+    @name.setter
+    def name(self, value):
+        """Set rental object name"""
+        if not value:
+            raise ValueError("Name cannot be empty")
+        self._name = value
+
     @property
     def rental_price(self):
         """Get rental price per hour"""
         return self._rental_price
 
+    @rental_price.setter
+    def rental_price(self, value):
+        """Set rental price per hour"""
+        if not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:  # NaN passes <= 0
+            raise ValueError("Rental price must be a positive number")
+        self._rental_price = value
+
     @property
     def is_rented(self):
         """Check if object is currently rented"""
@@ -45,41 +62,61 @@ class RentalObject(ABC):
 
     @property
     def rental_history(self):
-        """Get rental history"""
-        return self._rental_history.copy()  # Return copy to prevent direct modification
+        """Get rental history as a read-only sequence; under RentalManager, only months still in memory"""
+        if isinstance(self._rental_history, list):
+            return tuple(self._rental_history)  # Standalone objects keep a plain list
+        return self._rental_history  # A view of RentalManager's history, which is read-only
 
-    def rent(self):
+    def rent(self, start_time=None):
         """Rent the object"""
         if self._is_rented:
             raise ValueError(f"{self._name} is already rented")
         self._is_rented = True
-        self._current_rental_start = datetime.now()
+        self._current_rental_start = start_time or datetime.now()
         return True
 
-    def return_item(self):
+    def return_item(self, end_time=None):
         """Return the rented object and calculate rental cost"""
-        if not self._is_rented:
-            raise ValueError(f"{self._name} is not currently rented")
-        if not self._current_rental_start:
-            raise ValueError("Rental start time not recorded")
-
-        rental_duration = (datetime.now() - self._current_rental_start).total_seconds() / 3600  # hours
-        rental_cost = self._rental_price * rental_duration
+        start_time = self._current_rental_start
+        end_time, rental_cost = self.end_rental(end_time)
 
         # Add to rental history
         rental_record = {
-            'start_time': self._current_rental_start.isoformat(),
-            'end_time': datetime.now().isoformat(),
-            'duration_hours': rental_duration,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration_hours': (end_time - start_time).total_seconds() / 3600,
             'cost': rental_cost
         }
         self._rental_history.append(rental_record)
+        return rental_cost
+
+    def end_rental(self, end_time=None):
+        """Finish the current rental without recording it; returns (end_time, cost)"""
+        if not self._is_rented:
+            raise ValueError(f"{self._name} is not currently rented")
+        if not self._current_rental_start:
+            raise ValueError("Rental start time not recorded")
+
+        end_time = end_time or datetime.now()
+        rental_duration = (end_time - self._current_rental_start).total_seconds() / 3600  # hours
+        rental_cost = self._rental_price * rental_duration
 
         # Reset rental state
         self._is_rented = False
         self._current_rental_start = None
 
-        return rental_cost
+        return end_time, rental_cost
+
+    def use_history(self, history):
+        """Replace the object's own history list with a shared read-only view"""
+        self._rental_history = history
+
+    def edit_details(self, name=None, rental_price=None):
+        """Edit rental object details"""
+        if name:
+            self.name = name
+        if rental_price is not None:
+            self.rental_price = rental_price
 
     @abstractmethod
     def get_type_info(self):
@@ -93,7 +130,7 @@ class RentalObject(ABC):
             'name': self._name,
             'rental_price': self._rental_price,
             'is_rented': self._is_rented,
-            'rental_history': self._rental_history,
+            'rental_history': list(self._rental_history),
             'current_rental_start': self._current_rental_start.isoformat() if self._current_rental_start else None,
             'type': self.get_type_info()['type']
         }
@@ -119,6 +156,8 @@ class RentalObject(ABC):
 
 class Car(RentalObject):
     """Car rental object"""
+
+    __slots__ = ('_brand',)
     
     def __init__(self, id, name, rental_price, brand, is_rented=False, rental_history=None):
         super().__init__(id, name, rental_price, is_rented, rental_history)
@@ -131,6 +170,19 @@ class Car(RentalObject):
         """Get car brand"""
         return self._brand
 
+    @brand.setter
+    def brand(self, value):
+        """Set car brand"""
+        if not value:
+            raise ValueError("Brand cannot be empty")
+        self._brand = value
+
+    def edit_details(self, name=None, rental_price=None, brand=None):
+        """Edit car details"""
+        super().edit_details(name, rental_price)
+        if brand:
+            self.brand = brand
+
     def get_type_info(self):
         """Get car-specific information"""
         return {
@@ -147,7 +199,7 @@ class Car(RentalObject):
     @classmethod
     def from_dict(cls, data):
         """Create car object from dictionary"""
-        return cls(
+        obj = cls(
             id=data['id'],
             name=data['name'],
             rental_price=data['rental_price'],
@@ -155,9 +207,14 @@ class Car(RentalObject):
             is_rented=data.get('is_rented', False),
             rental_history=data.get('rental_history', [])
         )
+        if data.get('current_rental_start'):
+            obj._current_rental_start = datetime.fromisoformat(data['current_rental_start'])
+        return obj
 
 class Bike(RentalObject):
     """Bike rental object"""
+
+    __slots__ = ('_bike_type',)
     
     def __init__(self, id, name, rental_price, bike_type, is_rented=False, rental_history=None):
         super().__init__(id, name, rental_price, is_rented, rental_history)
@@ -170,6 +227,19 @@ class Bike(RentalObject):
         """Get bike type"""
         return self._bike_type
 
+    @bike_type.setter
+    def bike_type(self, value):
+        """Set bike type"""
+        if not value:
+            raise ValueError("Bike type cannot be empty")
+        self._bike_type = value
+
+    def edit_details(self, name=None, rental_price=None, bike_type=None):
+        """Edit bike details"""
+        super().edit_details(name, rental_price)
+        if bike_type:
+            self.bike_type = bike_type
+
     def get_type_info(self):
         """Get bike-specific information"""
         return {
@@ -186,7 +256,7 @@ class Bike(RentalObject):
     @classmethod
     def from_dict(cls, data):
         """Create bike object from dictionary"""
-        return cls(
+        obj = cls(
             id=data['id'],
             name=data['name'],
             rental_price=data['rental_price'],
@@ -194,6 +264,18 @@ class Bike(RentalObject):
             is_rented=data.get('is_rented', False),
             rental_history=data.get('rental_history', [])
         )
+        if data.get('current_rental_start'):
+            obj._current_rental_start = datetime.fromisoformat(data['current_rental_start'])
+        return obj
+
+def item_from_dict(data):
+    """Create a Bike or Car from its dictionary form"""
+    item_type = data.get('type', 'generic')
+    if item_type == 'bike':
+        return Bike.from_dict(data)
+    elif item_type == 'car':
+        return Car.from_dict(data)
+    return None
 
 class RentalEncoder(json.JSONEncoder):
     """JSON encoder for rental objects"""
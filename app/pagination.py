@@ -0,0 +1,82 @@
+from itertools import islice
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 200
+
+class Page:
+    """One page of a larger listing"""
+
+    def __init__(self, entries, total, page, per_page):
+        self._entries = entries
+        self._total = total
+        self._page = page
+        self._per_page = per_page
+
+    @property
+    def entries(self):
+        """Get the entries on this page"""
+        return self._entries
+
+    @property
+    def total(self):
+        """Get the number of entries across all pages"""
+        return self._total
+
+    @property
+    def page(self):
+        """Get the 1-based page number"""
+        return self._page
+
+    @property
+    def per_page(self):
+        """Get the maximum number of entries per page"""
+        return self._per_page
+
+    @property
+    def pages(self):
+        """Get the number of pages"""
+        return max(1, -(-self._total // self._per_page))
+
+    @property
+    def has_prev(self):
+        """Check if there is a previous page"""
+        return self._page > 1
+
+    @property
+    def has_next(self):
+        """Check if there is a next page"""
+        return self._page < self.pages
+
+    @property
+    def prev_num(self):
+        """Get the previous page number"""
+        return self._page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        """Get the next page number"""
+        return self._page + 1 if self.has_next else None
+
+    def map(self, convert):
+        """Get the same page with every entry converted"""
+        return Page([convert(entry) for entry in self._entries], self._total, self._page, self._per_page)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+def clamp(page=1, per_page=DEFAULT_PER_PAGE):
+    """Get a page number and page size within the allowed bounds"""
+    return max(int(page or 1), 1), min(max(int(per_page or DEFAULT_PER_PAGE), 1), MAX_PER_PAGE)
+
+def paginate(entries, total, page=1, per_page=DEFAULT_PER_PAGE):
+    """Take one page from a sequence or iterator whose total length is known"""
+    page, per_page = clamp(page, per_page)
+    start = (page - 1) * per_page
+    if isinstance(entries, (list, tuple)):
+        chunk = list(entries[start:start + per_page])
+    else:
+        chunk = list(islice(entries, start, start + per_page))
+    return Page(chunk, total, page, per_page)
@@ -1,110 +1,561 @@
-import json
-from datetime import datetime
-from models import RentalObject, Bike, Car, RentalEncoder
+import heapq
+import os
+import re
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from itertools import chain, islice
+from types import MappingProxyType
+from models import RentalObject, Bike, Car, item_from_dict
 from customer import Customer
+from analytics import RentalAnalytics
+from loading import LoadOnce
+from history import HistoryStore, HistoryView, datetime_to_micros, micros_to_datetime, to_micros
+from metrics import timed
+from pagination import DEFAULT_PER_PAGE, paginate
+from reservations import Reservation, ReservationIndex
+from search_index import SearchIndex, PriceIndex, tokenize
+from storage import JsonStorage
 
-class RentalManager:
+PRICE_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+PRICE_WORDS_PATTERN = re.compile(r'\b(?:under|below|over|above|between|and)\b|\$|\d+(?:\.\d+)?')
+TYPE_WORDS = {'car': 'car', 'cars': 'car', 'bike': 'bike', 'bikes': 'bike'}  # Search words naming an item type
+
+def parse_price_range(query):
+    """Get the (min price, max price) a lowercase search asks for, or None if it names no price range"""
+    # e.g. "under 50", "over 99.5", "between 20 and 50"
+    prices = [float(price) for price in PRICE_PATTERN.findall(query)]
+    if len(prices) >= 2 and re.search(r'\bbetween\b', query):
+        return tuple(sorted(prices[:2]))
+    elif prices and re.search(r'\b(?:under|below)\b', query):
+        return None, prices[0]
+    elif prices and re.search(r'\b(?:over|above)\b', query):
+        return prices[0], None
+    return None
+
+class RentalManager(LoadOnce):
     """Manages rental operations, customers, and items"""
     
-    def __init__(self):
+    def __init__(self, storage=None, flush_interval=None, depot=None):
+        self._depot = depot  # Name of the depot whose items this manager holds, when sharded by depot
         self._items = {}
         self._customers = {}
         self._active_rentals = {}  # Track active rentals with (customer_id, item_id) as key
-        self._rental_history = []  # Track all rental history
+        self._rentals_by_customer = {}  # customer_id -> set of rented item_ids
+        self._renter_by_item = {}  # item_id -> customer_id currently renting it
+        self._rental_history = HistoryStore()  # Track all rental history; older months may be archived
+        self._history_by_item = defaultdict(self._positions)  # item_id -> positions in _rental_history, in memory
+        self._history_by_customer = defaultdict(self._positions)  # customer_id -> positions in _rental_history, in memory
+        self._item_index = SearchIndex()  # Tokens of item name, type, and brand/bike type
+        self._customer_index = SearchIndex()  # Tokens of customer name, address, and contact
+        self._price_index = {}  # (item type, is available) -> PriceIndex
+        self._analytics = RentalAnalytics(self._items)  # Revenue totals, updated as rentals are returned
+        self._reservations = {}  # reservation_id -> Reservation
+        self._reservations_by_customer = {}  # customer_id -> set of reservation_ids
+        self._reservation_index = ReservationIndex()  # Reservations per item, for availability checks
+
+        # Every change bumps the version, for HTTP caching, and drops the cached
+        # display rows of the items and customers it touched
+        self._version = 0
+        self._instance = uuid.uuid4().hex[:8]  # Versions from different processes never compare equal
+        self._last_modified = datetime.now(timezone.utc)
+        self._item_rows = {}  # item_id -> dashboard row
+        self._customer_rows = {}  # customer_id -> dashboard row
+        self._recent = None  # (n, last n history entries)
+        self._storage = storage if storage is not None else JsonStorage()
+
+        # Writers apply changes under _lock, which is only held for in-memory updates.
+        # Readers take no locks; indexes swap in new lists rather than mutating shared ones.
+        self._lock = threading.RLock()
+        self._item_locks = {}  # item_id -> Lock serializing rent/return/edit/remove of that item
+        self._write_lock = threading.RLock()  # Single writer for the storage backend
+        self._pending_records = deque()  # Mutations applied in memory, in order, not yet stored
+        self._local = threading.local()  # Per-thread batch() nesting level
+
+        # With a flush interval, full saves run on a background timer and every
+        # save_data() call within the window shares one write
+        self._flush_interval = flush_interval
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()  # Keeps full writes in the order they were captured
+
+        # Data is loaded once, by load_data() or the first ensure_loaded(), which
+        # may run on a background thread while the server starts answering
+        self._init_loading()
+
+    @property
+    def storage(self):
+        """Get the storage backend"""
+        return self._storage
+
+    @property
+    def depot(self):
+        """Get the name of the depot this manager holds, or None"""
+        return self._depot
+
+    @property
+    def depots(self):
+        """Get the names of the depots items can be added to; empty when items have no depot"""
+        return (self._depot,) if self._depot is not None else ()
+
+    @property
+    def analytics(self):
+        """Get the revenue totals over the rental history"""
+        return self._analytics
+
+    @property
+    def data_version(self):
+        """Get a counter that increases whenever any data changes"""
+        return self._version
+
+    @property
+    def data_etag(self):
+        """Get an HTTP entity tag for the current data"""
+        return f'{self._instance}-{self._version}'
+
+    @property
+    def last_modified(self):
+        """Get when the data last changed, in UTC"""
+        return self._last_modified
 
     @property
     def items(self):
-        """Get all rental items"""
-        return self._items.copy()  # Return copy to prevent direct modification
+        """Get a read-only live view of all rental items"""
+        return MappingProxyType(self._items)
 
     @property
     def customers(self):
-        """Get all customers"""
-        return self._customers.copy()  # Return copy to prevent direct modification
+        """Get a read-only live view of all customers"""
+        return MappingProxyType(self._customers)
 
     @property
     def rental_history(self):
-        """Get rental history"""
-        return self._rental_history.copy()  # Return copy to prevent direct modification
+        """Get a read-only view of the rental history as it is now, archived entries included"""
+        return HistoryView(self._rental_history, range(self._rental_history.end))
+
+    def get_item(self, item_id):
+        """Get a single item by ID, or None"""
+        return self._items.get(item_id)
+
+    def get_customer(self, customer_id):
+        """Get a single customer by ID, or None"""
+        return self._customers.get(customer_id)
+
+    def get_item_depot(self, item_id):
+        """Get the depot holding an item, or None"""
+        return self._depot if item_id in self._items else None
 
-    def add_item(self, item):
-        """Add a rental item to the system"""
+    @timed()
+    def add_item(self, item, depot=None):
+        """Add a rental item to the system, at this manager's depot if one is given"""
+        self._check_new_item(item, depot)
+        with self._exclusive():
+            with self._lock:
+                self._check_new_item(item, depot)
+                self._add_item(item)
+                self._log('add_item', item=item.to_dict())
+            self._write_pending()
+
+    @timed()
+    def add_items(self, items, depots=None):
+        """Add many rental items, indexing them together once they are all in
+
+        depots optionally gives each item's depot, as add_item() takes it.
+        Items that can't be added are skipped; returns the (position, error)
+        of each of them.
+        """
+        items = list(items)
+        depots = list(depots) if depots is not None else [None] * len(items)
+        errors = []
+        added = []
+        with self._exclusive():
+            with self._lock:
+                for position, (item, depot) in enumerate(zip(items, depots)):
+                    try:
+                        self._check_new_item(item, depot)
+                    except (ValueError, TypeError) as e:
+                        errors.append((position, e))
+                        continue
+                    self._add_item(item, index=False)
+                    self._log('add_item', item=item.to_dict())
+                    added.append(item)
+                self._index_items(added)
+            self._write_pending()
+        return errors
+
+    def _check_new_item(self, item, depot):
+        """Check that an item can be added, at a depot if one is given"""
         if not isinstance(item, RentalObject):
             raise TypeError("Item must be a RentalObject")
+        if depot is not None and depot != self._depot:
+            raise ValueError(f"Unknown depot: {depot}")
         if item.id in self._items:
             raise ValueError(f"Item with ID {item.id} already exists")
-        self._items[item.id] = item
 
+    @timed()
     def remove_item(self, item_id):
         """Remove an item from the system"""
-        item = self._items.get(item_id)
-        if not item:
-            raise ValueError(f"Item with ID {item_id} does not exist")
-        if item.is_rented:
-            raise ValueError("Cannot remove item while it is being rented")
-        del self._items[item_id]
+        with self._exclusive(), self._item_lock(item_id):
+            with self._lock:
+                item = self._items.get(item_id)
+                if not item:
+                    raise ValueError(f"Item with ID {item_id} does not exist")
+                if item.is_rented:
+                    raise ValueError("Cannot remove item while it is being rented")
+                if self._reservation_index.for_item(item_id, after=datetime.now()):
+                    raise ValueError("Cannot remove item while it has upcoming reservations")
+                self._remove_item(item_id)
+                self._log('remove_item', item_id=item_id)
+            self._write_pending()
         return True
 
+    @timed()
+    def edit_item(self, item_id, name=None, rental_price=None, brand=None, bike_type=None):
+        """Edit item details"""
+        with self._exclusive(), self._item_lock(item_id):
+            with self._lock:
+                item = self._items.get(item_id)
+                if not item:
+                    raise ValueError(f"Item with ID {item_id} does not exist")
+                if rental_price is not None and rental_price != item.rental_price and item.is_rented:
+                    raise ValueError("Cannot change the price while the item is being rented")
+                if brand and not isinstance(item, Car):
+                    raise ValueError("Only cars have a brand")
+                if bike_type and not isinstance(item, Bike):
+                    raise ValueError("Only bikes have a bike type")
+                self._edit_item(item, name, rental_price, brand, bike_type)
+                self._log('edit_item', item_id=item_id, name=name, rental_price=rental_price,
+                          brand=brand, bike_type=bike_type)
+            self._write_pending()
+        return True
+
+    @timed()
     def add_customer(self, customer):
         """Add a new customer to the system"""
+        self._check_new_customer(customer)
+        with self._exclusive():
+            with self._lock:
+                self._check_new_customer(customer)
+                self._add_customer(customer)
+                self._log('add_customer', customer=customer.to_dict())
+            self._write_pending()
+
+    @timed()
+    def add_customers(self, customers):
+        """Add many customers, indexing them together once they are all in
+
+        Customers that can't be added are skipped; returns the (position,
+        error) of each of them.
+        """
+        errors = []
+        added = []
+        with self._exclusive():
+            with self._lock:
+                for position, customer in enumerate(customers):
+                    try:
+                        self._check_new_customer(customer)
+                    except (ValueError, TypeError) as e:
+                        errors.append((position, e))
+                        continue
+                    self._add_customer(customer, index=False)
+                    self._log('add_customer', customer=customer.to_dict())
+                    added.append(customer)
+                self._customer_index.add_many((customer.id, self._customer_fields(customer)) for customer in added)
+            self._write_pending()
+        return errors
+
+    def _check_new_customer(self, customer):
+        """Check that a customer can be added"""
         if not isinstance(customer, Customer):
             raise TypeError("Customer must be a Customer object")
         if customer.id in self._customers:
             raise ValueError(f"Customer with ID {customer.id} already exists")
-        self._customers[customer.id] = customer
 
+    @timed()
     def remove_customer(self, customer_id):
         """Remove a customer from the system"""
-        customer = self._customers.get(customer_id)
-        if not customer:
-            raise ValueError(f"Customer with ID {customer_id} does not exist")
-        if customer.has_active_rentals():
-            raise ValueError("Cannot remove customer while they have active rentals")
-        del self._customers[customer_id]
+        with self._exclusive():
+            with self._lock:
+                customer = self._customers.get(customer_id)
+                if not customer:
+                    raise ValueError(f"Customer with ID {customer_id} does not exist")
+                if customer.has_active_rentals():
+                    raise ValueError("Cannot remove customer while they have active rentals")
+                if any(reservation.end_time > datetime.now()
+                       for reservation in self.get_customer_reservations(customer_id)):
+                    raise ValueError("Cannot remove customer while they have upcoming reservations")
+                self._remove_customer(customer_id)
+                self._log('remove_customer', customer_id=customer_id)
+            self._write_pending()
         return True
 
+    @timed()
     def edit_customer(self, customer_id, first_name=None, last_name=None, address=None, contact_number=None):
         """Edit customer details"""
-        customer = self._customers.get(customer_id)
-        if not customer:
-            raise ValueError(f"Customer with ID {customer_id} does not exist")
-        customer.edit_details(first_name, last_name, address, contact_number)
+        with self._exclusive():
+            with self._lock:
+                customer = self._customers.get(customer_id)
+                if not customer:
+                    raise ValueError(f"Customer with ID {customer_id} does not exist")
+                self._edit_customer(customer, first_name, last_name, address, contact_number)
+                self._log('edit_customer', customer_id=customer_id, first_name=first_name,
+                          last_name=last_name, address=address, contact_number=contact_number)
+            self._write_pending()
         return True
 
+    @contextmanager
+    def _exclusive(self):
+        """With shared storage, lock out other processes and catch up with their changes"""
+        if not self._storage.shared:
+            yield
+            return
+        # Validation must see every other process's changes, and nobody may
+        # commit between the check and our own write
+        with self._write_lock, self._storage.batch():
+            with self._lock:
+                self._storage.poll(self)
+            yield
+
+    @timed()
+    def refresh(self):
+        """Pick up changes other processes made to shared storage"""
+        if not self._storage.shared:
+            return
+        # A thread holding the write lock is already up to date; don't wait for it
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._storage.poll(self)
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def _item_lock(self, item_id):
+        """Hold the lock that serializes changes to one item
+
+        Locks are kept only for items that exist, and dropped with the item.
+        A caller that waited on a lock dropped meanwhile, while the ID was
+        added again, takes the new item's lock instead.
+        """
+        while True:
+            with self._lock:
+                lock = self._item_locks.get(item_id)
+                if lock is None:
+                    lock = threading.Lock()  # Unknown IDs get a lock of their own, and the caller's check fails
+                    if item_id in self._items:
+                        self._item_locks[item_id] = lock
+            with lock:
+                if self._item_locks.get(item_id, lock) is lock:
+                    yield
+                    return
+
+    def _drop_item_locks(self):
+        """Forget the locks of items that no longer exist, after the items were replaced"""
+        for item_id in [item_id for item_id in self._item_locks if item_id not in self._items]:
+            del self._item_locks[item_id]
+
+    def _add_item(self, item, index=True):
+        """Store an item and index it for search, unless the caller indexes it with others"""
+        self._attach_history(item)
+        if index:
+            # Indexed first: the price index compares the item with others, which can fail
+            self._index_price(item, not item.is_rented)
+            self._index_item(item)
+        self._items[item.id] = item
+        self._changed(item_id=item.id)
+
+    def _index_items(self, items):
+        """Add many items to the search and price indexes, one merge per index"""
+        self._item_index.add_many((item.id, self._item_fields(item)) for item in items)
+        prices = defaultdict(list)
+        for item in items:
+            prices[(item.get_type_info()['type'], not item.is_rented)].append((item.id, item.rental_price))
+        for key, entries in prices.items():
+            index = self._price_index.get(key)
+            if index is None:
+                self._price_index[key] = PriceIndex(entries)
+            else:
+                index.add_many(entries)
+
+    def _attach_history(self, item):
+        """Point an item's own history at the shared store, keeping records the store lacks"""
+        positions = self._history_by_item[item.id]
+        extra = item.rental_history
+        if extra:
+            stored = {self._rental_history.times(position) for position in positions}
+            extra = [entry for entry in extra
+                     if (to_micros(entry['start_time']), to_micros(entry['end_time'])) not in stored]
+        item.use_history(HistoryView(self._rental_history, positions, item_form=True, extra=extra))
+
+    def _remove_item(self, item_id):
+        """Drop an item and its search index entries"""
+        item = self._items.pop(item_id, None)
+        self._item_locks.pop(item_id, None)
+        if item is not None:
+            self._item_index.remove(item_id)
+            self._price_index[(item.get_type_info()['type'], not item.is_rented)].remove(item_id, item.rental_price)
+        for reservation in self._reservation_index.for_item(item_id):  # Past ones only
+            self._remove_reservation(reservation)
+        self._changed(item_id=item_id)
+
+    def _edit_item(self, item, name, rental_price, brand, bike_type):
+        """Update item details and re-index it"""
+        details = {}
+        if brand:
+            details['brand'] = brand
+        if bike_type:
+            details['bike_type'] = bike_type
+        price_index = self._price_index[(item.get_type_info()['type'], not item.is_rented)]
+        price_index.remove(item.id, item.rental_price)
+        try:
+            item.edit_details(name, rental_price, **details)
+        finally:
+            price_index.add(item.id, item.rental_price)
+            self._item_index.update(item.id, *self._item_fields(item))
+            # The renter's row lists the item by name
+            self._changed(item_id=item.id, customer_id=self._renter_by_item.get(item.id))
+
+    def _add_customer(self, customer, index=True):
+        """Store a customer and index them for search, unless the caller indexes them with others"""
+        self._customers[customer.id] = customer
+        if index:
+            self._index_customer(customer)
+        self._changed(customer_id=customer.id)
+
+    def _remove_customer(self, customer_id):
+        """Drop a customer and their search index entries"""
+        self._customers.pop(customer_id, None)
+        self._customer_index.remove(customer_id)
+        for reservation_id in tuple(self._reservations_by_customer.get(customer_id, ())):  # Past ones only
+            self._remove_reservation(self._reservations[reservation_id])
+        self._changed(customer_id=customer_id)
+
+    def _edit_customer(self, customer, first_name, last_name, address, contact_number):
+        """Update customer details and re-index them"""
+        try:
+            customer.edit_details(first_name, last_name, address, contact_number)
+        finally:
+            self._customer_index.update(customer.id, *self._customer_fields(customer))
+            self._changed(customer_id=customer.id)
+
+    def _index_item(self, item):
+        """Add an item to the search index"""
+        self._item_index.add(item.id, *self._item_fields(item))
+
+    @staticmethod
+    def _item_fields(item):
+        """Get the text fields an item is searchable by"""
+        type_info = item.get_type_info()
+        return (item.name, type_info['type'], type_info.get('brand'), type_info.get('bike_type'))
+
+    def _index_price(self, item, available):
+        """Add an item to the price index for its type and availability"""
+        key = (item.get_type_info()['type'], available)
+        index = self._price_index.get(key)
+        if index is None:
+            index = self._price_index[key] = PriceIndex()
+        index.add(item.id, item.rental_price)
+
+    def _move_price(self, item, was_available):
+        """Move an item between the available and rented price indexes"""
+        self._price_index[(item.get_type_info()['type'], was_available)].remove(item.id, item.rental_price)
+        self._index_price(item, not item.is_rented)
+
+    def _index_customer(self, customer):
+        """Add a customer to the search index"""
+        self._customer_index.add(customer.id, *self._customer_fields(customer))
+
+    @staticmethod
+    def _customer_fields(customer):
+        """Get the text fields a customer is searchable by"""
+        # Digits-only contact number so '555 0123' and '555-0123' both match
+        digits = ''.join(filter(str.isdigit, customer.contact_number))
+        return (customer.first_name, customer.last_name, customer.address,
+                customer.contact_number, digits)
+
+    @timed()
     def rent_item(self, customer_id, item_id):
         """Rent an item to a customer"""
-        customer = self._customers.get(customer_id)
-        if not customer:
-            raise ValueError("Invalid customer ID")
-        
-        item = self._items.get(item_id)
-        if not item:
-            raise ValueError("Invalid item ID")
+        # The item lock is held until the rental is stored, so a second request
+        # for the same item waits and then sees it as rented
+        with self._exclusive(), self._item_lock(item_id):
+            with self._lock:
+                customer = self._customers.get(customer_id)
+                if not customer:
+                    raise ValueError("Invalid customer ID")
+                
+                item = self._items.get(item_id)
+                if not item:
+                    raise ValueError("Invalid item ID")
+
+                start_time = datetime.now()
+                reservation = self._reservation_index.at(item_id, start_time)
+                if reservation is not None and reservation.customer_id != customer_id:
+                    raise ValueError(f"{item.name} is reserved by another customer until "
+                                     f"{reservation.end_time.isoformat(' ', 'minutes')}")
+                self._rent(customer, item, start_time)
+                self._log('rent_item', customer_id=customer_id, item_id=item_id,
+                          start_time=start_time.isoformat())
+            self._write_pending()
+        self.save_data()  # Save after successful rental
+        return True
 
+    def _rent(self, customer, item, start_time):
+        """Mark an item as rented by a customer"""
         # These will raise ValueError if there are issues
-        item.rent()
+        item.rent(start_time)
         customer.add_rental(item)
+        self._move_price(item, was_available=True)
         
-        self._active_rentals[(customer_id, item_id)] = {
-            'start_time': datetime.now(),
+        self._active_rentals[(customer.id, item.id)] = {
+            'start_time': start_time,
             'item': item,
             'customer': customer
         }
-        self.save_data()  # Save after successful rental
-        return True
+        self._rentals_by_customer.setdefault(customer.id, set()).add(item.id)
+        self._renter_by_item[item.id] = customer.id
+        # Picking up a reserved item fulfils the reservation
+        reservation = self._reservation_index.at(item.id, start_time)
+        if reservation is not None and reservation.customer_id == customer.id:
+            self._remove_reservation(reservation)
+        self._changed(item_id=item.id, customer_id=customer.id)
 
+    @timed()
     def return_item(self, customer_id, item_id):
         """Return an item rented by a customer"""
-        if (customer_id, item_id) not in self._active_rentals:
-            raise ValueError("No active rental found for this customer and item")
+        with self._exclusive(), self._item_lock(item_id):
+            with self._lock:
+                if (customer_id, item_id) not in self._active_rentals:
+                    raise ValueError("No active rental found for this customer and item")
 
+                end_time = datetime.now()
+                rental_cost = self._return(customer_id, item_id, end_time)
+                self._log('return_item', customer_id=customer_id, item_id=item_id,
+                          end_time=end_time.isoformat(), cost=rental_cost)
+            self._write_pending()
+        self.save_data()  # Save after successful return
+        return rental_cost
+
+    def _return(self, customer_id, item_id, end_time):
+        """Close an active rental and record it in the rental history"""
         customer = self._customers[customer_id]
         item = self._items[item_id]
         
-        rental_cost = item.return_item()  # This will raise ValueError if there are issues
+        # Ends the rental without the item recording it; the item's history is a view of ours
+        end_time, rental_cost = item.end_rental(end_time)  # This will raise ValueError if there are issues
         customer.remove_rental(item)
+        self._move_price(item, was_available=False)
         
         rental_data = self._active_rentals.pop((customer_id, item_id))
+        del self._renter_by_item[item_id]
+        rented_ids = self._rentals_by_customer[customer_id]
+        rented_ids.discard(item_id)
+        if not rented_ids:
+            del self._rentals_by_customer[customer_id]
         
         # Add to rental history
         history_entry = {
@@ -113,149 +564,656 @@ class RentalManager:
             'item_id': item_id,
             'item_name': item.name,
             'start_time': rental_data['start_time'].isoformat(),
-            'end_time': datetime.now().isoformat(),
+            'end_time': end_time.isoformat(),
             'cost': rental_cost
         }
-        self._rental_history.append(history_entry)
-        self.save_data()  # Save after successful return
+        position = self._rental_history.append(history_entry)
+        self._index_history(position)
+        self._analytics.add(self._rental_history, position, item)
+        self._changed(item_id=item_id, customer_id=customer_id)
         return rental_cost
 
     def get_customer_rentals(self, customer_id):
         """Get all active rentals for a customer"""
         if customer_id not in self._customers:
             raise ValueError("Invalid customer ID")
-        return [rental for (cid, _), rental in self._active_rentals.items() 
-                if cid == customer_id]
+        rentals = (self._active_rentals.get((customer_id, item_id))
+                   for item_id in tuple(self._rentals_by_customer.get(customer_id, ())))
+        return [rental for rental in rentals if rental is not None]
+
+    def get_active_rental(self, item_id):
+        """Get the active rental for an item, or None if it is not rented"""
+        customer_id = self._renter_by_item.get(item_id)
+        if customer_id is None:
+            return None
+        return self._active_rentals.get((customer_id, item_id))
 
+    def get_item_renter(self, item_id):
+        """Get the ID of the customer currently renting an item, or None"""
+        return self._renter_by_item.get(item_id)
+
+    @property
+    def item_renters(self):
+        """Get a read-only live mapping of rented item IDs to the renting customer's ID"""
+        return MappingProxyType(self._renter_by_item)
+
+    @timed()
     def get_item_rental_history(self, item_id):
-        """Get rental history for a specific item"""
+        """Get rental history for a specific item, archived months included"""
         if item_id not in self._items:
             raise ValueError("Invalid item ID")
-        return [entry for entry in self._rental_history 
-                if entry['item_id'] == item_id]
+        history = self._rental_history
+        positions = self._history_by_item.get(item_id, ())
+        if history.archive is not None:
+            positions = history.archive.positions(item_id=item_id) + array('q', positions)
+        return HistoryView(history, positions)
 
+    @timed()
     def get_customer_rental_history(self, customer_id):
-        """Get rental history for a specific customer"""
+        """Get rental history for a specific customer, archived months included"""
+        if customer_id not in self._customers:
+            raise ValueError("Invalid customer ID")
+        history = self._rental_history
+        positions = self._history_by_customer.get(customer_id, ())
+        if history.archive is not None:
+            positions = history.archive.positions(customer_id=customer_id) + array('q', positions)
+        return HistoryView(history, positions)
+
+    @timed()
+    def utilization(self, start=None, end=None, item_type=None):
+        """Get the share of item-hours between two datetimes that items were rented"""
+        fleet = {item.id for item in list(self._items.values())
+                 if item_type is None or item.get_type_info()['type'] == item_type}
+        active_starts = [rental['start_time'] for rental in list(self._active_rentals.values())
+                         if rental['item'].id in fleet]
+        history = self._rental_history
+        histories = [history]
+        if history.archive is not None and len(history.archive):
+            # Only the archived months the period overlaps are read
+            if start is None:
+                start = min([micros_to_datetime(history.archive.earliest), *active_starts])
+            window = (datetime_to_micros(start), datetime_to_micros(end) if end else None)
+            histories = chain(history.archive.stores(*window), histories)
+        return self._analytics.utilization(histories, fleet, active_starts, start, end)
+
+    def history_start(self):
+        """Get when the earliest rental on record started, or None if there are none"""
+        history = self._rental_history
+        starts = [rental['start_time'] for rental in list(self._active_rentals.values())]
+        if len(history):
+            starts.append(micros_to_datetime(min(history.starts)))
+        if history.archive is not None and len(history.archive):
+            starts.append(micros_to_datetime(history.archive.earliest))
+        return min(starts, default=None)
+
+    @timed()
+    def reserve_item(self, customer_id, item_id, start_time, end_time):
+        """Book an item for a customer between two datetimes"""
+        reservation = Reservation(uuid.uuid4().hex[:12], item_id, customer_id, start_time, end_time)
+        with self._exclusive(), self._item_lock(item_id):
+            with self._lock:
+                if customer_id not in self._customers:
+                    raise ValueError("Invalid customer ID")
+                item = self._items.get(item_id)
+                if not item:
+                    raise ValueError("Invalid item ID")
+                now = datetime.now()
+                if end_time <= now:
+                    raise ValueError("A reservation must end in the future")
+                if start_time <= now and item.is_rented and self._renter_by_item.get(item_id) != customer_id:
+                    raise ValueError(f"{item.name} is being rented")
+                self._add_reservation(reservation)  # Raises ValueError on a conflict
+                self._log('reserve_item', reservation=reservation.to_dict())
+            self._write_pending()
+        self.save_data()
+        return reservation
+
+    @timed()
+    def cancel_reservation(self, reservation_id):
+        """Cancel a reservation"""
+        with self._exclusive():
+            with self._lock:
+                reservation = self._reservations.get(reservation_id)
+                if not reservation:
+                    raise ValueError(f"Reservation with ID {reservation_id} does not exist")
+                # Ended reservations aren't saved, so there would be nothing to cancel on reload
+                if reservation.end_time <= datetime.now():
+                    raise ValueError("Cannot cancel a reservation that has already ended")
+                self._remove_reservation(reservation)
+                self._log('cancel_reservation', reservation_id=reservation_id)
+            self._write_pending()
+        self.save_data()
+        return True
+
+    def _add_reservation(self, reservation):
+        """Store and index a reservation"""
+        self._reservation_index.add(reservation)
+        self._reservations[reservation.id] = reservation
+        self._reservations_by_customer.setdefault(reservation.customer_id, set()).add(reservation.id)
+        self._changed(item_id=reservation.item_id, customer_id=reservation.customer_id)
+
+    def _remove_reservation(self, reservation):
+        """Drop a reservation and its index entries"""
+        self._reservation_index.remove(reservation)
+        self._reservations.pop(reservation.id, None)
+        reservation_ids = self._reservations_by_customer.get(reservation.customer_id)
+        if reservation_ids is not None:
+            reservation_ids.discard(reservation.id)
+            if not reservation_ids:
+                del self._reservations_by_customer[reservation.customer_id]
+        self._changed(item_id=reservation.item_id, customer_id=reservation.customer_id)
+
+    def get_reservation(self, reservation_id):
+        """Get a single reservation by ID, or None"""
+        return self._reservations.get(reservation_id)
+
+    def get_item_reservations(self, item_id, include_past=False):
+        """Get an item's reservations, earliest first"""
+        if item_id not in self._items:
+            raise ValueError("Invalid item ID")
+        return self._reservation_index.for_item(item_id, after=None if include_past else datetime.now())
+
+    def get_customer_reservations(self, customer_id, include_past=False):
+        """Get a customer's reservations, earliest first"""
         if customer_id not in self._customers:
             raise ValueError("Invalid customer ID")
-        return [entry for entry in self._rental_history 
-                if entry['customer_id'] == customer_id]
+        now = datetime.now()
+        reservations = (self._reservations.get(reservation_id)
+                        for reservation_id in tuple(self._reservations_by_customer.get(customer_id, ())))
+        return sorted((reservation for reservation in reservations
+                       if reservation is not None and (include_past or reservation.end_time > now)),
+                      key=lambda reservation: reservation.start_time)
+
+    @timed()
+    def find_available_items(self, start_time, end_time, item_type=None, min_price=None, max_price=None, limit=None):
+        """Find items free to reserve between two datetimes, cheapest first
 
+        Items that are out now count as busy for windows that have already
+        started, and as back in time for windows that start later.
+        """
+        if end_time <= start_time:
+            raise ValueError("The end time must be after the start time")
+        started = start_time <= datetime.now()
+        conflict = self._reservation_index.conflict
+        matches = (item for item in self._iter_price_matches(min_price, max_price, item_type)
+                   if not (started and item.is_rented) and conflict(item.id, start_time, end_time) is None)
+        if limit is not None:
+            matches = islice(matches, limit)
+        return list(matches)
+
+    @timed()
     def search_items(self, query):
         """Search items by name, type, or price range"""
         if not query:
             return list(self._items.values())
             
         query = query.lower()
-        results = []
-        
-        try:
-            # Try to parse price from query (e.g., "under 50", "over 100")
-            if "under" in query or "below" in query:
-                price_limit = float(''.join(filter(str.isdigit, query)))
-                results.extend([item for item in self._items.values() 
-                              if item.rental_price <= price_limit])
-            elif "over" in query or "above" in query:
-                price_limit = float(''.join(filter(str.isdigit, query)))
-                results.extend([item for item in self._items.values() 
-                              if item.rental_price >= price_limit])
-            else:
-                # Search by name or type
-                for item in self._items.values():
-                    type_info = item.get_type_info()
-                    if (query in item.name.lower() or
-                        query in type_info.get('bike_type', '').lower() or
-                        query in type_info.get('brand', '').lower()):
-                        results.append(item)
-        except:
-            # If price parsing fails, just search by name
-            results = [item for item in self._items.values() 
-                      if query in item.name.lower()]
-        
+        price_range = parse_price_range(query)
+        if price_range is None:
+            # Search by name, type, brand, or bike type, e.g. "cars" as "car"
+            text = ' '.join(TYPE_WORDS.get(word, word) for word in tokenize(query))
+            items = (self._items.get(item_id) for item_id in self._item_index.search(text))
+            return [item for item in items if item is not None]
+
+        # Any words left over (e.g. "bikes under 50") narrow the price matches,
+        # with type words picking the price index rather than matching text
+        words = tokenize(PRICE_WORDS_PATTERN.sub(' ', query))
+        item_types = {TYPE_WORDS[word] for word in words if word in TYPE_WORDS}
+        words = [word for word in words if word not in TYPE_WORDS]
+        results = self.find_items(*price_range, item_type=item_types.pop() if len(item_types) == 1 else None)
+        if words:
+            matching = set(self._item_index.search(' '.join(words)))
+            results = [item for item in results if item.id in matching]
         return results
 
+    def find_items(self, min_price=None, max_price=None, item_type=None, available=None, limit=None):
+        """Find items by price range, type, and availability, cheapest first"""
+        matches = self._iter_price_matches(min_price, max_price, item_type, available)
+        if limit is not None:
+            matches = islice(matches, limit)
+        return list(matches)
+
+    def _price_indexes(self, item_type=None, available=None):
+        """Get the price indexes covering a type and availability"""
+        return [index for (index_type, index_available), index in list(self._price_index.items())
+                if (item_type is None or index_type == item_type) and
+                   (available is None or index_available == available)]
+
+    def _iter_price_matches(self, min_price=None, max_price=None, item_type=None, available=None):
+        """Iterate over matching items, cheapest first, without materializing them"""
+        indexes = self._price_indexes(item_type, available)
+        for _, item_id in heapq.merge(*(index.range(min_price, max_price) for index in indexes)):
+            item = self._items.get(item_id)
+            if item is not None:  # Skip items removed while we were iterating
+                yield item
+
+    @timed()
     def search_customers(self, query):
         """Search customers by name, address, or contact number"""
         if not query:
             return list(self._customers.values())
             
-        query = query.lower()
-        return [customer for customer in self._customers.values() 
-                if (query in customer.first_name.lower() or
-                    query in customer.last_name.lower() or
-                    query in customer.address.lower() or
-                    query in customer.contact_number.lower() or
-                    query in customer.get_full_name().lower())]
+        customers = (self._customers.get(customer_id) for customer_id in self._customer_index.search(query))
+        return [customer for customer in customers if customer is not None]
 
     def get_rented_items(self):
         """Get list of currently rented items"""
-        return [item for item in self._items.values() if item.is_rented]
+        return [item for item in list(self._items.values()) if item.is_rented]
 
     def get_available_items(self):
         """Get list of available (not rented) items"""
-        return [item for item in self._items.values() if not item.is_rented]
+        return [item for item in list(self._items.values()) if not item.is_rented]
 
     def get_customers_with_active_rentals(self):
         """Get list of customers who have active rentals"""
-        return [customer for customer in self._customers.values() 
-                if customer.has_active_rentals()]
+        customers = (self._customers.get(customer_id) for customer_id in list(self._rentals_by_customer))
+        return [customer for customer in customers if customer is not None]
+
+    @timed()
+    def list_items(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of all items, in the order they were added"""
+        items = list(self._items.values())  # A copy, as items may be added while the page is read
+        return paginate(iter(items), len(items), page, per_page)
+
+    @timed()
+    def list_available_items(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of available items, cheapest first"""
+        total = sum(len(index) for index in self._price_indexes(available=True))
+        return paginate(self._iter_price_matches(available=True), total, page, per_page)
+
+    @timed()
+    def list_customers(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of all customers, in the order they were added"""
+        customers = list(self._customers.values())
+        return paginate(iter(customers), len(customers), page, per_page)
+
+    @timed()
+    def recent_history(self, n=5):
+        """Get the last n rental history entries, oldest first"""
+        recent = self._recent
+        if recent is None or recent[0] != n:
+            with self._lock:
+                history = self._rental_history
+                positions = range(max(history.end - n, 0), history.end) if n > 0 else ()
+                recent = (n, tuple(history.entry(position) for position in positions))
+                self._recent = recent
+        return list(recent[1])
+
+    # Dashboard display rows, built once and reused until a change touches them
+
+    def item_row(self, item):
+        """Get the dashboard row for an item"""
+        row = self._item_rows.get(item.id)
+        if row is None:
+            with self._lock:
+                type_info = item.get_type_info()
+                detail = type_info.get('brand') or type_info.get('bike_type')
+                row = {
+                    'id': item.id,
+                    'name': item.name,
+                    'type': type_info['type'],
+                    'label': f"{type_info['type'].capitalize()}: {detail}",
+                    'rental_price': item.rental_price,
+                    'is_rented': item.is_rented,
+                    'renter': self._renter_by_item.get(item.id, ''),
+                    'depot': self._depot
+                }
+                if self._items.get(item.id) is item:  # Not cached for items removed meanwhile
+                    self._item_rows[item.id] = row
+        return row
+
+    def customer_row(self, customer):
+        """Get the dashboard row for a customer"""
+        row = self._customer_rows.get(customer.id)
+        if row is None:
+            with self._lock:
+                row = {
+                    'id': customer.id,
+                    'name': customer.get_full_name(),
+                    'contact_number': customer.contact_number,
+                    'rentals': tuple(item.name for item in customer.active_rentals),
+                    'has_rentals': customer.has_active_rentals()
+                }
+                if self._customers.get(customer.id) is customer:
+                    self._customer_rows[customer.id] = row
+        return row
+
+    def item_counts(self):
+        """Get the number of available and rented items per type"""
+        counts = {}
+        for (item_type, available), index in list(self._price_index.items()):
+            type_counts = counts.setdefault(item_type, {'available': 0, 'rented': 0})
+            type_counts['available' if available else 'rented'] += len(index)
+        return dict(sorted(counts.items()))
+
+    def dataset_sizes(self):
+        """Get the number of items, customers, rentals, history entries, and reservations held"""
+        history = self._rental_history
+        return {
+            'items': len(self._items),
+            'customers': len(self._customers),
+            'active_rentals': len(self._active_rentals),
+            'history_entries': len(history),
+            'archived_history_entries': history.base,
+            'reservations': len(self._reservations)
+        }
+
+    def storage_file_sizes(self):
+        """Get the size of the main storage file in bytes, by depot"""
+        filename = self._storage.filename
+        return {self._depot or '': os.path.getsize(filename) if os.path.exists(filename) else 0}
+
+    def _changed(self, item_id=None, customer_id=None):
+        """Bump the data version and drop cached rows a change touched; call with _lock held"""
+        self._version += 1
+        self._last_modified = datetime.now(timezone.utc)
+        self._item_rows.pop(item_id, None)
+        self._customer_rows.pop(customer_id, None)
+        self._recent = None
+
+    def iter_history(self, newest_first=False):
+        """Iterate over rental history entries without copying the whole history"""
+        history = self._rental_history
+        positions = range(history.end)  # Archived entries are read a month at a time as they come up
+        for position in reversed(positions) if newest_first else positions:
+            yield history.entry(position)
+
+    def _log(self, op, **data):
+        """Queue a mutation for the storage backend; call with _lock held"""
+        self._pending_records.append((op, data))
+
+    def _write_pending(self):
+        """Write queued mutations to storage in the order they were applied"""
+        if getattr(self._local, 'batch_depth', 0):
+            return  # batch() writes everything when the outermost block exits
+        self._drain_pending()
 
-    def save_data(self, filename='data.json'):
-        """Save rental items, customers, and history to a JSON file"""
-        data = {
+    @timed('write_pending')
+    def _drain_pending(self):
+        """Write every queued mutation as a single storage batch"""
+        with self._write_lock:
+            if not self._pending_records:
+                return  # Another thread already wrote our mutations
+            with self._storage.batch():
+                while self._pending_records:
+                    op, data = self._pending_records.popleft()
+                    self._storage.record(op, **data)
+
+    def _snapshot(self):
+        """Capture a consistent copy of all state for a full write"""
+        with self._write_lock, self._lock:
+            # Everything applied so far must reach storage before the snapshot
+            # is taken, or a journal could replay it on top of the snapshot
+            self._drain_pending()
+            return {
+                'items': {item_id: item.to_dict() for item_id, item in self._items.items()},
+                'customers': {cid: customer.to_dict() for cid, customer in self._customers.items()},
+                'rental_history': list(self._rental_history),
+                'history_base': self._rental_history.base,
+                # Reservations that are over no longer affect anything, so they aren't kept
+                'reservations': [reservation.to_dict() for reservation in self._reservations.values()
+                                 if reservation.end_time > datetime.now()],
+                'active_rentals': {
+                    item_id: {
+                        'customer_id': customer_id,
+                        'start_time': self._active_rentals[(customer_id, item_id)]['start_time'].isoformat()
+                    }
+                    for item_id, customer_id in self._renter_by_item.items()
+                }
+            }
+
+    def _restore(self, items, customers, rental_history, active_rentals=(), reservations=()):
+        """Replace all state with data read by the storage backend
+
+        active_rentals holds (customer_id, item_id, start_time) for items that
+        are out; those items must be passed in as not rented. reservations
+        holds Reservation objects.
+        """
+        if not isinstance(rental_history, HistoryStore):
+            rental_history = HistoryStore(rental_history)
+        self._rental_history = rental_history
+        self._history_by_item = defaultdict(self._positions)
+        self._history_by_customer = defaultdict(self._positions)
+        for position in range(rental_history.base, rental_history.end):
+            self._index_history(position)
+        for item in items.values():
+            self._attach_history(item)
+
+        self._items = items
+        self._drop_item_locks()
+        self._customers = customers
+        self._active_rentals = {}
+        self._rentals_by_customer = {}
+        self._renter_by_item = {}
+        for customer_id, item_id, start_time in active_rentals:
+            customer = customers[customer_id]
+            item = items[item_id]
+            item.rent(start_time)
+            customer.add_rental(item)
+            self._active_rentals[(customer_id, item_id)] = {
+                'start_time': start_time,
+                'item': item,
+                'customer': customer
+            }
+            self._rentals_by_customer.setdefault(customer_id, set()).add(item_id)
+            self._renter_by_item[item_id] = customer_id
+
+        # Indexes are built in bulk once the rental state is known
+        self._item_index.build((item.id, self._item_fields(item)) for item in items.values())
+        self._customer_index.build((customer.id, self._customer_fields(customer))
+                                   for customer in customers.values())
+        prices = defaultdict(list)
+        for item in items.values():
+            prices[(item.get_type_info()['type'], not item.is_rented)].append((item.id, item.rental_price))
+        self._price_index = {key: PriceIndex(entries) for key, entries in prices.items()}
+        self._reservations = {reservation.id: reservation for reservation in reservations
+                              if reservation.item_id in items and reservation.customer_id in customers}
+        self._reservations_by_customer = {}
+        for reservation in self._reservations.values():
+            self._reservations_by_customer.setdefault(reservation.customer_id, set()).add(reservation.id)
+        self._reservation_index.build(self._reservations.values())
+        archive = rental_history.archive
+        self._analytics.rebuild(rental_history, items, archive.summaries() if archive is not None else ())
+        self._item_rows = {}
+        self._customer_rows = {}
+        self._changed()
+
+    def _warm_state(self):
+        """Capture the loaded state, indexes included, for a warm-start snapshot; call with _lock held"""
+        return {
             'items': self._items,
-            'customers': {cid: customer.to_dict() for cid, customer in self._customers.items()},
-            'rental_history': self._rental_history
+            'customers': self._customers,
+            'rental_history': self._rental_history,
+            'history_by_item': dict(self._history_by_item),
+            'history_by_customer': dict(self._history_by_customer),
+            'active_rentals': self._active_rentals,
+            'rentals_by_customer': self._rentals_by_customer,
+            'renter_by_item': self._renter_by_item,
+            'item_index': self._item_index,
+            'customer_index': self._customer_index,
+            'price_index': self._price_index,
+            'analytics': self._analytics,
+            'reservations': self._reservations,
+            'reservations_by_customer': self._reservations_by_customer,
+            'reservation_index': self._reservation_index
         }
-        
+
+    def _restore_warm(self, state, archive=None):
+        """Replace all state with one captured by _warm_state, without rebuilding anything"""
+        rental_history = state['rental_history']
+        rental_history.attach(archive)
+        self._rental_history = rental_history
+        self._history_by_item = defaultdict(self._positions, state['history_by_item'])
+        self._history_by_customer = defaultdict(self._positions, state['history_by_customer'])
+        self._items = state['items']
+        self._drop_item_locks()
+        self._customers = state['customers']
+        self._active_rentals = state['active_rentals']
+        self._rentals_by_customer = state['rentals_by_customer']
+        self._renter_by_item = state['renter_by_item']
+        self._item_index = state['item_index']
+        self._customer_index = state['customer_index']
+        self._price_index = state['price_index']
+        self._analytics = state['analytics']
+        self._reservations = state['reservations']
+        self._reservations_by_customer = state['reservations_by_customer']
+        self._reservation_index = state['reservation_index']
+        self._item_rows = {}
+        self._customer_rows = {}
+        self._changed()
+
+    def _archive_history(self, archive):
+        """Move rentals returned before the archive's cutoff out of memory and into the archive"""
+        with self._write_lock:
+            history = self._rental_history
+            if history.archive is not archive:
+                return
+            cutoff = archive.cutoff()
+            stop = history.base
+            while stop < history.end and history.times(stop)[1] < cutoff:
+                stop += 1
+            if stop == history.base:
+                return
+            # Entries are never changed once appended, so they are written without _lock
+            archive.add(history, stop)
+            with self._lock:
+                self._trim_history(stop)
+
+    def _trim_history(self, position):
+        """Drop history entries before a position, which are archived, from memory; call with _lock held"""
+        history = self._rental_history.tail(position)
+        indexes = []
+        for index in (self._history_by_item, self._history_by_customer):
+            trimmed = defaultdict(self._positions)
+            for key, positions in index.items():
+                kept = positions[bisect_left(positions, position):]
+                if kept:
+                    trimmed[key] = kept
+            indexes.append(trimmed)
+        self._history_by_item, self._history_by_customer = indexes
+        self._rental_history = history
+        # Items' own views cover only what is in memory, which is what snapshots
+        # save with them; get_item_rental_history() adds the archived months
+        for item in self._items.values():
+            item.use_history(item.rental_history.rebind(history, self._history_by_item[item.id]))
+
+    @staticmethod
+    def _positions():
+        """Create an empty list of positions in the history store"""
+        return array('q')
+
+    def _index_history(self, position):
+        """Add a history entry to the per-item and per-customer indexes"""
+        self._history_by_item[self._rental_history.item_id(position)].append(position)
+        self._history_by_customer[self._rental_history.customer_id(position)].append(position)
+
+    def _replay(self, record):
+        """Re-apply a journaled mutation without recording it again"""
+        op = record['op']
+        if op == 'add_item':
+            item = item_from_dict(record['item'])
+            if item is not None:
+                self._add_item(item)
+        elif op == 'remove_item':
+            self._remove_item(record['item_id'])
+        elif op == 'edit_item':
+            item = self._items.get(record['item_id'])
+            if item is not None:
+                self._edit_item(item, record.get('name'),
+                                record.get('rental_price'), record.get('brand'), record.get('bike_type'))
+        elif op == 'add_customer':
+            self._add_customer(Customer.from_dict(record['customer']))
+        elif op == 'edit_customer':
+            customer = self._customers.get(record['customer_id'])
+            if customer is not None:
+                self._edit_customer(customer, record.get('first_name'), record.get('last_name'),
+                                    record.get('address'), record.get('contact_number'))
+        elif op == 'remove_customer':
+            self._remove_customer(record['customer_id'])
+        elif op == 'rent_item':
+            self._rent(self._customers[record['customer_id']],
+                       self._items[record['item_id']],
+                       datetime.fromisoformat(record['start_time']))
+        elif op == 'return_item':
+            self._return(record['customer_id'], record['item_id'],
+                         datetime.fromisoformat(record['end_time']))
+        elif op == 'reserve_item':
+            self._add_reservation(Reservation.from_dict(record['reservation']))
+        elif op == 'cancel_reservation':
+            # Ended reservations aren't loaded, and journals written before they couldn't be cancelled may have some
+            reservation = self._reservations.get(record['reservation_id'])
+            if reservation is not None:
+                self._remove_reservation(reservation)
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+
+    @contextmanager
+    def batch(self):
+        """Group this thread's operations so they are persisted once at the end"""
+        outermost = not getattr(self._local, 'batch_depth', 0)
         try:
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=4, cls=RentalEncoder)
-        except Exception as e:
-            print(f"Error saving data: {str(e)}")
-            raise
+            with self._exclusive():
+                self._local.batch_depth = getattr(self._local, 'batch_depth', 0) + 1
+                try:
+                    yield self
+                finally:
+                    self._local.batch_depth -= 1
+                    if outermost:
+                        self._write_pending()
+        finally:
+            if outermost:
+                self.save_data()  # Outside _exclusive(), which holds the write lock
+
+    @timed()
+    def save_data(self):
+        """Save rental items, customers, and history through the storage backend"""
+        if getattr(self._local, 'batch_depth', 0):
+            return  # batch() saves once when the outermost block exits
+        if not self._flush_interval:
+            self._save()
+            return
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self._flush_interval, self._background_flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    @timed()
+    def flush(self):
+        """Write any scheduled save now, e.g. before shutting down"""
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+        self._save()
 
-    def load_data(self, filename='data.json'):
-        """Load rental items, customers, and history from a JSON file"""
+    def _background_flush(self):
+        """Run a scheduled save on the timer thread"""
+        with self._lock:
+            self._flush_timer = None  # Saves requested from here on need a new timer
         try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-                
-                # Load items
-                self._items.clear()
-                for item_id, item_data in data['items'].items():
-                    item_type = item_data.get('type', 'generic')
-                    if item_type == 'bike':
-                        self._items[item_id] = Bike.from_dict(item_data)
-                    elif item_type == 'car':
-                        self._items[item_id] = Car.from_dict(item_data)
-                
-                # Load customers
-                self._customers = {
-                    customer_id: Customer.from_dict(customer_data) 
-                    for customer_id, customer_data in data['customers'].items()
-                }
-                
-                # Load rental history
-                self._rental_history = data.get('rental_history', [])
-                
-                # Reconstruct active rentals from item status
-                self._active_rentals.clear()
-                for item_id, item in self._items.items():
-                    if item.is_rented:
-                        for customer in self._customers.values():
-                            if item in customer.active_rentals:
-                                self._active_rentals[(customer.id, item_id)] = {
-                                    'start_time': datetime.fromisoformat(item._current_rental_start) if item._current_rental_start else datetime.now(),
-                                    'item': item,
-                                    'customer': customer
-                                }
-                                break
-                
-        except FileNotFoundError:
-            print("Data file not found. Starting with empty data.")
-        except json.JSONDecodeError:
-            print("Error reading data file. Starting with empty data.")
+            self._save()
         except Exception as e:
-            print(f"Error loading data: {str(e)}. Starting with empty data.")
-            raise
+            print(f"Background save failed: {str(e)}")
+
+    @timed('save')
+    def _save(self, force=False):
+        """Capture state under the write lock, then write it without holding the lock"""
+        with self._flush_lock:
+            # Only a forced save rewrites shared storage, so only then catch up first
+            with self._exclusive() if force else nullcontext(), self._write_lock:
+                write = self._storage.prepare_save(self, force)
+            if write is not None:
+                write()
+
+    @timed()
+    def compact(self):
+        """Force a full write of the current state to the storage backend"""
+        self._save(force=True)
+
+    @timed()
+    def load_data(self):
+        """Load rental items, customers, and history from the storage backend"""
+        with self._write_lock, self._lock:
+            self._storage.load(self)
+        self._loaded_ok()
@@ -0,0 +1,147 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+def local_time(moment):
+    """Convert a timezone-aware datetime to the naive local time everything else is kept in"""
+    if moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+class Reservation:
+    """A booking of an item by a customer for a window of time"""
+
+    __slots__ = ('_id', '_item_id', '_customer_id', '_start_time', '_end_time')
+
+    def __init__(self, id, item_id, customer_id, start_time, end_time):
+        if not id:
+            raise ValueError("ID cannot be empty")
+        if not isinstance(start_time, datetime) or not isinstance(end_time, datetime):
+            raise TypeError("Reservation times must be datetimes")
+        start_time, end_time = local_time(start_time), local_time(end_time)
+        if end_time <= start_time:
+            raise ValueError("A reservation must end after it starts")
+        self._id = id
+        self._item_id = item_id
+        self._customer_id = customer_id
+        self._start_time = start_time
+        self._end_time = end_time
+
+    @property
+    def id(self):
+        """Get reservation ID"""
+        return self._id
+
+    @property
+    def item_id(self):
+        """Get the ID of the reserved item"""
+        return self._item_id
+
+    @property
+    def customer_id(self):
+        """Get the ID of the customer who reserved the item"""
+        return self._customer_id
+
+    @property
+    def start_time(self):
+        """Get when the reservation starts"""
+        return self._start_time
+
+    @property
+    def end_time(self):
+        """Get when the reservation ends"""
+        return self._end_time
+
+    def to_dict(self):
+        """Convert reservation to dictionary for serialization"""
+        return {
+            'id': self._id,
+            'item_id': self._item_id,
+            'customer_id': self._customer_id,
+            'start_time': self._start_time.isoformat(),
+            'end_time': self._end_time.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create reservation from dictionary"""
+        return cls(data['id'], data['item_id'], data['customer_id'],
+                   datetime.fromisoformat(data['start_time']), datetime.fromisoformat(data['end_time']))
+
+    def __str__(self):
+        """String representation of reservation"""
+        return f"Reservation {self._id}: {self._item_id} for {self._customer_id}, {self._start_time} to {self._end_time}"
+
+class ReservationIndex:
+    """Reservations of each item, sorted by start time, for availability checks
+
+    An item's reservations never overlap, so sorted by start time they are
+    also sorted by end time. The only one that can overlap a window is then
+    the last to start before the window ends, and a conflict check is one
+    binary search. Like PriceIndex, updates replace the lists rather than
+    modifying them, so checks need no lock.
+    """
+
+    def __init__(self):
+        self._by_item = {}  # item_id -> (start times, reservations), sorted by start time
+
+    def __len__(self):
+        return sum(len(reservations) for _, reservations in self._by_item.values())
+
+    def build(self, reservations):
+        """Replace the index contents with the given reservations"""
+        by_item = {}
+        for reservation in reservations:
+            by_item.setdefault(reservation.item_id, []).append(reservation)
+        self._by_item = {}
+        for item_id, item_reservations in by_item.items():
+            item_reservations.sort(key=lambda reservation: reservation.start_time)
+            self._by_item[item_id] = ([reservation.start_time for reservation in item_reservations],
+                                      item_reservations)
+
+    def conflict(self, item_id, start_time, end_time):
+        """Get the reservation of an item overlapping a window, or None"""
+        starts, reservations = self._by_item.get(item_id, ((), ()))
+        i = bisect_left(starts, end_time)  # Reservations before i start before the window ends
+        if i and reservations[i - 1].end_time > start_time:
+            return reservations[i - 1]
+        return None
+
+    def at(self, item_id, moment):
+        """Get the reservation of an item in effect at a moment, or None"""
+        starts, reservations = self._by_item.get(item_id, ((), ()))
+        i = bisect_right(starts, moment)
+        if i and reservations[i - 1].end_time > moment:
+            return reservations[i - 1]
+        return None
+
+    def for_item(self, item_id, after=None):
+        """Get an item's reservations ending after a moment, earliest first"""
+        _, reservations = self._by_item.get(item_id, ((), ()))
+        if after is None:
+            return list(reservations)
+        return [reservation for reservation in reservations if reservation.end_time > after]
+
+    def add(self, reservation):
+        """Index a reservation, which must not overlap the item's others"""
+        conflict = self.conflict(reservation.item_id, reservation.start_time, reservation.end_time)
+        if conflict is not None:
+            raise ValueError(f"Item {reservation.item_id} is already reserved from "
+                             f"{conflict.start_time.isoformat(' ', 'minutes')} to "
+                             f"{conflict.end_time.isoformat(' ', 'minutes')}")
+        starts, reservations = self._by_item.get(reservation.item_id, ([], []))
+        i = bisect_right(starts, reservation.start_time)
+        self._by_item[reservation.item_id] = (starts[:i] + [reservation.start_time] + starts[i:],
+                                              reservations[:i] + [reservation] + reservations[i:])
+
+    def remove(self, reservation):
+        """Drop a reservation from the index"""
+        starts, reservations = self._by_item.get(reservation.item_id, ([], []))
+        for i in range(bisect_left(starts, reservation.start_time), len(starts)):
+            if reservations[i].id == reservation.id:
+                if len(reservations) == 1:
+                    del self._by_item[reservation.item_id]
+                else:
+                    self._by_item[reservation.item_id] = (starts[:i] + starts[i + 1:],
+                                                          reservations[:i] + reservations[i + 1:])
+                return
+        raise ValueError(f"Reservation {reservation.id} is not indexed")
@@ -1,27 +1,184 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from rental_manager import RentalManager
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, make_response, g
+from flask import before_render_template, template_rendered, current_app, stream_with_context
+from werkzeug.local import LocalProxy
 from models import Bike, Car
 from customer import Customer
+from pagination import paginate
+from metrics import REQUEST_SECONDS, TEMPLATE_SECONDS, registry
 
 main = Blueprint('main', __name__)
-rental_manager = RentalManager()
 
-# Load data when the application starts
-rental_manager.load_data()
+# The RentalManager and Profiler of the app handling the request; create_app() makes them
+rental_manager = LocalProxy(lambda: current_app.extensions['rental_manager'])
+profiler = LocalProxy(lambda: current_app.extensions['profiler'])
+
+# Endpoints that answer while the data is still loading
+LOADING_ENDPOINTS = ('main.ready', 'main.metrics', 'static')
+
+registry.gauge('rental_data_loaded', 'Whether the data has been loaded', lambda: int(rental_manager.load_state == 'ready'))
+registry.gauge('rental_dataset_size', 'Records held by the rental manager', lambda: rental_manager.dataset_sizes(),
+               ('kind',))
+registry.gauge('rental_items_by_state', 'Items of each type that are available or rented',
+               lambda: {(item_type, state): count for item_type, counts in rental_manager.item_counts().items()
+                        for state, count in counts.items()}, ('type', 'state'))
+registry.gauge('rental_data_version', 'Changes applied since the data was loaded', lambda: rental_manager.data_version)
+registry.gauge('rental_storage_file_bytes', 'Size of the main storage file, per depot when sharded',
+               lambda: rental_manager.storage_file_sizes(), ('depot',))
+
+@main.before_app_request
+def start_request_timer():
+    """Note when the request started, and profile it if it is sampled"""
+    g.request_start = time.perf_counter()
+    g.profile = profiler.start()
+
+@main.after_app_request
+def record_request_time(response):
+    """Record how long the request took, by endpoint and status"""
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or 'none',
+                                method=request.method, status=response.status_code)
+    return response
+
+@main.teardown_app_request
+def stop_profiler(error):
+    """Save the request's profile, if it was profiled"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, request.endpoint or 'none')
+
+@before_render_template.connect
+def start_render_timer(sender, template, context, **extra):
+    g.render_start = time.perf_counter()
+
+@template_rendered.connect
+def record_render_time(sender, template, context, **extra):
+    start = g.pop('render_start', None)
+    if start is not None:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - start, template=template.name or 'string')
+
+@main.before_app_request
+def refresh_data():
+    """Wait for the data to load, then catch up with changes made by other server processes"""
+    if request.endpoint in LOADING_ENDPOINTS:
+        return
+    rental_manager.ensure_loaded()
+    rental_manager.refresh()
+
+@main.route('/ready')
+def ready():
+    """Report whether the data is loaded, for load balancers and rolling restarts"""
+    state = rental_manager.load_state
+    if state == 'not loaded':
+        rental_manager.load_in_background()  # Loading lazily, and nothing has needed the data yet
+    body = {'status': state}
+    if state == 'failed':
+        body['error'] = str(rental_manager.load_error)
+    response = jsonify(body)
+    response.status_code = 200 if state == 'ready' else 503
+    response.cache_control.no_store = True
+    return response
+
+def conditional(view):
+    """Answer a GET with 304 Not Modified when the client's copy is still current
+
+    Pages are tagged with the data version, so a dashboard that polls only gets
+    a full response after something changed. Pages showing a flash message are
+    never cached, as the message is only shown once. Last-Modified has whole
+    seconds, so it is only sent once its second is over: until then another
+    change could follow with the same time (RFC 9110 section 8.8.2.2).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+        etag = rental_manager.data_etag
+        last_modified = rental_manager.last_modified.replace(microsecond=0)
+        if last_modified >= datetime.now(timezone.utc).replace(microsecond=0):
+            last_modified = None
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (last_modified is not None and request.if_modified_since is not None
+                            and request.if_modified_since >= last_modified)
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True  # Always revalidate
+        return response
+    return wrapper
+
+# Template output pieces sent per chunk of a streamed page, a few dozen table rows
+STREAM_BUFFER = 200
+
+def stream_page(template_name, **context):
+    """Render a template as a response that is sent in chunks as it is generated
+
+    Pages listing a whole rental history use this, so the rows are produced
+    one at a time from the history and the first bytes go out at once rather
+    than after the full page has been built in memory.
+    """
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    stream = template.stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+
+    def generate():
+        start = time.perf_counter()
+        yield from stream
+        TEMPLATE_SECONDS.observe(time.perf_counter() - start, template=template_name)
+    return app.response_class(stream_with_context(generate()))
+
+@main.route('/metrics')
+def metrics():
+    """Expose latency histograms, persistence counters, and dataset sizes for Prometheus"""
+    response = make_response(registry.render())
+    response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    response.cache_control.no_store = True
+    return response
+
+@main.app_template_global()
+def page_url(param, number):
+    """Build a URL for the current view with one page argument replaced"""
+    args = request.args.to_dict()
+    args[param] = number
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
 
 @main.route('/')
+@conditional
 def index():
     item_query = request.args.get('item_search', '')
     customer_query = request.args.get('customer_search', '')
+    item_page = request.args.get('item_page', 1, type=int)
+    customer_page = request.args.get('customer_page', 1, type=int)
     
-    items = rental_manager.search_items(item_query) if item_query else rental_manager.items.values()
-    customers = rental_manager.search_customers(customer_query) if customer_query else rental_manager.customers.values()
+    if item_query:
+        results = rental_manager.search_items(item_query)
+        items = paginate(results, len(results), item_page)
+    else:
+        items = rental_manager.list_items(item_page)
+    if customer_query:
+        results = rental_manager.search_customers(customer_query)
+        customers = paginate(results, len(results), customer_page)
+    else:
+        customers = rental_manager.list_customers(customer_page)
     
-    rental_history = rental_manager.rental_history
+    rental_history = rental_manager.recent_history(5)
     
     return render_template('index.html', 
-                         items=items,
-                         customers=customers,
+                         items=items.map(rental_manager.item_row),
+                         customers=customers.map(rental_manager.customer_row),
+                         item_counts=rental_manager.item_counts(),
                          rental_history=rental_history,
                          item_query=item_query,
                          customer_query=customer_query)
@@ -40,7 +197,7 @@ def add_item():
             else:
                 new_item = Car(item_id, item_name, item_price, request.form['brand'])
             
-            rental_manager.add_item(new_item)
+            rental_manager.add_item(new_item, request.form.get('depot') or None)
             rental_manager.save_data()
             flash('Item added successfully!', 'success')
             
@@ -51,7 +208,7 @@ def add_item():
             print(f"Error: {str(e)}")
             
         return redirect(url_for('main.index'))
-    return render_template('add_item.html')
+    return render_template('add_item.html', depots=rental_manager.depots)
 
 @main.route('/add_customer', methods=['GET', 'POST'])
 def add_customer():
@@ -84,7 +241,6 @@ def rent_item():
         item_id = request.form['item_id']
         
         if rental_manager.rent_item(customer_id, item_id):
-            rental_manager.save_data()
             flash('Item rented successfully!', 'success')
         else:
             flash('Failed to rent item.', 'danger')
@@ -120,7 +276,6 @@ def return_item():
         
         rental_cost = rental_manager.return_item(customer_id, item_id)
         if rental_cost:
-            rental_manager.save_data()
             flash(f'Item returned successfully! Rental cost: ${rental_cost:.2f}', 'success')
         else:
             flash('Failed to return item.', 'danger')
@@ -136,7 +291,7 @@ def return_item():
 @main.route('/edit_customer/<customer_id>', methods=['GET', 'POST'])
 def edit_customer(customer_id):
     try:
-        customer = rental_manager.customers.get(customer_id)
+        customer = rental_manager.get_customer(customer_id)
         if not customer:
             flash('Customer not found.', 'danger')
             return redirect(url_for('main.index'))
@@ -173,30 +328,55 @@ def remove_customer(customer_id):
     return redirect(url_for('main.index'))
 
 @main.route('/available_items')
+@conditional
 def available_items():
-    items = rental_manager.get_available_items()
-    return render_template('available_items.html', items=items)
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    item_type = request.args.get('type') or None
+    page = request.args.get('page', 1, type=int)
+    if min_price is None and max_price is None and item_type is None:
+        items = rental_manager.list_available_items(page)
+    else:
+        results = rental_manager.find_items(min_price=min_price, max_price=max_price,
+                                            item_type=item_type, available=True)
+        items = paginate(results, len(results), page)
+    return render_template('available_items.html', items=items,
+                         min_price=min_price, max_price=max_price, item_type=item_type)
 
 @main.route('/customers')
+@conditional
 def customers():
-    customers = rental_manager.customers.values()
+    # Rows merge the customer's rentals at every depot, which one depot's Customer copy doesn't
+    customers = rental_manager.list_customers(request.args.get('page', 1, type=int)).map(rental_manager.customer_row)
     return render_template('customers.html', customers=customers)
 
+@main.route('/customers/search')
+@conditional
+def search_customers():
+    query = request.args.get('q', '')
+    if query:
+        matches = rental_manager.search_customers(query)[:20]
+    else:
+        matches = rental_manager.list_customers(1, 20).entries
+    return jsonify([{'id': customer.id, 'name': customer.get_full_name()} for customer in matches])
+
 @main.route('/recent_rental_history')
+@conditional
 def recent_rental_history():
-    recent_history = rental_manager.rental_history[-5:]  # Get the last 5 rentals
-    return render_template('recent_rental_history.html', rentals=recent_history)
+    recent_history = rental_manager.recent_history(5)  # Get the last 5 rentals
+    return stream_page('recent_rental_history.html', rentals=recent_history)
 
 @main.route('/customer/<customer_id>/history')
+@conditional
 def customer_history(customer_id):
     try:
-        customer = rental_manager.customers.get(customer_id)
+        customer = rental_manager.get_customer(customer_id)
         if not customer:
             flash('Customer not found.', 'danger')
             return redirect(url_for('main.index'))
             
         history = rental_manager.get_customer_rental_history(customer_id)
-        return render_template('customer_history.html', 
+        return stream_page('customer_history.html', 
                             history=history, 
                             customer=customer)
     except ValueError as e:
@@ -207,15 +387,16 @@ def customer_history(customer_id):
     return redirect(url_for('main.index'))
 
 @main.route('/item/<item_id>/history')
+@conditional
 def item_history(item_id):
     try:
-        item = rental_manager.items.get(item_id)
+        item = rental_manager.get_item(item_id)
         if not item:
             flash('Item not found.', 'danger')
             return redirect(url_for('main.index'))
             
         history = rental_manager.get_item_rental_history(item_id)
-        return render_template('item_history.html', 
+        return stream_page('item_history.html', 
                             history=history, 
                             item=item)
     except ValueError as e:
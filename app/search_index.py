@@ -0,0 +1,224 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text):
+    """Split text into lower-case word tokens"""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class SortedChunks:
+    """Sorted list of distinct values kept in chunks, so inserts and deletes stay cheap
+
+    An update copies only the chunk it changes and the short lists of chunks
+    and their last values, then swaps in the new state; readers iterating the
+    old state are never disturbed and need no lock. Updates must be serialized
+    by the caller.
+    """
+
+    CHUNK_SIZE = 512  # Values per chunk when built; chunks split when they grow to twice this
+
+    def __init__(self, values=()):
+        self._build(sorted(values))
+
+    def _build(self, values):
+        """Replace the contents with an already sorted list"""
+        chunks = [values[i:i + self.CHUNK_SIZE] for i in range(0, len(values), self.CHUNK_SIZE)]
+        self._state = (chunks, [chunk[-1] for chunk in chunks], len(values))  # Chunks, their last values, length
+
+    def __len__(self):
+        return self._state[2]
+
+    def __iter__(self):
+        return self.irange()
+
+    def add(self, value):
+        """Insert a value at its sorted position"""
+        chunks, lasts, length = self._state
+        if not chunks:
+            self._state = ([[value]], [value], 1)
+            return
+        i = min(bisect_left(lasts, value), len(chunks) - 1)
+        chunk = chunks[i][:]
+        insort(chunk, value)
+        parts = [chunk[:len(chunk) // 2], chunk[len(chunk) // 2:]] if len(chunk) >= 2 * self.CHUNK_SIZE else [chunk]
+        self._replace(i, parts, length + 1)
+
+    def remove(self, value):
+        """Remove a value, raising ValueError if it is not there"""
+        chunks, lasts, length = self._state
+        i = bisect_left(lasts, value)
+        if i < len(chunks):
+            chunk = chunks[i]
+            j = bisect_left(chunk, value)
+            if j < len(chunk) and chunk[j] == value:
+                chunk = chunk[:j] + chunk[j + 1:]
+                self._replace(i, [chunk] if chunk else [], length - 1)
+                return
+        raise ValueError(f"{value!r} is not in the list")
+
+    def _replace(self, i, parts, length):
+        """Swap in a state with chunk i replaced by parts"""
+        chunks, lasts, _ = self._state
+        self._state = (chunks[:i] + parts + chunks[i + 1:], lasts[:i] + [part[-1] for part in parts] + lasts[i + 1:],
+                       length)
+
+    def update(self, values):
+        """Insert many values in one merge, for bulk loads"""
+        values = sorted(values)
+        if values:
+            self._build(list(heapq.merge(self, values)))
+
+    def irange(self, start=None):
+        """Yield the values from the first one not less than start, in order"""
+        chunks, lasts, _ = self._state
+        i = 0 if start is None else bisect_left(lasts, start)
+        if i >= len(chunks):
+            return
+        chunk = chunks[i]
+        for j in range(0 if start is None else bisect_left(chunk, start), len(chunk)):
+            yield chunk[j]
+        for k in range(i + 1, len(chunks)):
+            yield from chunks[k]
+
+class SearchIndex:
+    """Inverted index from word tokens to object IDs with prefix matching
+
+    Updates must be serialized by the caller. Searches need no lock: the sorted
+    tokens are kept in SortedChunks, which readers always see in a consistent state.
+    """
+
+    def __init__(self):
+        self._postings = {}  # token -> set of IDs containing it
+        self._tokens = SortedChunks()  # Distinct tokens, for prefix lookups
+        self._doc_tokens = {}  # ID -> tokens it was indexed under
+        self._order = {}  # ID -> insertion counter, to keep results stable
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, doc_id, *fields):
+        """Index an object under the tokens of the given text fields"""
+        if doc_id in self._doc_tokens:
+            self.remove(doc_id)
+        for token in self._add_postings(doc_id, fields):
+            self._tokens.add(token)
+
+    def build(self, docs):
+        """Replace the index contents with (doc_id, fields) pairs in one pass"""
+        self.clear()
+        for doc_id, fields in docs:
+            self._add_postings(doc_id, fields)
+        self._tokens = SortedChunks(self._postings)
+
+    def add_many(self, docs):
+        """Index many (doc_id, fields) pairs, merging their new tokens in once"""
+        new_tokens = []
+        for doc_id, fields in docs:
+            if doc_id in self._doc_tokens:
+                self.remove(doc_id)
+            new_tokens.extend(self._add_postings(doc_id, fields))
+        self._tokens.update(new_tokens)
+
+    def _add_postings(self, doc_id, fields):
+        """Record an object's tokens and return the ones not seen before"""
+        tokens = set()
+        for field in fields:
+            if field:
+                tokens.update(tokenize(field))
+        new_tokens = []
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                new_tokens.append(token)
+            postings.add(doc_id)
+        self._doc_tokens[doc_id] = tokens
+        self._order[doc_id] = self._counter
+        self._counter += 1
+        return new_tokens
+
+    def update(self, doc_id, *fields):
+        """Re-index an object whose text fields changed"""
+        order = self._order.get(doc_id)
+        self.add(doc_id, *fields)
+        if order is not None:
+            self._order[doc_id] = order  # Edits keep the original position
+
+    def remove(self, doc_id):
+        """Drop an object from the index"""
+        unused = []
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[token]
+                unused.append(token)
+        for token in unused:
+            self._tokens.remove(token)
+        self._order.pop(doc_id, None)
+
+    def clear(self):
+        """Drop every object from the index"""
+        self.__init__()
+
+    def _prefix_matches(self, prefix):
+        """Get IDs indexed under any token starting with prefix"""
+        matches = set()
+        for token in self._tokens.irange(prefix):
+            if not token.startswith(prefix):
+                break
+            matches |= self._postings.get(token, ())
+        return matches
+
+    def search(self, query):
+        """Get IDs matching every query token by prefix, in insertion order"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Longest terms first: they usually have the fewest matches
+        terms.sort(key=len, reverse=True)
+        results = self._prefix_matches(terms[0])
+        for term in terms[1:]:
+            if not results:
+                break
+            results &= self._prefix_matches(term)
+        order = self._order
+        return sorted(results, key=lambda doc_id: order.get(doc_id, self._counter))
+
+class PriceIndex:
+    """Sorted index of item prices for range queries
+
+    Entries are (price, item_id) pairs in SortedChunks, so like SearchIndex,
+    range queries see a consistent state without locking.
+    """
+
+    def __init__(self, entries=()):
+        self._entries = SortedChunks((price, item_id) for item_id, price in entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, item_id, price):
+        """Insert an item at its price position"""
+        self._entries.add((price, item_id))
+
+    def add_many(self, entries):
+        """Insert many (item_id, price) pairs in one merge"""
+        self._entries.update((price, item_id) for item_id, price in entries)
+
+    def remove(self, item_id, price):
+        """Remove an item previously added at the given price"""
+        try:
+            self._entries.remove((price, item_id))
+        except ValueError:
+            raise ValueError(f"Item {item_id} is not indexed at price {price}") from None
+
+    def range(self, min_price=None, max_price=None):
+        """Yield (price, item_id) pairs within the inclusive bounds, cheapest first"""
+        for entry in self._entries.irange(None if min_price is None else (min_price,)):
+            if max_price is not None and entry[0] > max_price:
+                return
+            yield entry
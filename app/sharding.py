@@ -0,0 +1,501 @@
+import heapq
+import threading
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import chain, islice
+from types import MappingProxyType
+from analytics import RentalAnalytics
+from customer import Customer
+from loading import LoadOnce
+from history import MergedHistoryView, to_micros
+from models import RentalObject
+from pagination import DEFAULT_PER_PAGE, clamp, paginate
+from rental_manager import parse_price_range
+
+def by_price(item):
+    """Sort key putting items in the order RentalManager lists them cheapest first"""
+    return item.rental_price, item.id
+
+def by_end_time(entry):
+    """Sort key putting rental history entries in order of return"""
+    return to_micros(entry['end_time'])
+
+class ShardedRentalManager(LoadOnce):
+    """Routes rental operations to one RentalManager per depot
+
+    Each depot's manager holds the items kept there, with their rentals,
+    history, and reservations, in its own storage files. Operations on one
+    item go to the depot holding it; searches and listings run on every depot
+    at once and their results are merged. Customers can rent from any depot,
+    so every depot keeps a copy of each customer, and adding, editing, or
+    removing one is applied to every depot in turn.
+
+    It has the same methods as RentalManager, so the routes use either alike.
+    """
+
+    def __init__(self, shards):
+        if not shards:
+            raise ValueError("At least one depot is needed")
+        self._shards = dict(shards)  # depot -> RentalManager
+        self._first = next(iter(self._shards.values()))  # Answers for customers, which every depot holds
+        self._depot_by_item = {}  # item_id -> depot, a cache checked against the depot on use
+        self._lock = threading.RLock()  # Serializes changes spanning depots, and adding items
+        self._pool = ThreadPoolExecutor(max_workers=len(self._shards), thread_name_prefix='rental-depot')
+
+        self._init_loading()
+
+    def _fan_out(self, func):
+        """Call func with every depot's manager at once, and get the results in depot order"""
+        if len(self._shards) == 1:
+            return [func(self._first)]
+        return list(self._pool.map(func, self._shards.values()))
+
+    def _owner(self, item_id):
+        """Get the manager holding an item, or None"""
+        shard = self._shards.get(self._depot_by_item.get(item_id))
+        if shard is not None and shard.get_item(item_id) is not None:
+            return shard
+        # Not looked up yet, or moved by another process sharing a depot's storage
+        for depot, shard in self._shards.items():
+            if shard.get_item(item_id) is not None:
+                self._depot_by_item[item_id] = depot
+                return shard
+        return None
+
+    def _route(self, item_id):
+        """Get the manager an item's operations go to; unknown items go to the first, which reports them"""
+        return self._owner(item_id) or self._first
+
+    @staticmethod
+    def _cheapest(results, limit=None):
+        """Merge lists of items that are each cheapest first"""
+        matches = heapq.merge(*results, key=by_price)
+        if limit is not None:
+            matches = islice(matches, limit)
+        return list(matches)
+
+    @property
+    def shards(self):
+        """Get a read-only mapping of depot names to their RentalManager"""
+        return MappingProxyType(self._shards)
+
+    @property
+    def depots(self):
+        """Get the names of the depots, in the order they were given"""
+        return tuple(self._shards)
+
+    @property
+    def analytics(self):
+        """Get the revenue totals over every depot's rental history"""
+        return RentalAnalytics.combine(shard.analytics for shard in self._shards.values())
+
+    @property
+    def data_version(self):
+        """Get a counter that increases whenever any data changes"""
+        return sum(shard.data_version for shard in self._shards.values())
+
+    @property
+    def data_etag(self):
+        """Get an HTTP entity tag for the current data"""
+        return '.'.join(shard.data_etag for shard in self._shards.values())
+
+    @property
+    def last_modified(self):
+        """Get when the data last changed, in UTC"""
+        return max(shard.last_modified for shard in self._shards.values())
+
+    @property
+    def items(self):
+        """Get a read-only live view of all rental items"""
+        return MappingProxyType(ChainMap(*(shard.items for shard in self._shards.values())))
+
+    @property
+    def customers(self):
+        """Get a read-only live view of all customers"""
+        return self._first.customers
+
+    @property
+    def rental_history(self):
+        """Get a read-only view of the rental history as it is now, in order of return"""
+        return MergedHistoryView(shard.rental_history for shard in self._shards.values())
+
+    def get_item(self, item_id):
+        """Get a single item by ID, or None"""
+        shard = self._owner(item_id)
+        return shard.get_item(item_id) if shard is not None else None
+
+    def get_customer(self, customer_id):
+        """Get a single customer by ID, or None"""
+        return self._first.get_customer(customer_id)
+
+    def get_item_depot(self, item_id):
+        """Get the depot holding an item, or None"""
+        shard = self._owner(item_id)
+        return shard.depot if shard is not None else None
+
+    def add_item(self, item, depot=None):
+        """Add a rental item to a depot, which may be left out when there is only one"""
+        with self._lock:
+            depot = self._check_new_item(item, depot)
+            self._shards[depot].add_item(item, depot)
+            self._depot_by_item[item.id] = depot
+
+    def add_items(self, items, depots=None):
+        """Add many rental items, each depot indexing its share together
+
+        Items that can't be added are skipped; returns the (position, error)
+        of each of them.
+        """
+        items = list(items)
+        depots = list(depots) if depots is not None else [None] * len(items)
+        errors = []
+        positions_by_depot = {}
+        with self._lock:
+            pending = set()  # IDs earlier in this call, which the depots don't have yet
+            for position, (item, depot) in enumerate(zip(items, depots)):
+                try:
+                    depot = self._check_new_item(item, depot)
+                    if item.id in pending:
+                        raise ValueError(f"Item with ID {item.id} already exists")
+                except (ValueError, TypeError) as e:
+                    errors.append((position, e))
+                    continue
+                pending.add(item.id)
+                positions_by_depot.setdefault(depot, []).append(position)
+            for depot, positions in positions_by_depot.items():
+                refused = self._shards[depot].add_items([items[position] for position in positions],
+                                                        [depot] * len(positions))
+                errors.extend((positions[i], e) for i, e in refused)
+                refused = {positions[i] for i, _ in refused}
+                for position in positions:
+                    if position not in refused:
+                        self._depot_by_item[items[position].id] = depot
+        return sorted(errors, key=lambda error: error[0])
+
+    def _check_new_item(self, item, depot):
+        """Check that an item can be added, and get the depot it goes to; call with _lock held"""
+        if not isinstance(item, RentalObject):
+            raise TypeError("Item must be a RentalObject")
+        if depot is None and len(self._shards) == 1:
+            depot = next(iter(self._shards))
+        if depot is None:
+            raise ValueError(f"A depot is required, one of: {', '.join(self._shards)}")
+        if depot not in self._shards:
+            raise ValueError(f"Unknown depot: {depot}")
+        # Item IDs are unique across depots, so each one has a single owner to route to
+        if self._owner(item.id) is not None:
+            raise ValueError(f"Item with ID {item.id} already exists")
+        return depot
+
+    def remove_item(self, item_id):
+        """Remove an item from its depot"""
+        removed = self._route(item_id).remove_item(item_id)
+        self._depot_by_item.pop(item_id, None)
+        return removed
+
+    def edit_item(self, item_id, name=None, rental_price=None, brand=None, bike_type=None):
+        """Edit item details"""
+        return self._route(item_id).edit_item(item_id, name, rental_price, brand, bike_type)
+
+    def add_customer(self, customer):
+        """Add a new customer to every depot"""
+        with self._lock:
+            self._check_new_customer(customer)
+            for shard in self._shards.values():
+                # Each depot tracks the customer's rentals there on its own copy
+                shard.add_customer(customer if shard is self._first else Customer.from_dict(customer.to_dict()))
+
+    def add_customers(self, customers):
+        """Add many customers to every depot, each depot indexing them together
+
+        Customers that can't be added are skipped; returns the (position,
+        error) of each of them.
+        """
+        customers = list(customers)
+        errors = []
+        accepted = []
+        with self._lock:
+            pending = set()
+            for position, customer in enumerate(customers):
+                try:
+                    self._check_new_customer(customer)
+                    if customer.id in pending:
+                        raise ValueError(f"Customer with ID {customer.id} already exists")
+                except (ValueError, TypeError) as e:
+                    errors.append((position, e))
+                    continue
+                pending.add(customer.id)
+                accepted.append(customer)
+            for shard in self._shards.values():
+                shard.add_customers(accepted if shard is self._first else
+                                    [Customer.from_dict(customer.to_dict()) for customer in accepted])
+        return errors
+
+    def _check_new_customer(self, customer):
+        """Check that a customer can be added at every depot; call with _lock held"""
+        if not isinstance(customer, Customer):
+            raise TypeError("Customer must be a Customer object")
+        if any(shard.get_customer(customer.id) is not None for shard in self._shards.values()):
+            raise ValueError(f"Customer with ID {customer.id} already exists")
+
+    def remove_customer(self, customer_id):
+        """Remove a customer from every depot"""
+        with self._lock:
+            if self._first.get_customer(customer_id) is None:
+                raise ValueError(f"Customer with ID {customer_id} does not exist")
+            # Checked at every depot before any of them removes the customer
+            for shard in self._shards.values():
+                customer = shard.get_customer(customer_id)
+                if customer is not None and customer.has_active_rentals():
+                    raise ValueError("Cannot remove customer while they have active rentals")
+            if self.get_customer_reservations(customer_id):
+                raise ValueError("Cannot remove customer while they have upcoming reservations")
+            for shard in self._shards.values():
+                if shard.get_customer(customer_id) is not None:
+                    shard.remove_customer(customer_id)
+        return True
+
+    def edit_customer(self, customer_id, first_name=None, last_name=None, address=None, contact_number=None):
+        """Edit customer details at every depot"""
+        with self._lock:
+            for shard in self._shards.values():
+                shard.edit_customer(customer_id, first_name, last_name, address, contact_number)
+        return True
+
+    def refresh(self):
+        """Pick up changes other processes made to each depot's shared storage"""
+        for shard in self._shards.values():
+            shard.refresh()
+
+    def rent_item(self, customer_id, item_id):
+        """Rent an item to a customer, at the item's depot"""
+        return self._route(item_id).rent_item(customer_id, item_id)
+
+    def return_item(self, customer_id, item_id):
+        """Return an item rented by a customer, at the item's depot"""
+        return self._route(item_id).return_item(customer_id, item_id)
+
+    def get_customer_rentals(self, customer_id):
+        """Get all active rentals for a customer, across depots"""
+        return [rental for shard in self._shards.values() for rental in shard.get_customer_rentals(customer_id)]
+
+    def get_active_rental(self, item_id):
+        """Get the active rental for an item, or None if it is not rented"""
+        return self._route(item_id).get_active_rental(item_id)
+
+    def get_item_renter(self, item_id):
+        """Get the ID of the customer currently renting an item, or None"""
+        return self._route(item_id).get_item_renter(item_id)
+
+    @property
+    def item_renters(self):
+        """Get a read-only live mapping of rented item IDs to the renting customer's ID"""
+        return MappingProxyType(ChainMap(*(shard.item_renters for shard in self._shards.values())))
+
+    def get_item_rental_history(self, item_id):
+        """Get rental history for a specific item"""
+        return self._route(item_id).get_item_rental_history(item_id)
+
+    def get_customer_rental_history(self, customer_id):
+        """Get rental history for a specific customer, across depots in order of return"""
+        return MergedHistoryView(self._fan_out(lambda shard: shard.get_customer_rental_history(customer_id)))
+
+    def utilization(self, start=None, end=None, item_type=None):
+        """Get the share of item-hours between two datetimes that items were rented, across depots"""
+        if start is None:
+            # Every depot measures from the same start, the first rental at any of them
+            starts = [first for first in self._fan_out(lambda shard: shard.history_start()) if first is not None]
+            start = min(starts, default=None)
+        shares = self._fan_out(lambda shard: shard.utilization(start, end, item_type))
+        fleets = [sum(sum(counts.values()) for counted_type, counts in shard.item_counts().items()
+                      if item_type is None or counted_type == item_type)
+                  for shard in self._shards.values()]
+        total = sum(fleets)
+        return sum(share * fleet for share, fleet in zip(shares, fleets)) / total if total else 0.0
+
+    def reserve_item(self, customer_id, item_id, start_time, end_time):
+        """Book an item for a customer between two datetimes, at the item's depot"""
+        return self._route(item_id).reserve_item(customer_id, item_id, start_time, end_time)
+
+    def _reservation_owner(self, reservation_id):
+        """Get the manager holding a reservation, or None"""
+        for shard in self._shards.values():
+            if shard.get_reservation(reservation_id) is not None:
+                return shard
+        return None
+
+    def cancel_reservation(self, reservation_id):
+        """Cancel a reservation"""
+        return (self._reservation_owner(reservation_id) or self._first).cancel_reservation(reservation_id)
+
+    def get_reservation(self, reservation_id):
+        """Get a single reservation by ID, or None"""
+        shard = self._reservation_owner(reservation_id)
+        return shard.get_reservation(reservation_id) if shard is not None else None
+
+    def get_item_reservations(self, item_id, include_past=False):
+        """Get an item's reservations, earliest first"""
+        return self._route(item_id).get_item_reservations(item_id, include_past)
+
+    def get_customer_reservations(self, customer_id, include_past=False):
+        """Get a customer's reservations across depots, earliest first"""
+        return list(heapq.merge(*(shard.get_customer_reservations(customer_id, include_past)
+                                  for shard in self._shards.values()),
+                                key=lambda reservation: reservation.start_time))
+
+    def find_available_items(self, start_time, end_time, item_type=None, min_price=None, max_price=None, limit=None):
+        """Find items free to reserve between two datetimes at any depot, cheapest first"""
+        return self._cheapest(self._fan_out(lambda shard: shard.find_available_items(
+            start_time, end_time, item_type, min_price, max_price, limit)), limit)
+
+    def search_items(self, query):
+        """Search items at every depot by name, type, or price range"""
+        results = self._fan_out(lambda shard: shard.search_items(query))
+        if query and parse_price_range(query.lower()) is not None:
+            return self._cheapest(results)
+        return list(chain.from_iterable(results))
+
+    def find_items(self, min_price=None, max_price=None, item_type=None, available=None, limit=None):
+        """Find items at every depot by price range, type, and availability, cheapest first"""
+        return self._cheapest(self._fan_out(lambda shard: shard.find_items(
+            min_price, max_price, item_type, available, limit)), limit)
+
+    def search_customers(self, query):
+        """Search customers by name, address, or contact number"""
+        return self._first.search_customers(query)
+
+    def get_rented_items(self):
+        """Get list of currently rented items"""
+        return [item for shard in self._shards.values() for item in shard.get_rented_items()]
+
+    def get_available_items(self):
+        """Get list of available (not rented) items"""
+        return [item for shard in self._shards.values() for item in shard.get_available_items()]
+
+    def get_customers_with_active_rentals(self):
+        """Get list of customers who have active rentals at any depot"""
+        customers = {}
+        for shard in self._shards.values():
+            for customer in shard.get_customers_with_active_rentals():
+                customers.setdefault(customer.id, customer)
+        return list(customers.values())
+
+    def list_items(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of all items, depot by depot in the order they were added"""
+        shards = self._shards.values()
+        items = [list(shard.items.values()) for shard in shards]
+        return paginate(chain.from_iterable(items), sum(map(len, items)), page, per_page)
+
+    def list_available_items(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of available items, cheapest first"""
+        page, per_page = clamp(page, per_page)
+        # Each depot's cheapest items up to the end of the page are enough to merge the page
+        results = self._fan_out(lambda shard: shard.find_items(available=True, limit=page * per_page))
+        total = sum(counts['available'] for counts in self.item_counts().values())
+        return paginate(self._cheapest(results), total, page, per_page)
+
+    def list_customers(self, page=1, per_page=DEFAULT_PER_PAGE):
+        """Get one page of all customers, in the order they were added"""
+        return self._first.list_customers(page, per_page)
+
+    def recent_history(self, n=5):
+        """Get the last n rental history entries across depots, oldest first"""
+        if n <= 0:
+            return []
+        entries = list(heapq.merge(*(shard.recent_history(n) for shard in self._shards.values()), key=by_end_time))
+        return entries[-n:]
+
+    def item_row(self, item):
+        """Get the dashboard row for an item"""
+        return self._route(item.id).item_row(item)
+
+    def customer_row(self, customer):
+        """Get the dashboard row for a customer, with their rentals at every depot"""
+        rows = []
+        for shard in self._shards.values():
+            own = shard.get_customer(customer.id)  # The copy whose rentals that depot tracks
+            if own is not None:
+                rows.append(shard.customer_row(own))
+        if not rows:
+            return self._first.customer_row(customer)
+        row = dict(rows[0])
+        row['rentals'] = tuple(chain.from_iterable(other['rentals'] for other in rows))
+        row['has_rentals'] = any(other['has_rentals'] for other in rows)
+        return row
+
+    def item_counts(self):
+        """Get the number of available and rented items per type"""
+        counts = {}
+        for shard in self._shards.values():
+            for item_type, type_counts in shard.item_counts().items():
+                totals = counts.setdefault(item_type, {'available': 0, 'rented': 0})
+                for state, count in type_counts.items():
+                    totals[state] += count
+        return dict(sorted(counts.items()))
+
+    def dataset_sizes(self):
+        """Get the number of items, customers, rentals, history entries, and reservations held"""
+        sizes = {}
+        for shard in self._shards.values():
+            for kind, size in shard.dataset_sizes().items():
+                sizes[kind] = sizes.get(kind, 0) + size
+        sizes['customers'] = len(self._first.customers)  # Each depot holds every customer
+        return sizes
+
+    def storage_file_sizes(self):
+        """Get the size of the main storage file in bytes, by depot"""
+        sizes = {}
+        for shard in self._shards.values():
+            sizes.update(shard.storage_file_sizes())
+        return sizes
+
+    def iter_history(self, newest_first=False):
+        """Iterate over rental history entries of every depot, in order of return"""
+        return heapq.merge(*(shard.iter_history(newest_first) for shard in self._shards.values()),
+                           key=by_end_time, reverse=newest_first)
+
+    @contextmanager
+    def batch(self):
+        """Group this thread's operations so each depot persists them once at the end"""
+        with ExitStack() as stack:
+            for shard in self._shards.values():
+                stack.enter_context(shard.batch())
+            yield self
+
+    def save_data(self):
+        """Save every depot through its storage backend"""
+        for shard in self._shards.values():
+            shard.save_data()
+
+    def flush(self):
+        """Write any scheduled save now, e.g. before shutting down"""
+        # One depot at a time: at exit the thread pool no longer takes work
+        for shard in self._shards.values():
+            shard.flush()
+
+    def compact(self):
+        """Force a full write of every depot's state to its storage backend"""
+        self._fan_out(lambda shard: shard.compact())
+
+    def load_data(self):
+        """Load every depot from its storage backend at once"""
+        self._fan_out(lambda shard: shard.ensure_loaded())
+        with self._lock:
+            self._sync_customers()
+            self._depot_by_item = {item_id: depot for depot, shard in self._shards.items() for item_id in shard.items}
+        self._loaded_ok()
+
+    def _sync_customers(self):
+        """Give every depot the customers any depot has, e.g. after an add was interrupted partway"""
+        customers = {}
+        for shard in self._shards.values():
+            for customer_id, customer in list(shard.customers.items()):
+                customers.setdefault(customer_id, customer)
+        for depot, shard in self._shards.items():
+            missing = [customer for customer_id, customer in customers.items() if shard.get_customer(customer_id) is None]
+            if missing:
+                print(f"Copying {len(missing)} customers to depot {depot}")
+                with shard.batch():
+                    for customer in missing:
+                        shard.add_customer(Customer.from_dict(customer.to_dict()))
@@ -0,0 +1,725 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from models import RentalEncoder, item_from_dict
+from customer import Customer
+from archive import HistoryArchive
+from history import HISTORY_COLUMNS, HistoryStore
+from journal import Journal
+from metrics import persistence
+from reservations import Reservation
+
+class StorageBackend(ABC):
+    """Abstract base class for RentalManager persistence"""
+
+    # Whether other processes may change the stored data, e.g. several server workers
+    shared = False
+
+    @abstractmethod
+    def load(self, manager):
+        """Populate the manager's items, customers, rentals, and history"""
+        pass
+
+    @abstractmethod
+    def record(self, op, **data):
+        """Persist a single mutation made by the manager"""
+        pass
+
+    @abstractmethod
+    def prepare_save(self, manager, force=False):
+        """Capture the manager's full state, if this backend needs it
+
+        Returns a callable that writes the captured state, or None if there is
+        nothing left to write. The manager calls this while holding its write
+        lock and runs the callable after releasing it.
+        """
+        pass
+
+    def save(self, manager, force=False):
+        """Persist the manager's full state, if this backend needs it"""
+        write = self.prepare_save(manager, force)
+        if write is not None:
+            write()
+
+    @contextmanager
+    def batch(self):
+        """Group the mutations recorded inside the block into one write"""
+        yield
+
+    def poll(self, manager):
+        """Apply changes other processes have stored since the last load or poll"""
+        pass
+
+    def close(self):
+        """Release any resources held by the backend"""
+        pass
+
+class JsonStorage(StorageBackend):
+    """Stores everything in a JSON snapshot, optionally backed by a journal
+
+    The compact format has one JSON document per line, so it is loaded a line
+    at a time instead of parsing the whole file. The rental history is stored
+    once, column by column, and items refer to their rentals by position.
+
+    With a HistoryArchive, rentals returned before its cutoff are moved out of
+    the snapshot into the archive whenever a snapshot is written.
+
+    With a warm_start file, the state built from the snapshot, indexes
+    included, is also pickled there after the snapshot is read. Later loads
+    unpickle it instead, as long as it was taken from the snapshot file as it
+    is now, and replay the journal on top as usual. The file is only ever
+    read if it was written by this process's code, so it must not be writable
+    by anyone who can't already change the application.
+    """
+
+    FORMAT_VERSION = 2
+    HISTORY_CHUNK = 1000  # Rental history entries per line in the compact format
+    WARM_START_VERSION = 2  # Bump whenever the pickled manager state changes shape
+
+    def __init__(self, filename='data.json', journal=None, compact=False, archive=None, warm_start=None):
+        self._filename = filename
+        self._journal = journal
+        self._compact = compact
+        self._archive = archive
+        self._warm_start = warm_start
+
+    @property
+    def filename(self):
+        """Get snapshot file name"""
+        return self._filename
+
+    @property
+    def archive(self):
+        """Get the archive of older rental history, or None"""
+        return self._archive
+
+    @property
+    def warm_start(self):
+        """Get the warm-start file name, or None if it isn't used"""
+        return self._warm_start
+
+    def load(self, manager):
+        """Load the JSON snapshot and replay any newer journal records"""
+        journal_seq = self._load_warm_start(manager) if self._warm_start else None
+        if journal_seq is None:
+            journal_seq = self._load_snapshot(manager)
+
+        # Replay mutations made since the snapshot was written
+        if self._journal is not None:
+            for record in self._journal.replay(after_seq=journal_seq):
+                manager._replay(record)
+
+    def _load_snapshot(self, manager):
+        """Build the manager's state from the JSON snapshot and return its journal sequence number"""
+        journal_seq = 0
+        try:
+            with persistence('snapshot_read') as stats, open(self._filename, 'r') as f:
+                source = self._snapshot_signature(f)
+                journal_seq = self._build(manager, self._read_snapshot(f))
+                stats['bytes'] = os.fstat(f.fileno()).st_size
+            if self._warm_start:
+                self._write_warm_start(manager, source, journal_seq)
+        except FileNotFoundError:
+            print("Data file not found. Starting with empty data.")
+            self._build(manager, ())
+        except json.JSONDecodeError:
+            print("Error reading data file. Starting with empty data.")
+            self._build(manager, ())
+        except Exception as e:
+            print(f"Error loading data: {str(e)}. Starting with empty data.")
+            raise
+        return journal_seq
+
+    def _snapshot_signature(self, f):
+        """Identify the snapshot in an open file by its size, modification time, and header line"""
+        stat = os.fstat(f.fileno())
+        header = f.readline()
+        f.seek(0)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'header': header,
+                'archived': len(self._archive) if self._archive is not None else None}
+
+    def _load_warm_start(self, manager):
+        """Restore the state pickled from the current snapshot and return its journal sequence number
+
+        Returns None if there is no warm-start file or it was taken from a
+        different snapshot, in which case the snapshot has to be read.
+        """
+        try:
+            with persistence('warm_start_read') as stats, open(self._warm_start, 'rb') as f:
+                header = pickle.load(f)
+                if header.get('version') != self.WARM_START_VERSION:
+                    return None
+                with open(self._filename, 'r') as source:
+                    if header.get('source') != self._snapshot_signature(source):
+                        return None  # The snapshot was rewritten since
+                state = pickle.load(f)
+                stats['bytes'] = f.tell()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading warm-start file: {str(e)}. Reading the snapshot instead.")
+            return None
+        manager._restore_warm(state, self._archive)
+        return header['journal_seq']
+
+    def _write_warm_start(self, manager, source, journal_seq):
+        """Pickle the state just built from the snapshot, for the next load to restore"""
+        # The header is pickled on its own, so a stale file is rejected without reading the rest
+        header = {'version': self.WARM_START_VERSION, 'source': source, 'journal_seq': journal_seq}
+        temp_filename = f'{self._warm_start}.{os.getpid()}.tmp'  # Workers starting together may all write it
+        try:
+            with persistence('warm_start_write') as stats, open(temp_filename, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(manager._warm_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                stats['bytes'] = f.tell()
+            os.replace(temp_filename, self._warm_start)
+        except Exception as e:
+            print(f"Error writing warm-start file: {str(e)}")
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+    def _read_snapshot(self, f):
+        """Yield (kind, value) pairs from a snapshot in either format"""
+        try:
+            header = json.loads(f.readline())
+        except json.JSONDecodeError:
+            header = None  # An indented snapshot; its first line is just '{'
+        if isinstance(header, dict) and header.get('format') == self.FORMAT_VERSION:
+            yield 'journal_seq', header.get('journal_seq', 0)
+            yield 'history_base', header.get('history_base', 0)
+            for line in f:
+                (kind, value), = json.loads(line).items()
+                if kind == 'history':
+                    value = (dict(zip(HISTORY_COLUMNS, row)) for row in zip(*(value[c] for c in HISTORY_COLUMNS)))
+                yield kind, value
+            return
+
+        f.seek(0)
+        data = json.load(f)
+        yield 'journal_seq', data.get('journal_seq', 0)
+        yield 'history_base', data.get('history_base', 0)
+        yield 'history', data.get('rental_history', [])
+        for item_id, rental in data.get('active_rentals', {}).items():
+            yield 'rental', dict(rental, item_id=item_id)
+        for reservation_data in data.get('reservations', []):
+            yield 'reservation', reservation_data
+        for customer_data in data['customers'].values():
+            yield 'customer', customer_data
+        for item_data in data['items'].values():
+            yield 'item', item_data
+
+    def _build(self, manager, records):
+        """Create objects one record at a time and hand them to the manager"""
+        journal_seq = 0
+        # Positions carry on from the archive; a snapshot written before the
+        # archive last grew still holds the entries it took, which are skipped
+        archived = len(self._archive) if self._archive is not None else 0
+        rental_history = HistoryStore(base=archived, archive=self._archive)
+        skip = 0
+        active_rentals = {}
+        reservations = []
+        items = {}
+        customers = {}
+        orphaned = 0
+        for kind, value in records:
+            if kind == 'item':
+                # Compact snapshots refer to rental_history entries by position; the
+                # manager links those back up itself, so only inline entries are kept
+                value['rental_history'] = [entry for entry in value.get('rental_history', [])
+                                           if not isinstance(entry, int)]
+                # Items that are out are restored as available, then re-rented by _restore
+                if value['id'] in active_rentals:
+                    value = dict(value, is_rented=False, current_rental_start=None)
+                elif value.get('is_rented'):
+                    orphaned += 1
+                item = item_from_dict(value)
+                if item is not None:
+                    items[item.id] = item
+            elif kind == 'customer':
+                customers[value['id']] = Customer.from_dict(value)
+            elif kind == 'rental':
+                active_rentals[value['item_id']] = value
+            elif kind == 'reservation':
+                reservations.append(Reservation.from_dict(value))
+            elif kind == 'history':
+                for entry in value:
+                    if skip:
+                        skip -= 1
+                    else:
+                        rental_history.append(entry)
+            elif kind == 'history_base':
+                skip = max(archived - value, 0) if self._archive is not None else 0
+            elif kind == 'journal_seq':
+                journal_seq = value
+        if orphaned:
+            print(f"{orphaned} rented item(s) have no recorded customer and cannot be returned.")
+
+        # Reconstruct active rentals in a single pass
+        manager._restore(items, customers, rental_history, [
+            (rental['customer_id'], item_id, datetime.fromisoformat(rental['start_time']))
+            for item_id, rental in active_rentals.items()
+        ], reservations)
+        return journal_seq
+
+    @staticmethod
+    def _item_history_entry(entry):
+        """Rebuild an item's own history record from a rental history entry"""
+        start_time = entry['start_time']
+        end_time = entry['end_time']
+        return {
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration_hours': (datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)).total_seconds() / 3600,
+            'cost': entry['cost']
+        }
+
+    def record(self, op, **data):
+        """Append the mutation to the journal, if journaling is enabled"""
+        if self._journal is not None:
+            self._journal.append(op, **data)
+
+    @contextmanager
+    def batch(self):
+        """Flush the journal once for all mutations inside the block"""
+        if self._journal is None:
+            yield
+        else:
+            with self._journal.buffered():
+                yield
+
+    def prepare_save(self, manager, force=False):
+        """Capture a full snapshot, unless the journal already covers the changes"""
+        if self._journal is not None and not force and not self._journal.needs_compaction():
+            return None  # Mutations are already durable in the journal
+
+        if self._archive is not None:
+            manager._archive_history(self._archive)
+        data = manager._snapshot()
+        if self._journal is not None:
+            # Records appended from now on go to a new file, which the snapshot won't cover
+            data['journal_seq'] = self._journal.last_seq
+            self._journal.rotate()
+        return lambda: self._write_snapshot(data)
+
+    def _write_snapshot(self, data):
+        """Write the snapshot to a temporary file and rename it over the old one"""
+        # The rename is atomic, so a crash leaves either the old or the new
+        # snapshot in place, never a truncated one
+        temp_filename = self._filename + '.tmp'
+        try:
+            with persistence('snapshot_write') as stats, open(temp_filename, 'w') as f:
+                if self._compact:
+                    self._dump_compact(data, f)
+                else:
+                    json.dump(data, f, indent=4, cls=RentalEncoder)
+                stats['bytes'] = f.tell()
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_filename, self._filename)
+        except Exception as e:
+            print(f"Error saving data: {str(e)}")
+            raise
+        if self._journal is not None:
+            self._journal.discard_rotated()
+
+    def _dump_compact(self, data, f):
+        """Write a snapshot in the line-per-record compact format"""
+        def write(record):
+            f.write(json.dumps(record, separators=(',', ':'), cls=RentalEncoder))
+            f.write('\n')
+
+        write({'format': self.FORMAT_VERSION, 'journal_seq': data.get('journal_seq', 0),
+               'history_base': data.get('history_base', 0)})
+        rental_history = data['rental_history']
+        positions = {}
+        for start in range(0, len(rental_history), self.HISTORY_CHUNK):
+            chunk = rental_history[start:start + self.HISTORY_CHUNK]
+            write({'history': {column: [entry.get(column) for entry in chunk] for column in HISTORY_COLUMNS}})
+        for position, entry in enumerate(rental_history):
+            positions[(entry['item_id'], entry['start_time'], entry['end_time'])] = position
+
+        # Rentals come before items so the loader knows which items are out
+        for item_id, rental in data['active_rentals'].items():
+            write({'rental': dict(rental, item_id=item_id)})
+        for reservation_data in data['reservations']:
+            write({'reservation': reservation_data})
+        for customer_data in data['customers'].values():
+            write({'customer': customer_data})
+        for item_id, item_data in data['items'].items():
+            history = []
+            for entry in item_data['rental_history']:
+                position = positions.get((item_id, entry['start_time'], entry['end_time']))
+                # Entries that can't be rebuilt exactly from rental_history are kept inline
+                if position is not None and self._item_history_entry(rental_history[position]) == entry:
+                    history.append(position)
+                else:
+                    history.append(entry)
+            write({'item': dict(item_data, rental_history=history)})
+
+    def close(self):
+        """Close the journal file"""
+        if self._journal is not None:
+            self._journal.close()
+
+class SqliteStorage(StorageBackend):
+    """Stores items, customers, rentals, and history in indexed SQLite tables
+
+    Several processes can share one database. Every mutation is also written to
+    the changes table, so each process can replay what the others did instead
+    of reloading everything.
+    """
+
+    shared = True
+    CHANGES_KEPT = 10000  # Processes further behind than this reload in full
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            rental_price REAL NOT NULL,
+            brand TEXT,
+            bike_type TEXT
+        );
+        CREATE TABLE IF NOT EXISTS item_history (
+            item_id TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            duration_hours REAL NOT NULL,
+            cost REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_item_history_item ON item_history (item_id);
+        CREATE TABLE IF NOT EXISTS customers (
+            id TEXT PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            address TEXT NOT NULL,
+            contact_number TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS active_rentals (
+            item_id TEXT PRIMARY KEY,
+            customer_id TEXT NOT NULL,
+            start_time TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_active_rentals_customer ON active_rentals (customer_id);
+        CREATE TABLE IF NOT EXISTS rental_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id TEXT NOT NULL,
+            customer_name TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            cost REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rental_history_customer ON rental_history (customer_id);
+        CREATE INDEX IF NOT EXISTS idx_rental_history_item ON rental_history (item_id);
+        CREATE TABLE IF NOT EXISTS reservations (
+            id TEXT PRIMARY KEY,
+            item_id TEXT NOT NULL,
+            customer_id TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_reservations_item ON reservations (item_id, start_time);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            record TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, filename='data.db'):
+        self._filename = filename
+        self._lock = threading.RLock()  # Held by the thread with an open transaction
+        self._in_transaction = False
+        self._connect()
+        if hasattr(os, 'register_at_fork'):
+            # A connection must not be shared with a forked worker
+            os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        """Open the database connection and identify this process's changes"""
+        # Autocommit mode; every mutation runs in its own explicit transaction
+        self._conn = sqlite3.connect(self._filename, isolation_level=None, check_same_thread=False,
+                                     timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._source = uuid.uuid4().hex  # Tags the changes written through this connection
+        self._last_change = 0  # Highest changes.seq reflected in the manager
+        self._data_version = None  # Changes when another connection commits
+        self._written_change = None  # Our own changes.seq in the open transaction, once committed
+
+    @property
+    def filename(self):
+        """Get database file name"""
+        return self._filename
+
+    @contextmanager
+    def batch(self):
+        """Commit all mutations inside the block in a single transaction
+
+        The database stays locked against other processes until the block exits.
+        """
+        with self._transaction():
+            yield
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block of statements atomically, joining this thread's open transaction"""
+        with self._lock:
+            if self._in_transaction:
+                yield self._conn
+                return
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._in_transaction = True
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            else:
+                with persistence('sqlite_commit'):
+                    self._conn.execute('COMMIT')
+                if self._written_change:
+                    self._last_change = self._written_change
+            finally:
+                self._in_transaction = False
+                self._written_change = None
+
+    def load(self, manager):
+        """Load all tables into the manager"""
+        with self._lock:
+            # Read every table from one consistent snapshot of the database
+            if self._in_transaction:
+                self._load(manager)
+                return
+            self._conn.execute('BEGIN')
+            try:
+                self._load(manager)
+            finally:
+                self._conn.execute('COMMIT')
+
+    def _load(self, manager):
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._last_change = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+        item_history = defaultdict(list)
+        for row in self._conn.execute(
+                'SELECT item_id, start_time, end_time, duration_hours, cost FROM item_history ORDER BY rowid'):
+            record = dict(row)
+            item_history[record.pop('item_id')].append(record)
+
+        items = {}
+        for row in self._conn.execute('SELECT * FROM items'):
+            item_data = dict(row)
+            item_data['rental_history'] = item_history.get(item_data['id'], [])
+            item = item_from_dict(item_data)
+            if item is not None:
+                items[item.id] = item
+
+        customers = {}
+        for row in self._conn.execute('SELECT * FROM customers'):
+            customer = Customer.from_dict(dict(row))
+            customers[customer.id] = customer
+
+        rental_history = [dict(row) for row in self._conn.execute(
+            'SELECT customer_id, customer_name, item_id, item_name, start_time, end_time, cost '
+            'FROM rental_history ORDER BY seq')]
+
+        active_rentals = [(row['customer_id'], row['item_id'], datetime.fromisoformat(row['start_time']))
+                          for row in self._conn.execute('SELECT item_id, customer_id, start_time FROM active_rentals')]
+        # Reservations that are over are left behind; the next full rewrite drops them
+        reservations = [Reservation.from_dict(dict(row)) for row in self._conn.execute(
+            'SELECT * FROM reservations WHERE end_time > ?', (datetime.now().isoformat(),))]
+        manager._restore(items, customers, rental_history, active_rentals, reservations)
+
+    def record(self, op, **data):
+        """Apply the mutation to the affected rows only"""
+        handler = getattr(self, f'_record_{op}', None)
+        if handler is None:
+            raise ValueError(f"Unknown storage operation: {op}")
+        with self._transaction() as conn:
+            # A savepoint keeps one failed mutation in a batch from leaving partial rows
+            conn.execute('SAVEPOINT record')
+            try:
+                handler(conn, **data)
+                seq = self._record_change(conn, op, data)
+            except Exception:
+                conn.execute('ROLLBACK TO record')
+                conn.execute('RELEASE record')
+                raise
+            conn.execute('RELEASE record')
+            if seq == (self._written_change or self._last_change) + 1:
+                self._written_change = seq  # Nothing from other processes in between
+
+    def _record_change(self, conn, op, data):
+        """Log a mutation for other processes to replay"""
+        record = dict(data, op=op)
+        seq = conn.execute('INSERT INTO changes (source, record) VALUES (?, ?)',
+                           (self._source, json.dumps(record, separators=(',', ':'), default=str))).lastrowid
+        if seq % 1000 == 0:
+            conn.execute('DELETE FROM changes WHERE seq <= ?', (seq - self.CHANGES_KEPT,))
+        return seq
+
+    def poll(self, manager):
+        """Replay changes committed by other processes, or reload if too far behind"""
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return  # Nobody else has committed since we last looked
+            oldest = self._conn.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+            if oldest is not None and oldest > self._last_change + 1:
+                print("Shared data changed too much since it was loaded. Reloading.")
+                self.load(manager)
+                return
+            self._data_version = data_version
+            for row in self._conn.execute('SELECT seq, source, record FROM changes WHERE seq > ? ORDER BY seq',
+                                          (self._last_change,)).fetchall():
+                if row['source'] != self._source:
+                    manager._replay(json.loads(row['record']))
+                self._last_change = row['seq']
+
+    def prepare_save(self, manager, force=False):
+        """Rewrite every table from the manager; only needed when forced"""
+        if not force:
+            return None  # Every mutation has already been committed
+        data = manager._snapshot()
+        with self._transaction() as conn:
+            for table in ('items', 'item_history', 'customers', 'active_rentals', 'rental_history', 'reservations'):
+                conn.execute(f'DELETE FROM {table}')
+            for item_data in data['items'].values():
+                self._insert_item(conn, item_data)
+            for customer_data in data['customers'].values():
+                self._insert_customer(conn, customer_data)
+            for item_id, rental in data['active_rentals'].items():
+                conn.execute('INSERT INTO active_rentals (item_id, customer_id, start_time) VALUES (?, ?, ?)',
+                             (item_id, rental['customer_id'], rental['start_time']))
+            conn.executemany(
+                'INSERT INTO rental_history (customer_id, customer_name, item_id, item_name, start_time, end_time, cost) '
+                'VALUES (:customer_id, :customer_name, :item_id, :item_name, :start_time, :end_time, :cost)',
+                data['rental_history'])
+            for reservation_data in data['reservations']:
+                self._insert_reservation(conn, reservation_data)
+        return None  # Written under the manager's write lock, so no other process can interleave
+
+    def close(self):
+        """Close the database connection"""
+        self._conn.close()
+
+    @staticmethod
+    def _insert_item(conn, item_data):
+        """Insert an item row and its own rental history"""
+        conn.execute('INSERT INTO items (id, type, name, rental_price, brand, bike_type) VALUES (?, ?, ?, ?, ?, ?)',
+                     (item_data['id'], item_data['type'], item_data['name'], item_data['rental_price'],
+                      item_data.get('brand'), item_data.get('bike_type')))
+        conn.executemany('INSERT INTO item_history (item_id, start_time, end_time, duration_hours, cost) '
+                         'VALUES (:item_id, :start_time, :end_time, :duration_hours, :cost)',
+                         [dict(record, item_id=item_data['id']) for record in item_data.get('rental_history', [])])
+
+    @staticmethod
+    def _insert_customer(conn, customer_data):
+        """Insert a customer row"""
+        conn.execute('INSERT INTO customers (id, first_name, last_name, address, contact_number) '
+                     'VALUES (:id, :first_name, :last_name, :address, :contact_number)', customer_data)
+
+    @staticmethod
+    def _insert_reservation(conn, reservation_data):
+        """Insert a reservation row"""
+        conn.execute('INSERT INTO reservations (id, item_id, customer_id, start_time, end_time) '
+                     'VALUES (:id, :item_id, :customer_id, :start_time, :end_time)', reservation_data)
+
+    def _record_add_item(self, conn, item):
+        self._insert_item(conn, item)
+
+    def _record_remove_item(self, conn, item_id):
+        conn.execute('DELETE FROM items WHERE id = ?', (item_id,))
+        conn.execute('DELETE FROM item_history WHERE item_id = ?', (item_id,))
+        conn.execute('DELETE FROM reservations WHERE item_id = ?', (item_id,))
+
+    def _record_edit_item(self, conn, item_id, name=None, rental_price=None, brand=None, bike_type=None):
+        # Empty values leave the field unchanged, matching RentalObject.edit_details
+        conn.execute('UPDATE items SET '
+                     'name = COALESCE(NULLIF(?, \'\'), name), '
+                     'rental_price = COALESCE(?, rental_price), '
+                     'brand = COALESCE(NULLIF(?, \'\'), brand), '
+                     'bike_type = COALESCE(NULLIF(?, \'\'), bike_type) '
+                     'WHERE id = ?',
+                     (name, rental_price, brand, bike_type, item_id))
+
+    def _record_add_customer(self, conn, customer):
+        self._insert_customer(conn, customer)
+
+    def _record_edit_customer(self, conn, customer_id, first_name=None, last_name=None,
+                              address=None, contact_number=None):
+        # Empty values leave the field unchanged, matching Customer.edit_details
+        conn.execute('UPDATE customers SET '
+                     'first_name = COALESCE(NULLIF(?, \'\'), first_name), '
+                     'last_name = COALESCE(NULLIF(?, \'\'), last_name), '
+                     'address = COALESCE(NULLIF(?, \'\'), address), '
+                     'contact_number = COALESCE(NULLIF(?, \'\'), contact_number) '
+                     'WHERE id = ?',
+                     (first_name, last_name, address, contact_number, customer_id))
+
+    def _record_remove_customer(self, conn, customer_id):
+        conn.execute('DELETE FROM customers WHERE id = ?', (customer_id,))
+        conn.execute('DELETE FROM reservations WHERE customer_id = ?', (customer_id,))
+
+    def _record_rent_item(self, conn, customer_id, item_id, start_time):
+        conn.execute('INSERT INTO active_rentals (item_id, customer_id, start_time) VALUES (?, ?, ?)',
+                     (item_id, customer_id, start_time))
+        # The customer's own reservation in effect is fulfilled, as in RentalManager._rent
+        conn.execute('DELETE FROM reservations WHERE item_id = ? AND customer_id = ? AND start_time <= ? AND end_time > ?',
+                     (item_id, customer_id, start_time, start_time))
+
+    def _record_reserve_item(self, conn, reservation):
+        self._insert_reservation(conn, reservation)
+
+    def _record_cancel_reservation(self, conn, reservation_id):
+        conn.execute('DELETE FROM reservations WHERE id = ?', (reservation_id,))
+
+    def _record_return_item(self, conn, customer_id, item_id, end_time, cost):
+        row = conn.execute('SELECT start_time FROM active_rentals WHERE item_id = ? AND customer_id = ?',
+                           (item_id, customer_id)).fetchone()
+        if row is None:
+            raise ValueError("No active rental found for this customer and item")
+        start_time = row['start_time']
+        duration_hours = (datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)).total_seconds() / 3600
+        conn.execute('DELETE FROM active_rentals WHERE item_id = ?', (item_id,))
+        conn.execute('INSERT INTO item_history (item_id, start_time, end_time, duration_hours, cost) '
+                     'VALUES (?, ?, ?, ?, ?)', (item_id, start_time, end_time, duration_hours, cost))
+        conn.execute('INSERT INTO rental_history (customer_id, customer_name, item_id, item_name, start_time, end_time, cost) '
+                     'SELECT c.id, c.first_name || \' \' || c.last_name, i.id, i.name, ?, ?, ? '
+                     'FROM customers c, items i WHERE c.id = ? AND i.id = ?',
+                     (start_time, end_time, cost, customer_id, item_id))
+
+def open_storage(spec='json', history_months=None, warm_start=False, directory=None):
+    """Create a storage backend from a spec such as 'json' or 'sqlite:data.db'
+
+    With history_months, the JSON backend keeps that many whole months of
+    rental history in memory and archives older months under history/. With
+    warm_start, it keeps a pickled copy of the loaded state in data.pickle.
+    With a directory, every file goes there instead of the current directory,
+    e.g. one directory per depot.
+    """
+    kind, _, filename = spec.partition(':')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, name) if directory else name
+    if kind == 'json':
+        # Mutations are appended to data.journal and folded into data.json periodically
+        archive = HistoryArchive(path('history'), history_months) if history_months else None
+        return JsonStorage(path(filename or 'data.json'), journal=Journal(path('data.journal')), compact=True,
+                           archive=archive, warm_start=path('data.pickle') if warm_start else None)
+    elif kind == 'sqlite':
+        return SqliteStorage(path(filename or 'data.db'))
+    raise ValueError(f"Unknown storage backend: {kind}")
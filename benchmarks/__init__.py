@@ -0,0 +1,12 @@
+"""Benchmarks for the rental system, run with `python -m benchmarks`
+
+The application modules import each other by their plain names, as they do
+when the app is run from the app directory, so that directory is put first
+on the import path here.
+"""
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
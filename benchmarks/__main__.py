@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+import tempfile
+from benchmarks.run import format_report, run, save_results
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Generate a synthetic dataset and time the main code paths on it.')
+    parser.add_argument('--items', type=int, default=1000, help='number of cars and bikes')
+    parser.add_argument('--customers', type=int, default=1000, help='number of customers')
+    parser.add_argument('--months', type=int, default=12, help='months of rental history')
+    parser.add_argument('--rentals-per-month', type=int, default=5000, help='returned rentals per month')
+    parser.add_argument('--storage', default='json', help="storage spec, e.g. 'json' or 'sqlite:data.db'")
+    parser.add_argument('--history-months', type=int, default=12, help='months of history kept in memory (0 keeps all)')
+    parser.add_argument('--flush-interval', type=float, default=1, help='seconds between background snapshots for the routes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark; fast ones run more')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the dataset')
+    parser.add_argument('--no-routes', action='store_true', help='skip the Flask route benchmarks')
+    parser.add_argument('--workdir', help='directory for the generated data (default: a temporary directory)')
+    parser.add_argument('--results', default=RESULTS_DIR, help='directory to save results in')
+    parser.add_argument('--compare', metavar='RESULTS_FILE', help='earlier results to compare against')
+    args = parser.parse_args()
+
+    config = {
+        'items': args.items,
+        'customers': args.customers,
+        'months': args.months,
+        'rentals_per_month': args.rentals_per_month,
+        'storage': args.storage,
+        'history_months': args.history_months,
+        'flush_interval': args.flush_interval,
+        'seed': args.seed,
+        'workdir': os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='rental-bench-'))
+    }
+    report = run(config, repeat=args.repeat, routes=not args.no_routes)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+    print(f"Saved to {save_results(report, args.results)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import random
+from datetime import datetime, timedelta
+from models import Bike, Car
+from customer import Customer
+from history import HistoryStore
+from rental_manager import RentalManager
+
+BRANDS = ('Toyota', 'Ford', 'Honda', 'BMW', 'Tesla', 'Kia', 'Volvo', 'Mazda', 'Audi', 'Fiat')
+CAR_MODELS = ('Corolla', 'Focus', 'Civic', 'Model 3', 'Sportage', 'XC40', 'CX-5', 'A4', 'Panda', 'Golf')
+BIKE_TYPES = ('road', 'mountain', 'hybrid', 'electric', 'cargo', 'folding')
+BIKE_MODELS = ('Trek', 'Giant', 'Specialized', 'Cannondale', 'Brompton', 'Riese')
+FIRST_NAMES = ('Ava', 'Ben', 'Chloe', 'Dev', 'Ema', 'Finn', 'Gita', 'Hugo', 'Iris', 'Jon', 'Kai', 'Lena')
+LAST_NAMES = ('Patel', 'Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Kim', 'Moreau', 'Larsen')
+STREETS = ('High Street', 'Station Road', 'Park Lane', 'Church Road', 'Mill Lane', 'Victoria Road')
+
+def generate_items(count, rng):
+    """Create a fleet of cars and bikes, about half of each"""
+    items = {}
+    for i in range(count):
+        item_id = f'V{i:06d}'
+        if rng.random() < 0.5:
+            brand = rng.choice(BRANDS)
+            item = Car(item_id, f'{brand} {rng.choice(CAR_MODELS)} {i}', round(rng.uniform(15, 120), 2), brand)
+        else:
+            item = Bike(item_id, f'{rng.choice(BIKE_MODELS)} {i}', round(rng.uniform(3, 25), 2),
+                        rng.choice(BIKE_TYPES))
+        items[item_id] = item
+    return items
+
+def generate_customers(count, rng):
+    """Create customers with varied names, addresses, and phone numbers"""
+    customers = {}
+    for i in range(count):
+        customer_id = f'C{i:06d}'
+        customers[customer_id] = Customer(customer_id, rng.choice(FIRST_NAMES), f'{rng.choice(LAST_NAMES)}{i}',
+                                          f'{rng.randint(1, 300)} {rng.choice(STREETS)}',
+                                          f'07{rng.randint(0, 999999999):09d}')
+    return customers
+
+def generate_history(items, customers, months, rentals_per_month, rng, now):
+    """Create returned rentals spread over the past months, oldest first"""
+    items = list(items.values())
+    customers = list(customers.values())
+    span = timedelta(days=30 * months)
+    entries = []
+    for _ in range(months * rentals_per_month):
+        item = rng.choice(items)
+        customer = rng.choice(customers)
+        hours = rng.uniform(1, 72)
+        end_time = now - rng.uniform(0, 1) * span
+        start_time = end_time - timedelta(hours=hours)
+        entries.append({
+            'customer_id': customer.id,
+            'customer_name': customer.get_full_name(),
+            'item_id': item.id,
+            'item_name': item.name,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'cost': hours * item.rental_price
+        })
+    entries.sort(key=lambda entry: entry['end_time'])  # Entries are appended as rentals are returned
+    return entries
+
+def generate_rentals(items, customers, share, rng, now):
+    """Pick a share of the items to be out now, as (customer_id, item_id, start_time)"""
+    customer_ids = list(customers)
+    rented = rng.sample(list(items), int(len(items) * share))
+    return [(rng.choice(customer_ids), item_id, now - timedelta(hours=rng.uniform(0, 48))) for item_id in rented]
+
+def build_dataset(storage, items=1000, customers=1000, months=12, rentals_per_month=5000,
+                  rented_share=0.1, seed=0):
+    """Fill a storage backend with a synthetic dataset and write it out in full"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    fleet = generate_items(items, rng)
+    people = generate_customers(customers, rng)
+    history = generate_history(fleet, people, months, rentals_per_month, rng, now)
+    rentals = generate_rentals(fleet, people, rented_share, rng, now)
+
+    # Past rentals can't be made through the public API, so the data is
+    # handed over the way a storage backend would after reading it
+    manager = RentalManager(storage=storage)
+    manager._restore(fleet, people, HistoryStore(history, archive=getattr(storage, 'archive', None)), rentals)
+    manager.compact()
+    return manager
@@ -0,0 +1,213 @@
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from application import create_app
+from rental_manager import RentalManager
+from storage import open_storage
+from benchmarks.generate import build_dataset
+
+def measure(func, repeat):
+    """Call func repeat times and summarize the wall-clock times in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': min(times),
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.fmean(times),
+        'max_ms': max(times)
+    }
+
+@contextmanager
+def working_directory(path):
+    """Run a block with path as the current directory, where the storage files live"""
+    previous = os.getcwd()
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def cycle(values):
+    """Get a function returning the values in turn, forever"""
+    values = list(values)
+    state = {'i': -1}
+    def next_value():
+        state['i'] = (state['i'] + 1) % len(values)
+        return values[state['i']]
+    return next_value
+
+def load(open_backend):
+    """Load a RentalManager from a newly opened storage backend, then close the backend"""
+    storage = open_backend()
+    try:
+        RentalManager(storage=storage).load_data()
+    finally:
+        storage.close()
+
+def manager_benchmarks(config, repeat):
+    """Time loading, saving, searches, and history lookups on RentalManager"""
+    results = {}
+    open_backend = lambda: open_storage(config['storage'], history_months=config['history_months'])
+    results['load_data'] = measure(lambda: load(open_backend), repeat)
+    if config['storage'].partition(':')[0] == 'json':
+        open_warm = lambda: open_storage(config['storage'], history_months=config['history_months'], warm_start=True)
+        load(open_warm)  # Writes the warm-start file
+        results['load_data_warm_start'] = measure(lambda: load(open_warm), repeat)
+
+    manager = RentalManager(storage=open_backend())
+    try:
+        manager.load_data()
+        results.update(loaded_manager_benchmarks(manager, config, repeat))
+        manager.flush()
+    finally:
+        manager.storage.close()
+    return results
+
+def loaded_manager_benchmarks(manager, config, repeat):
+    """Time changes, saving, searches, and history lookups on a loaded RentalManager"""
+    results = {}
+    rng = random.Random(config['seed'])
+    item_ids = list(manager.items)
+    customer_ids = list(manager.customers)
+    available = [item.id for item in manager.get_available_items()]
+    pairs = cycle((rng.choice(customer_ids), item_id) for item_id in rng.sample(available, min(len(available), 50)))
+
+    def rent_and_return():
+        customer_id, item_id = pairs()
+        manager.rent_item(customer_id, item_id)
+        manager.return_item(customer_id, item_id)
+
+    # Each change is journaled as it is made, so saving it costs nothing more;
+    # the save worth timing is the full snapshot, which compact() forces
+    results['rent_and_return'] = measure(rent_and_return, repeat * 10)
+    results['compact'] = measure(manager.compact, repeat)
+
+    item_names = cycle(manager.get_item(item_id).name.split()[0] for item_id in rng.sample(item_ids, 20))
+    results['search_items_name'] = measure(lambda: manager.search_items(item_names()), repeat * 10)
+    results['search_items_price'] = measure(lambda: manager.search_items('car under 40'), repeat * 10)
+    customer_names = cycle(manager.get_customer(customer_id).last_name for customer_id in rng.sample(customer_ids, 20))
+    results['search_customers'] = measure(lambda: manager.search_customers(customer_names()), repeat * 10)
+    results['find_items'] = measure(lambda: manager.find_items(min_price=10, max_price=30, available=True), repeat * 10)
+
+    items = cycle(rng.sample(item_ids, 20))
+    customers = cycle(rng.sample(customer_ids, 20))
+    results['item_history'] = measure(lambda: list(manager.get_item_rental_history(items())), repeat * 10)
+    results['customer_history'] = measure(lambda: list(manager.get_customer_rental_history(customers())), repeat * 10)
+    results['recent_history'] = measure(lambda: manager.recent_history(20), repeat * 10)
+    results['iter_history'] = measure(lambda: sum(1 for _ in manager.iter_history()), repeat)
+    results['analytics_utilization'] = measure(manager.utilization, repeat)
+    return results
+
+def route_benchmarks(config, repeat):
+    """Time requests to the web routes through the Flask test client"""
+    open_backend = lambda: open_storage(config['storage'], history_months=config['history_months'])
+    start_app = lambda: create_app(storage=open_backend(), flush_interval=config['flush_interval'], load='lazy')
+    apps = []
+
+    def first_page():
+        apps.append(start_app())
+        apps[-1].test_client().get('/')
+
+    results = {}
+    try:
+        results['startup_first_page'] = measure(first_page, repeat)
+        apps.append(start_app())
+        results.update(loaded_route_benchmarks(apps[-1], config, repeat))
+    finally:
+        for app in apps:
+            rental_manager = app.extensions['rental_manager']
+            if rental_manager.load_state == 'ready':
+                rental_manager.flush()
+            rental_manager.storage.close()
+    return results
+
+def loaded_route_benchmarks(app, config, repeat):
+    """Time requests to the web routes of an app, once its data is loaded"""
+    rental_manager = app.extensions['rental_manager']
+    rental_manager.ensure_loaded()
+    client = app.test_client()
+    rng = random.Random(config['seed'])
+    available = [item.id for item in rental_manager.get_available_items()]
+    customer_ids = list(rental_manager.customers)
+    pairs = cycle((rng.choice(customer_ids), item_id) for item_id in rng.sample(available, min(len(available), 50)))
+    rented = []
+    results = {}
+
+    def get(url, headers=None):
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304), (url, response.status_code)
+        return response
+
+    def rent():
+        customer_id, item_id = pairs()
+        client.post('/rent_item', data={'customer_id': customer_id, 'item_id': item_id})
+        rented.append((customer_id, item_id))
+
+    def return_item():
+        customer_id, item_id = rented.pop()
+        client.post('/return_item', data={'customer_id': customer_id, 'item_id': item_id})
+
+    results['route_index'] = measure(lambda: get('/'), repeat * 5)
+    etag = get('/').headers.get('ETag')
+    results['route_index_not_modified'] = measure(lambda: get('/', {'If-None-Match': etag}), repeat * 5)
+    results['route_index_search'] = measure(lambda: get('/?item_search=bike+under+10'), repeat * 5)
+    results['route_rent_item'] = measure(rent, repeat * 5)
+    results['route_return_item'] = measure(return_item, repeat * 5)
+    return results
+
+def run(config, repeat=5, routes=True):
+    """Build the dataset described by config and run every benchmark on it"""
+    with working_directory(config['workdir']):
+        start = time.perf_counter()
+        with working_directory('data'):
+            build_dataset(open_storage(config['storage'], history_months=config['history_months']),
+                          items=config['items'], customers=config['customers'], months=config['months'],
+                          rentals_per_month=config['rentals_per_month'], seed=config['seed'])
+            generated = time.perf_counter() - start
+            results = manager_benchmarks(config, repeat)
+            if routes:
+                results.update(route_benchmarks(config, repeat))
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': config,
+        'generate_seconds': generated,
+        'results': results
+    }
+
+def save_results(report, directory):
+    """Write a report to a timestamped JSON file and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{report['created'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def format_report(report, baseline=None):
+    """Format median times as a table, with the change from a baseline report if given"""
+    lines = [f"{'benchmark':<28}{'median ms':>12}{'min ms':>12}" + (f"{'baseline':>12}{'change':>9}" if baseline else '')]
+    previous = baseline['results'] if baseline else {}
+    for name, stats in report['results'].items():
+        line = f"{name:<28}{stats['median_ms']:>12.3f}{stats['min_ms']:>12.3f}"
+        if baseline:
+            before = previous.get(name)
+            if before:
+                line += f"{before['median_ms']:>12.3f}{stats['median_ms'] / before['median_ms'] - 1:>+9.0%}"
+            else:
+                line += f"{'-':>12}{'':>9}"
+        lines.append(line)
+    return '\n'.join(lines)
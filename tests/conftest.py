@@ -0,0 +1,35 @@
+import os
+import sys
+import pytest
+
+# The application modules import each other by plain name, as they do when the
+# app is run from its directory, so that directory goes first on the import path
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from application import create_app
+from rental_manager import RentalManager
+from storage import open_storage
+
+@pytest.fixture
+def open_manager(tmp_path):
+    """Get a function opening a loaded RentalManager on storage files in a temporary directory"""
+    managers = []
+
+    def open_manager(spec='json', **options):
+        manager = RentalManager(storage=open_storage(spec, directory=str(tmp_path), **options), flush_interval=0)
+        manager.load_data()
+        managers.append(manager)
+        return manager
+
+    yield open_manager
+    for manager in managers:
+        manager.storage.close()
+
+@pytest.fixture
+def client(tmp_path):
+    """Get a test client of an app whose data is in a temporary directory"""
+    app = create_app(storage=open_storage('json', directory=str(tmp_path)), flush_interval=0, load='eager')
+    yield app.test_client()
+    app.extensions['rental_manager'].storage.close()
@@ -0,0 +1,13 @@
+from customer import Customer
+from models import Bike, Car
+
+def add_fleet(manager, items=4, customers=2):
+    """Add bikes, cars, and customers with predictable IDs and prices"""
+    with manager.batch():
+        for i in range(items):
+            if i % 2:
+                manager.add_item(Car(f'car{i}', f'Car {i}', 10.0 + i, 'Volvo'))
+            else:
+                manager.add_item(Bike(f'bike{i}', f'Bike {i}', 5.0 + i, 'Road'))
+        for i in range(customers):
+            manager.add_customer(Customer(f'c{i}', 'Ann', f'Lee{i}', f'{i} High St', f'555-000{i}'))
@@ -0,0 +1,23 @@
+import pytest
+from helpers import add_fleet
+
+
+@pytest.mark.parametrize('options', [{}, {'warm_start': True}])
+def test_type_and_brand_totals_survive_edits_and_a_restart(open_manager, options):
+    manager = open_manager(**options)
+    add_fleet(manager, items=4)
+    for item_id in ('car1', 'car3', 'bike2'):
+        manager.rent_item('c1', item_id)
+        manager.return_item('c1', item_id)
+    manager.edit_item('car1', brand='Saab')
+    manager.remove_item('car3')
+    by_type = manager.analytics.revenue_by_type()
+    by_brand = manager.analytics.revenue_by_brand()
+    assert set(by_type) == {'car', 'bike', 'unknown'}
+    assert set(by_brand) == {'Saab'}
+
+    manager.flush()
+    for _ in range(2):  # The second load may restore from the warm-start file
+        reloaded = open_manager(**options)
+        assert reloaded.analytics.revenue_by_type() == by_type
+        assert reloaded.analytics.revenue_by_brand() == by_brand
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from application import create_app
+from helpers import add_fleet
+from models import Car
+
+
+def test_bulk_add_item_goes_to_its_depot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Depot files go under depots/ in the working directory
+    app = create_app(flush_interval=0, load='eager', depots=['north', 'south'])
+    client = app.test_client()
+    operations = [
+        {'op': 'add_item', 'item': {'type': 'car', 'id': 'car1', 'name': 'Car 1', 'rental_price': 20,
+                                    'brand': 'Volvo', 'depot': 'south'}},
+        {'op': 'add_item', 'item': {'type': 'bike', 'id': 'bike1', 'name': 'Bike 1', 'rental_price': 5,
+                                    'bike_type': 'Road'}},
+    ]
+    response = client.post('/api/bulk', json={'operations': operations})
+
+    results = response.get_json()['results']
+    assert results[0] == {'ok': True}
+    assert results[1]['ok'] is False and results[1]['error'].startswith('A depot is required')
+    assert app.extensions['rental_manager'].get_item_depot('car1') == 'south'
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-inf'])
+def test_prices_must_be_finite(client, price):
+    item = {'type': 'car', 'id': 'car1', 'name': 'Car 1', 'rental_price': price, 'brand': 'Volvo'}
+    assert client.post('/api/items', json=item).status_code == 400
+    item['rental_price'] = 20
+    assert client.post('/api/items', json=item).status_code == 201
+
+    assert client.put('/api/items/car1', json={'rental_price': price}).status_code == 400
+    assert client.get('/api/items/car1').get_json()['rental_price'] == 20
+
+
+def test_missing_fields_are_reported(client):
+    response = client.post('/api/items', json={'type': 'car', 'id': 'car1', 'name': 'Car 1', 'brand': 'Volvo'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Missing field: rental_price'}
+
+    response = client.post('/api/rentals', json={'customer_id': 'c1'})
+    assert response.get_json() == {'error': 'Missing field: item_id'}
+
+
+def test_reservation_times_with_an_offset_are_read_as_local_time(client):
+    client.post('/api/items', json={'type': 'car', 'id': 'car1', 'name': 'Car 1', 'rental_price': 20,
+                                    'brand': 'Volvo'})
+    client.post('/api/customers', json={'id': 'c1', 'first_name': 'Ann', 'last_name': 'Lee',
+                                        'address': '1 High St', 'contact_number': '555-0001'})
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+    end = start + timedelta(hours=2)
+    response = client.post('/api/reservations', json={'customer_id': 'c1', 'item_id': 'car1',
+                                                      'start_time': start.isoformat().replace('+00:00', 'Z'),
+                                                      'end_time': end.isoformat()})
+    assert response.status_code == 201
+    assert response.get_json()['start_time'] == start.astimezone().replace(tzinfo=None).isoformat()
+
+    window = {'start_time': (start + timedelta(hours=1)).astimezone(timezone(timedelta(hours=2))).isoformat(),
+              'end_time': (end + timedelta(hours=1)).isoformat()}
+    response = client.get('/api/availability', query_string=window)
+    assert response.status_code == 200
+    assert response.get_json()['results'] == []
+
+
+def test_ids_and_names_must_be_strings(client):
+    item = {'type': 'car', 'id': 123, 'name': 'Car 1', 'rental_price': 20, 'brand': 'Volvo'}
+    response = client.post('/api/items', json=item)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Field id must be a string'}
+    assert client.post('/api/items', json=dict(item, id='car1')).status_code == 201
+    assert client.post('/api/items', json=dict(item, id='car2', brand=7)).status_code == 400
+    customer = {'id': 'c1', 'first_name': 'Ann', 'last_name': 'Lee', 'address': '1 High St', 'contact_number': 5550001}
+    assert client.post('/api/customers', json=customer).status_code == 400
+
+
+def test_an_item_that_cannot_be_indexed_is_not_added(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    with pytest.raises(TypeError):
+        manager.add_item(Car(123, 'Odd car', 11.0, 'Volvo'))  # Its ID can't be ordered with the others
+    assert manager.get_item(123) is None
+    manager.add_item(Car('car9', 'Car 9', 11.0, 'Volvo'))
+    assert [item.id for item in manager.find_items(11, 11)] == ['car1', 'car9']
+
+
+@pytest.mark.parametrize('value', ['oops', ['x'], 7])
+def test_bulk_operations_need_objects(client, value):
+    operations = [{'op': 'add_customer', 'customer': {'id': 'c1', 'first_name': 'Ann', 'last_name': 'Lee',
+                                                      'address': '1 High St', 'contact_number': '555-0001'}},
+                  {'op': 'add_item', 'item': value},
+                  {'op': 'add_customer', 'customer': value}]
+    response = client.post('/api/bulk', json={'operations': operations})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [{'ok': True}] + [{'ok': False,
+                                                                'error': 'Each record must be a JSON object'}] * 2
+    assert client.post('/api/items', json=['x']).status_code == 400
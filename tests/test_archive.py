@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timedelta
+from archive import HistoryArchive
+from history import HistoryStore
+from models import Car
+from customer import Customer
+
+
+def history(months=3, per_day=2):
+    store = HistoryStore()
+    start = datetime(2024, 1, 1, 9)
+    for day in range(months * 30):
+        for i in range(per_day):
+            begin = start + timedelta(days=day, hours=i * 4)
+            store.append({'customer_id': f'c{i}', 'customer_name': f'Ann Lee{i}', 'item_id': f'car{day % 3}',
+                          'item_name': 'Car', 'start_time': begin.isoformat(),
+                          'end_time': (begin + timedelta(hours=2)).isoformat(), 'cost': 10.0})
+    return store
+
+
+def test_segments_are_read_once_for_repeated_lookups(tmp_path, monkeypatch):
+    store = history()
+    archive = HistoryArchive(str(tmp_path))
+    archive.add(store, len(store))
+    archive.load()  # Drop what was cached while writing
+    reads = []
+    read = HistoryArchive._read
+    monkeypatch.setattr(HistoryArchive, '_read', lambda self, segment: reads.append(segment['file']) or read(self, segment))
+
+    for _ in range(3):
+        positions = archive.positions(item_id='car1')
+        assert list(positions) == [position for position in range(len(store)) if store.item_ids[position] == 'car1']
+        assert sum(len(segment) for segment in archive.stores()) == len(store)
+        assert archive.positions(customer_id='c1')[0] == 1
+    assert sorted(reads) == sorted(segment['file'] for segment in archive.segments)
+
+
+def test_item_history_keeps_memory_months_and_the_manager_adds_archived_ones(open_manager, tmp_path):
+    old = [{'customer_id': 'c1', 'customer_name': 'Ann Lee', 'item_id': 'car1', 'item_name': 'Car 1',
+            'start_time': f'2024-0{month}-01T09:00:00', 'end_time': f'2024-0{month}-01T11:00:00', 'cost': 22.0}
+           for month in (1, 2)]
+    car = Car('car1', 'Car 1', 11.0, 'Volvo', rental_history=[
+        {key: entry[key] for key in ('customer_id', 'start_time', 'end_time', 'cost')} for entry in old])
+    with open(tmp_path / 'data.json', 'w') as f:
+        json.dump({'items': {'car1': car.to_dict()}, 'rental_history': old,
+                   'customers': {'c1': Customer('c1', 'Ann', 'Lee', '1 Main St', '555-0101').to_dict()}}, f)
+    manager = open_manager(history_months=1)
+    manager.rent_item('c1', 'car1')
+    manager.return_item('c1', 'car1')
+    manager.compact()  # Archives the 2024 rentals
+
+    history = manager.get_item_rental_history('car1')
+    assert len(history) == 3
+    assert [entry['start_time'] for entry in history[:2]] == [entry['start_time'] for entry in old]
+    assert len(manager.get_item('car1').rental_history) == 1
+    reloaded = open_manager(history_months=1)
+    assert len(reloaded.get_item('car1').rental_history) == 1
+    assert list(reloaded.get_item_rental_history('car1')) == list(history)
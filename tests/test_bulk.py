@@ -0,0 +1,50 @@
+from bulk import import_records, read_records
+
+RECORDS = 5000
+
+
+def item_lines(count):
+    lines = ['type,id,name,rental_price,brand,bike_type']
+    for i in range(count):
+        if i % 2:
+            lines.append(f'car,car{i},Car {i},{10 + i % 90},Volvo,')
+        else:
+            lines.append(f'bike,bike{i},Bike {i},{5 + i % 40},,Road')
+    return lines
+
+
+def test_import_thousands_of_items(open_manager):
+    manager = open_manager()
+    lines = item_lines(RECORDS)
+    lines.append('car,car1,Duplicate,10,Volvo,')
+    lines.append('boat,boat1,Boat,10,,')
+    result = import_records(manager, 'items', read_records(lines, 'csv'))
+
+    assert result['added'] == RECORDS
+    assert result['failed'] == 2
+    assert [error['line'] for error in result['errors']] == [RECORDS + 2, RECORDS + 3]
+    assert len(manager.items) == RECORDS
+    assert len(manager.search_items('volvo')) == RECORDS // 2
+    cheapest = manager.find_items(item_type='bike', max_price=5)
+    assert {item.id for item in cheapest} == {f'bike{i}' for i in range(0, RECORDS, 40)}
+
+    manager.flush()
+    reloaded = open_manager()
+    assert len(reloaded.items) == RECORDS
+
+
+def test_import_thousands_of_customers(open_manager):
+    manager = open_manager()
+    lines = [f'{{"id": "c{i}", "first_name": "Ann", "last_name": "Lee{i}", '
+             f'"address": "{i} High St", "contact_number": "555-{i:04d}"}}' for i in range(RECORDS)]
+    lines.append('{"id": "c0", "first_name": "Bo", "last_name": "Lee", "address": "1 Low St", '
+                 '"contact_number": "555-9999"}')
+    lines.append('{"id": "c-missing"}')
+    result = import_records(manager, 'customers', read_records(lines, 'jsonl'))
+
+    assert result['added'] == RECORDS
+    assert result['failed'] == 2
+    assert result['errors'][0] == {'line': RECORDS + 1, 'error': 'Customer with ID c0 already exists'}
+    assert result['errors'][1]['error'].startswith('Missing field')
+    assert len(manager.customers) == RECORDS
+    assert [customer.id for customer in manager.search_customers('lee4999')] == ['c4999']
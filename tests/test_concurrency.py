@@ -0,0 +1,65 @@
+import random
+import threading
+import pytest
+from helpers import add_fleet
+
+
+def test_item_locks_are_kept_only_for_existing_items(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+
+    for item_id in ('missing1', 'missing2'):
+        with pytest.raises(ValueError):
+            manager.rent_item('c1', item_id)
+    manager.rent_item('c1', 'car1')
+    manager.return_item('c1', 'car1')
+    manager.edit_item('bike2', name='Bike two')
+    manager.remove_item('bike2')
+    assert set(manager._item_locks) == {'car1'}
+
+
+@pytest.mark.parametrize('spec', ['json', 'sqlite:data.db'])
+def test_concurrent_rentals_and_returns_keep_the_invariants(open_manager, spec):
+    manager = open_manager(spec)
+    add_fleet(manager, items=8, customers=6)
+    item_ids = list(manager.items)
+    customer_ids = list(manager.customers)
+    returns = []
+    barrier = threading.Barrier(6)
+
+    def work(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(200):
+            customer_id, item_id = rng.choice(customer_ids), rng.choice(item_ids)
+            try:
+                if manager.get_item_renter(item_id) == customer_id:
+                    manager.return_item(customer_id, item_id)
+                    returns.append(item_id)
+                else:
+                    manager.rent_item(customer_id, item_id)
+            except ValueError:
+                pass  # Rented or returned by another thread meanwhile
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def state(manager):
+        renters = {item_id: manager.get_item_renter(item_id) for item_id in item_ids}
+        rentals = {customer_id: sorted(rental['item'].id for rental in manager.get_customer_rentals(customer_id))
+                   for customer_id in customer_ids}
+        return renters, rentals, len(manager.rental_history)
+
+    renters, rentals, history = state(manager)
+    assert returns and history == len(returns)
+    assert manager.analytics.totals()['rentals'] == len(returns)
+    for item_id, customer_id in renters.items():
+        assert manager.get_item(item_id).is_rented == (customer_id is not None)
+        assert (item_id in rentals[customer_id]) if customer_id else all(item_id not in ids for ids in rentals.values())
+    assert sum(map(len, rentals.values())) == sum(customer_id is not None for customer_id in renters.values())
+
+    manager.flush()
+    assert state(open_manager(spec)) == (renters, rentals, history)
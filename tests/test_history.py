@@ -0,0 +1,35 @@
+import random
+import pytest
+from history import MergedHistoryView, from_micros
+
+
+def parts():
+    rng = random.Random(2)
+    return [[{'end_time': from_micros(moment), 'part': part}
+             for moment in sorted(rng.sample(range(10 ** 6, 10 ** 7), rng.randint(0, 20)))]
+            for part in range(3)]
+
+
+@pytest.mark.parametrize('index', [0, 1, -1, -2, slice(None), slice(-5, None), slice(None, None, -1),
+                                   slice(-3, None, -1), slice(2, 9, 3), slice(9, 2, -2), slice(5, 5)])
+def test_merged_history_indexes_like_a_list(index):
+    merged = sorted((entry for part in parts() for entry in part), key=lambda entry: entry['end_time'])
+    assert MergedHistoryView(parts())[index] == merged[index]
+    assert list(reversed(MergedHistoryView(parts()))) == merged[::-1]
+
+
+def test_last_entry_is_merged_from_the_end():
+    history = parts()
+    read = []
+
+    class Part(list):
+        def __reversed__(self):
+            for entry in super().__reversed__():
+                read.append(entry)
+                yield entry
+
+    view = MergedHistoryView(Part(part) for part in history)
+    assert view[-1] == max((entry for part in history for entry in part), key=lambda entry: entry['end_time'])
+    assert len(read) <= len(history) + 1
+    with pytest.raises(IndexError):
+        view[len(view)]
@@ -0,0 +1,111 @@
+import random
+import pytest
+from customer import Customer
+from helpers import add_fleet
+from models import Bike, Car
+from search_index import PriceIndex, SearchIndex, SortedChunks, tokenize
+
+def test_sorted_chunks_match_a_sorted_list(monkeypatch):
+    monkeypatch.setattr(SortedChunks, 'CHUNK_SIZE', 4)  # Small chunks, so splits and empty chunks happen
+    rng = random.Random(1)
+    chunks = SortedChunks(rng.sample(range(1000), 50))
+    expected = sorted(chunks)
+    for _ in range(2000):
+        value = rng.randrange(1000)
+        if value in expected:
+            chunks.remove(value)
+            expected.remove(value)
+        else:
+            chunks.add(value)
+            expected.append(value)
+            expected.sort()
+        assert len(chunks) == len(expected)
+    assert list(chunks) == expected
+    assert list(chunks.irange(500)) == [value for value in expected if value >= 500]
+    with pytest.raises(ValueError):
+        chunks.remove(1000)
+    chunks.update(range(1000, 1010))
+    assert list(chunks) == expected + list(range(1000, 1010))
+
+def test_readers_keep_a_consistent_view_while_the_index_changes():
+    chunks = SortedChunks(range(0, 100, 2))
+    reader = chunks.irange(10)
+    assert next(reader) == 10
+    chunks.add(11)
+    chunks.remove(12)
+    assert list(reader) == list(range(12, 100, 2))  # The state the reader started from
+
+def test_search_index_after_add_edit_and_remove():
+    index = SearchIndex()
+    index.add('a', 'Red Road Bike')
+    index.add_many([('b', ('Blue Road Bike',)), ('c', ('Red Car',))])
+    assert index.search('road') == ['a', 'b']
+    index.update('a', 'Green Mountain Bike')
+    assert index.search('red') == ['c']
+    assert index.search('bike') == ['a', 'b']  # Edits keep their place
+    index.remove('b')
+    assert index.search('blue') == []
+    assert index.search('ro') == []
+    assert len(index) == 2
+
+def test_price_index_after_add_and_remove():
+    index = PriceIndex([('a', 10.0), ('b', 5.0)])
+    index.add('c', 10.0)
+    index.add_many([('d', 7.5), ('e', 20.0)])
+    assert list(index.range(7, 10)) == [(7.5, 'd'), (10.0, 'a'), (10.0, 'c')]
+    index.remove('a', 10.0)
+    with pytest.raises(ValueError):
+        index.remove('a', 10.0)
+    assert [item_id for _, item_id in index.range()] == ['b', 'd', 'c', 'e']
+    assert len(index) == 4
+
+def test_manager_indexes_match_the_items_after_changes(open_manager):
+    manager = open_manager()
+    rng = random.Random(7)
+    manager.add_customer(Customer('c0', 'Ann', 'Lee', '1 High St', '555'))
+    for i in range(200):
+        if i % 2:
+            manager.add_item(Car(f'i{i}', f'Car {i}', float(rng.randrange(5, 50)), rng.choice(['Volvo', 'Fiat'])))
+        else:
+            manager.add_item(Bike(f'i{i}', f'Bike {i}', float(rng.randrange(5, 50)), rng.choice(['Road', 'BMX'])))
+    for i in range(0, 200, 3):
+        manager.edit_item(f'i{i}', name=f'Edited {i}', rental_price=float(rng.randrange(5, 50)))
+    for i in range(0, 200, 7):
+        manager.rent_item('c0', f'i{i}')
+    for i in range(1, 200, 5):
+        if not manager.get_item(f'i{i}').is_rented:
+            manager.remove_item(f'i{i}')
+
+    def matches(item, query):
+        type_info = item.get_type_info()
+        tokens = tokenize(f"{item.name} {type_info['type']} {type_info.get('brand') or type_info.get('bike_type')}")
+        return all(any(token.startswith(term) for token in tokens) for term in tokenize(query))
+
+    def check(manager):
+        items = list(manager.items.values())
+        cheapest = sorted(items, key=lambda item: (item.rental_price, item.id))
+        assert manager.find_items() == cheapest
+        assert manager.find_items(min_price=20, max_price=30, available=True) == [
+            item for item in cheapest if 20 <= item.rental_price <= 30 and not item.is_rented]
+        assert manager.search_items('edited') == [item for item in items if item.name.startswith('Edited')]
+        assert manager.search_items('volvo') == [item for item in items
+                                                 if item.get_type_info().get('brand') == 'Volvo']
+        assert set(manager.search_items('car')) == {item for item in items if isinstance(item, Car)}
+        for query in ('bike 3', 'edited 1', 'car 4', 'road'):
+            assert manager.search_items(query) == [item for item in items if matches(item, query)]
+        counts = manager.item_counts()
+        assert sum(sum(type_counts.values()) for type_counts in counts.values()) == len(items)
+
+    check(manager)
+    check(open_manager())  # Indexes built on load agree with the ones kept up to date
+
+
+def test_search_with_plural_type_words(open_manager):
+    manager = open_manager()
+    add_fleet(manager, items=6)  # Bikes cost 5, 7, 9 and cars 11, 13, 15
+
+    assert [item.id for item in manager.search_items('cars under 14')] == ['car1', 'car3']
+    assert [item.id for item in manager.search_items('bikes over 6')] == ['bike2', 'bike4']
+    assert [item.id for item in manager.search_items('cars and bikes under 12')] == ['bike0', 'bike2', 'bike4', 'car1']
+    assert [item.id for item in manager.search_items('volvo cars below 12')] == ['car1']
+    assert {item.id for item in manager.search_items('cars')} == {'car1', 'car3', 'car5'}
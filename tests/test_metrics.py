@@ -0,0 +1,85 @@
+import re
+import pytest
+from metrics import REQUEST_SECONDS, Counter, Histogram, Metric, Registry
+
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? (-?[0-9.]+(e-?[0-9]+)?|\+Inf)$')
+
+def parse(text):
+    """Get the HELP/TYPE lines by metric name and every sample line, checking the format as it goes"""
+    described, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# '):
+            kind, name, rest = line[2:].split(' ', 2)
+            described.setdefault(name, {})[kind] = rest
+        else:
+            assert SAMPLE.match(line), line
+            series, value = line.rsplit(' ', 1)
+            samples[series] = value
+    return described, samples
+
+class Constant(Metric):
+    kind = 'gauge'
+
+    def samples(self):
+        yield '', ('north',), (), 2.5
+        yield '', ('say "hi"\n',), (), 3
+
+def test_metric_subclasses_must_provide_samples():
+    with pytest.raises(TypeError):
+        Metric('rental_things', 'Things')
+    assert Constant('rental_things', 'Things', ('depot',)).render() == [
+        '# HELP rental_things Things',
+        '# TYPE rental_things gauge',
+        'rental_things{depot="north"} 2.5',
+        'rental_things{depot="say \\"hi\\"\\n"} 3',
+    ]
+
+def test_label_sets_must_match_the_label_names():
+    counter = Counter('rental_writes_total', 'Writes', ('operation',))
+    counter.inc(operation='save')
+    counter.inc(2, operation='save')
+    assert counter.value(operation='save') == 3
+    with pytest.raises(ValueError):
+        counter.inc(depot='north')
+    with pytest.raises(ValueError):
+        counter.inc()
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('rental_wait_seconds', 'Waits', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'rental_wait_seconds_bucket{le="0.1"} 2',
+        'rental_wait_seconds_bucket{le="1"} 3',
+        'rental_wait_seconds_bucket{le="+Inf"} 4',
+        'rental_wait_seconds_sum 3.65',
+        'rental_wait_seconds_count 4',
+    ]
+
+def test_registry_keeps_one_metric_per_name_and_skips_failing_ones():
+    registry = Registry()
+    assert registry.counter('rental_a_total', 'A') is registry.counter('rental_a_total', 'A')
+    with pytest.raises(ValueError):
+        registry.histogram('rental_a_total', 'A')
+    registry.gauge('rental_broken', 'Broken', lambda: 1 / 0)
+    registry.gauge('rental_b', 'B', lambda: 7)
+    assert registry.render().endswith('# TYPE rental_b gauge\nrental_b 7\n')
+
+def test_metrics_endpoint(client):
+    client.post('/api/items', json={'type': 'car', 'id': 'car1', 'name': 'Car 1', 'rental_price': 11, 'brand': 'Volvo'})
+    before = REQUEST_SECONDS.count(endpoint='api.get_item', method='GET', status=404)
+    client.get('/api/items/nope')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    assert response.cache_control.no_store
+    described, samples = parse(response.get_data(as_text=True))
+    for name, kind in [('rental_request_duration_seconds', 'histogram'), ('rental_data_loaded', 'gauge'),
+                       ('rental_persistence_bytes_total', 'counter'), ('rental_dataset_size', 'gauge')]:
+        assert described[name]['TYPE'] == kind and described[name]['HELP']
+    assert samples['rental_data_loaded'] == '1'
+    assert samples['rental_dataset_size{kind="items"}'] == '1'
+    assert samples['rental_items_by_state{type="car",state="available"}'] == '1'
+    series = 'rental_request_duration_seconds_count{endpoint="api.get_item",method="GET",status="404"}'
+    assert int(samples[series]) == before + 1
@@ -0,0 +1,56 @@
+import pytest
+from helpers import add_fleet
+from pagination import DEFAULT_PER_PAGE, MAX_PER_PAGE, clamp, paginate
+
+@pytest.mark.parametrize('page, per_page, expected', [
+    (None, None, (1, DEFAULT_PER_PAGE)),
+    (0, 0, (1, DEFAULT_PER_PAGE)),
+    (-3, -5, (1, 1)),
+    ('2', '10', (2, 10)),
+    (4, MAX_PER_PAGE + 1, (4, MAX_PER_PAGE)),
+])
+def test_page_numbers_and_sizes_are_clamped(page, per_page, expected):
+    assert clamp(page, per_page) == expected
+
+@pytest.mark.parametrize('total, pages', [(0, 1), (1, 1), (10, 1), (11, 2), (30, 3)])
+def test_page_count_rounds_up_and_is_never_zero(total, pages):
+    assert paginate(range(total), total, per_page=10).pages == pages
+
+@pytest.mark.parametrize('entries', [list(range(23)), tuple(range(23)), iter(range(23))])
+def test_sequences_and_iterators_give_the_same_pages(entries):
+    page = paginate(entries, 23, page=3, per_page=10)
+    assert list(page) == [20, 21, 22]
+    assert (page.page, page.pages, page.has_prev, page.has_next) == (3, 3, True, False)
+    assert (page.prev_num, page.next_num) == (2, None)
+
+def test_a_page_past_the_end_is_empty_but_keeps_its_number():
+    page = paginate(list(range(5)), 5, page=4, per_page=2)
+    assert len(page) == 0
+    assert (page.page, page.pages, page.has_next) == (4, 3, False)
+
+def test_map_keeps_the_page_position():
+    page = paginate(list(range(5)), 5, page=2, per_page=2).map(str)
+    assert list(page) == ['2', '3']
+    assert (page.page, page.pages, page.total, page.per_page) == (2, 3, 5, 2)
+
+def test_manager_listings_are_paged(open_manager):
+    manager = open_manager()
+    add_fleet(manager, items=5, customers=3)
+    manager.rent_item('c0', 'bike0')
+
+    assert [item.id for item in manager.list_items(2, 2)] == ['bike2', 'car3']
+    available = manager.list_available_items(1, 3)
+    assert [item.rental_price for item in available] == [7.0, 9.0, 11.0]
+    assert (available.total, available.pages) == (4, 2)
+    customers = manager.list_customers(per_page=MAX_PER_PAGE * 2)
+    assert (len(customers), customers.per_page) == (3, MAX_PER_PAGE)
+
+def test_api_reports_the_clamped_page(client):
+    for i in range(3):
+        client.post('/api/customers', json={'id': f'c{i}', 'first_name': 'Ann', 'last_name': f'Lee{i}',
+                                            'address': f'{i} High St', 'contact_number': f'555-000{i}'})
+    body = client.get('/api/customers?page=0&per_page=1000').get_json()
+    assert (body['page'], body['per_page'], body['pages'], body['total']) == (1, MAX_PER_PAGE, 1, 3)
+    body = client.get('/api/customers?page=2&per_page=2').get_json()
+    assert [customer['id'] for customer in body['results']] == ['c2']
+    assert client.get('/api/customers?page=9&per_page=2').get_json()['results'] == []
@@ -0,0 +1,118 @@
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+from helpers import add_fleet
+
+
+def test_ended_reservation_cannot_be_cancelled_and_reload_still_works(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    reservation = manager.reserve_item('c0', 'car1', datetime.now(), datetime.now() + timedelta(milliseconds=200))
+    time.sleep(0.3)
+    manager.compact()  # Leaves the ended reservation out of the snapshot
+
+    with pytest.raises(ValueError, match='already ended'):
+        manager.cancel_reservation(reservation.id)
+    assert open_manager().get_reservation(reservation.id) is None
+
+
+def test_replay_skips_changes_to_records_that_are_not_loaded(open_manager, tmp_path):
+    manager = open_manager()
+    add_fleet(manager)
+    manager.compact()
+    manager.edit_item('car1', name='Renamed')
+    with open(tmp_path / 'data.journal') as f:
+        seq = [json.loads(line) for line in f][-1]['seq']
+    # e.g. journals written before cancelling an ended reservation was refused
+    with open(tmp_path / 'data.journal', 'a') as f:
+        for op, data in (('cancel_reservation', {'reservation_id': 'gone'}),
+                         ('edit_item', {'item_id': 'gone', 'name': 'X'}),
+                         ('edit_customer', {'customer_id': 'gone', 'first_name': 'X'})):
+            seq += 1
+            f.write(json.dumps(dict(data, seq=seq, op=op)) + '\n')
+
+    reloaded = open_manager()
+    assert reloaded.get_item('car1').name == 'Renamed'
+    assert sorted(reloaded.customers) == sorted(manager.customers)
+
+
+def window(hours_from_now, hours):
+    """Get a start and end time some whole hours from now"""
+    start = datetime.now() + timedelta(hours=hours_from_now)
+    return start, start + timedelta(hours=hours)
+
+
+@pytest.mark.parametrize('start, hours', [(1, 2), (2, 2), (0.5, 5), (1.5, 0.5)])
+def test_overlapping_reservations_conflict(open_manager, start, hours):
+    manager = open_manager()
+    add_fleet(manager)
+    manager.reserve_item('c0', 'car1', *window(1, 2))
+
+    with pytest.raises(ValueError):
+        manager.reserve_item('c1', 'car1', *window(start, hours))
+    assert len(manager.get_item_reservations('car1')) == 1
+
+
+def test_back_to_back_reservations_do_not_conflict(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    start, middle = window(1, 2)
+    end = middle + timedelta(hours=2)
+    first = manager.reserve_item('c0', 'car1', start, middle)
+    second = manager.reserve_item('c1', 'car1', middle, end)
+    before = manager.reserve_item('c1', 'car1', start - timedelta(hours=1), start)
+
+    assert manager.get_item_reservations('car1') == [before, first, second]
+    assert manager.get_customer_reservations('c1') == [before, second]
+
+
+def test_reserving_needs_a_window_that_has_not_ended(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    with pytest.raises(ValueError, match='end in the future'):
+        manager.reserve_item('c0', 'car1', *window(-3, 2))
+    with pytest.raises(ValueError, match='Invalid item ID'):
+        manager.reserve_item('c0', 'nope', *window(1, 2))
+
+
+def test_only_the_reserving_customer_can_rent_during_a_reservation(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    reservation = manager.reserve_item('c0', 'car1', *window(-1, 2))
+
+    with pytest.raises(ValueError, match='reserved by another customer'):
+        manager.rent_item('c1', 'car1')
+    manager.rent_item('c0', 'car1')  # Picking it up fulfils the reservation
+    assert manager.get_reservation(reservation.id) is None
+    assert manager.item_renters['car1'] == 'c0'
+    assert open_manager().get_reservation(reservation.id) is None
+
+
+def test_cancelling_frees_the_window(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    reservation = manager.reserve_item('c0', 'car1', *window(1, 2))
+    assert manager.cancel_reservation(reservation.id)
+
+    with pytest.raises(ValueError, match='does not exist'):
+        manager.cancel_reservation(reservation.id)
+    other = manager.reserve_item('c1', 'car1', *window(1, 2))
+    reloaded = open_manager()
+    assert reloaded.get_reservation(reservation.id) is None
+    assert [reservation.id for reservation in reloaded.get_item_reservations('car1')] == [other.id]
+
+
+def test_available_items_leave_out_reserved_and_rented_ones(open_manager):
+    manager = open_manager()
+    add_fleet(manager)
+    manager.reserve_item('c0', 'car1', *window(1, 2))
+    manager.rent_item('c1', 'bike0')
+    available = lambda *times: [item.id for item in manager.find_available_items(*times)]
+
+    assert available(*window(0, 0.5)) == ['bike2', 'car1', 'car3']  # bike0 is out now
+    assert available(*window(2, 2)) == ['bike0', 'bike2', 'car3']  # car1 is reserved, bike0 is back
+    assert available(*window(3, 1)) == ['bike0', 'bike2', 'car1', 'car3']
+    assert available(*window(2, 2))[:1] == [item.id for item in manager.find_available_items(*window(2, 2), limit=1)]
+    with pytest.raises(ValueError):
+        manager.find_available_items(*window(2, -1))
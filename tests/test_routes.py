@@ -0,0 +1,36 @@
+import time
+from application import create_app
+from customer import Customer
+from models import Car
+
+CUSTOMER = {'id': 'c1', 'first_name': 'Ann', 'last_name': 'Lee', 'address': '1 High St', 'contact_number': '555-0001'}
+
+
+def test_last_modified_is_sent_only_once_its_second_is_over(client):
+    time.sleep(1 - time.time() % 1)  # Start of a second, so the change and the request below share it
+    client.post('/add_customer', data=CUSTOMER)
+    client.get('/')  # Shows the flash message, so isn't cached
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers  # A second change could follow within this second
+
+    time.sleep(1.1)
+    last_modified = client.get('/').headers['Last-Modified']
+    assert client.get('/', headers={'If-Modified-Since': last_modified}).status_code == 304
+    client.post('/add_customer', data=dict(CUSTOMER, id='c2'))
+    client.get('/')
+    assert client.get('/', headers={'If-Modified-Since': last_modified}).status_code == 200
+
+
+def test_customers_page_lists_rentals_at_every_depot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Depot files go under depots/ in the working directory
+    app = create_app(flush_interval=0, load='eager', depots=['north', 'south'])
+    manager = app.extensions['rental_manager']
+    manager.add_item(Car('car1', 'NorthCar', 20.0, 'Volvo'), 'north')
+    manager.add_item(Car('car2', 'SouthCar', 20.0, 'Volvo'), 'south')
+    manager.add_customer(Customer(**CUSTOMER))
+    manager.rent_item('c1', 'car2')
+
+    page = app.test_client().get('/customers').get_data(as_text=True)
+    assert 'SouthCar' in page and 'NorthCar' not in page
+    assert 'remove_customer' not in page
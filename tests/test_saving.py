@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import time
+import pytest
+import application
+from helpers import add_fleet
+from rental_manager import RentalManager
+from storage import JsonStorage, open_storage
+
+def count_saves(manager, monkeypatch):
+    """Record the thread of every save the manager makes"""
+    saves = []
+    prepare_save = manager.storage.prepare_save
+    monkeypatch.setattr(manager.storage, 'prepare_save',
+                        lambda *args: saves.append(threading.current_thread()) or prepare_save(*args))
+    return saves
+
+def test_snapshot_is_renamed_into_place(open_manager, tmp_path, monkeypatch):
+    manager = open_manager()
+    add_fleet(manager)
+    renames = []
+    replace = os.replace
+    monkeypatch.setattr(os, 'replace', lambda src, dst: renames.append((src, dst)) or replace(src, dst))
+    manager.compact()
+
+    assert renames[-1] == (str(tmp_path / 'data.json.tmp'), str(tmp_path / 'data.json'))
+    assert not (tmp_path / 'data.json.tmp').exists()
+    assert sorted(open_manager().items) == sorted(manager.items)
+
+def test_failed_snapshot_leaves_the_old_one_in_place(open_manager, tmp_path, monkeypatch):
+    manager = open_manager()
+    add_fleet(manager)
+    manager.compact()
+    before = (tmp_path / 'data.json').read_text()
+
+    def fail(self, data, f):
+        f.write('{"format": ')  # Part of a snapshot, as a crash mid-write would leave
+        raise OSError("disk full")
+    monkeypatch.setattr(JsonStorage, '_dump_compact', fail)
+    manager.rent_item('c0', 'bike0')
+    with pytest.raises(OSError):
+        manager.compact()
+    assert (tmp_path / 'data.json').read_text() == before
+    json.loads(before.splitlines()[0])  # Still a whole header line
+    monkeypatch.undo()
+    assert open_manager().item_renters == {'bike0': 'c0'}  # Restored from the journal
+
+def test_saves_within_the_interval_share_one_background_write(tmp_path, monkeypatch):
+    manager = RentalManager(storage=open_storage('json', directory=str(tmp_path)), flush_interval=0.2)
+    manager.load_data()
+    add_fleet(manager)
+    saves = count_saves(manager, monkeypatch)
+    for _ in range(3):
+        manager.save_data()
+    timer = manager._flush_timer
+    assert timer is not None and saves == []
+
+    timer.join(2)
+    assert len(saves) == 1 and saves[0] is timer
+    assert manager._flush_timer is None
+    manager.save_data()
+    assert manager._flush_timer is not timer  # A save after the write schedules a new one
+    manager.flush()
+    manager.storage.close()
+
+def test_flush_writes_a_scheduled_save_at_once(tmp_path, monkeypatch):
+    manager = RentalManager(storage=open_storage('json', directory=str(tmp_path)), flush_interval=60)
+    manager.load_data()
+    saves = count_saves(manager, monkeypatch)
+    manager.save_data()
+    timer = manager._flush_timer
+    started = time.monotonic()
+    manager.flush()
+
+    assert time.monotonic() - started < 5
+    assert saves == [threading.current_thread()]
+    assert manager._flush_timer is None
+    timer.join(2)
+    assert not timer.is_alive() and len(saves) == 1  # The timer was cancelled, not run
+    manager.storage.close()
+
+def test_app_flushes_on_shutdown(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(application.atexit, 'register', registered.append)
+    app = application.create_app(storage=open_storage('json', directory=str(tmp_path)), flush_interval=60,
+                                 load='eager')
+    manager = app.extensions['rental_manager']
+    assert registered == [manager.flush]
+    manager.storage.close()
@@ -0,0 +1,60 @@
+import threading
+import pytest
+from helpers import add_fleet
+
+def test_sqlite_round_trip(open_manager):
+    manager = open_manager('sqlite:data.db')
+    add_fleet(manager)
+    manager.rent_item('c0', 'bike0')
+    manager.rent_item('c1', 'car1')
+    manager.return_item('c1', 'car1')
+    manager.edit_customer('c1', address='9 Low St')
+    manager.remove_item('bike2')
+
+    reloaded = open_manager('sqlite:data.db')
+    assert sorted(reloaded.items) == ['bike0', 'car1', 'car3']
+    assert dict(reloaded.item_renters) == {'bike0': 'c0'}
+    assert list(reloaded.rental_history) == list(manager.rental_history)
+    assert reloaded.get_customer('c1').address == '9 Low St'
+    assert [item.id for item in reloaded.find_items(available=True)] == ['car1', 'car3']
+
+def test_managers_sharing_a_database_never_rent_an_item_twice(open_manager):
+    # Each manager has its own connection, as each server process would
+    first = open_manager('sqlite:data.db')
+    add_fleet(first, items=2, customers=2)
+    second = open_manager('sqlite:data.db')
+    assert sorted(second.items) == ['bike0', 'car1']
+
+    first.rent_item('c0', 'bike0')
+    with pytest.raises(ValueError):
+        second.rent_item('c1', 'bike0')  # Catches up with the first manager's rental before checking
+    assert second.get_item_renter('bike0') == 'c0'
+
+    second.return_item('c0', 'bike0')
+    first.refresh()
+    assert first.get_item_renter('bike0') is None
+    assert len(first.rental_history) == 1
+
+def test_concurrent_rentals_through_two_database_connections(open_manager):
+    first = open_manager('sqlite:data.db')
+    add_fleet(first, items=1, customers=2)
+    second = open_manager('sqlite:data.db')
+    barrier = threading.Barrier(2)
+    outcomes = []
+
+    def rent(manager, customer_id):
+        barrier.wait()
+        try:
+            outcomes.append(manager.rent_item(customer_id, 'bike0'))
+        except ValueError as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=rent, args=(first, 'c0')), threading.Thread(target=rent, args=(second, 'c1'))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(outcome is True for outcome in outcomes) == 1
+    first.refresh()
+    second.refresh()
+    assert first.get_item_renter('bike0') == second.get_item_renter('bike0') is not None